@@ -0,0 +1,56 @@
+"""Breach index build and lookup benchmark
+
+Builds an index from a synthetic corpus of random SHA-1 digests and times
+hit and miss lookups against it.
+
+    python benchmarks/bench_breach.py --hashes 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from breach_check import BreachIndex, build_index  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hashes", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--run-size", type=int, default=250_000,
+                        help="digests per sorted run, to exercise the merge")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = os.path.join(directory, "corpus.txt")
+        index_path = os.path.join(directory, "index.bin")
+        known = []
+        with open(corpus, "w") as f:
+            for i in range(args.hashes):
+                digest = os.urandom(20)
+                if i < args.lookups:
+                    known.append(digest)
+                f.write(digest.hex().upper() + ":1\n")
+
+        start = time.perf_counter()
+        count = build_index([corpus], index_path, run_size=args.run_size)
+        build_seconds = time.perf_counter() - start
+        print(f"build: {count} hashes in {build_seconds:.2f}s "
+              f"({os.path.getsize(index_path) / 1e6:.1f} MB)")
+
+        misses = [os.urandom(20) for _ in range(len(known))]
+        with BreachIndex(index_path) as index:
+            for name, digests, expected in (("hit", known, True), ("miss", misses, False)):
+                start = time.perf_counter()
+                found = sum(index.contains_digest(d) for d in digests)
+                seconds = time.perf_counter() - start
+                assert found == (len(digests) if expected else 0)
+                print(f"{name}: {seconds / len(digests) * 1e6:.2f} us/lookup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Binary vault format benchmark: file size and serialize/parse time against JSON
+
+Builds a synthetic store with sealed passwords, a few usernames reused
+across many sites and creation times spread over a year, then compares
+vault_codec with the pretty-printed JSON save_users writes (and compact
+JSON for reference). dump_store is how the JSON engine now writes that same
+pretty-printed JSON while indexing it. Every format is checked to round-trip
+exactly.
+
+    python benchmarks/bench_codec.py --users 100 --entries 1000
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+import vault_codec  # noqa: E402
+from store_index import dump_store  # noqa: E402
+from password_engine import build_charset, generate_many  # noqa: E402
+from strength import LABELS  # noqa: E402
+from vault_crypto import VaultKey  # noqa: E402
+
+
+def make_users(rng, count, entries):
+    key = VaultKey(os.urandom(32))
+    charset = build_charset()
+    start = datetime.datetime(2025, 1, 1)
+    users = {}
+    for i in range(count):
+        usernames = [f"user{i}.{j}@example.com" for j in range(4)]
+        saved = []
+        for j, password in enumerate(generate_many(entries, 16, charset)):
+            entry = {
+                'website': f"site{rng.randrange(entries)}.example.com",
+                'username': rng.choice(usernames),
+                'password': password,
+                'created': str(start + datetime.timedelta(seconds=rng.randrange(365 * 86400),
+                                                          microseconds=rng.randrange(1, 10**6))),
+                'strength': rng.choice(LABELS),
+                'entropy': rng.randrange(200, 1100) / 10,
+            }
+            saved.append(key.seal_entry(entry))
+        users[f"{rng.randrange(16**64):064x}"] = {
+            'name': f"User {i}",
+            'user_id': f"{i:016x}",
+            'created_date': str(start),
+            'saved_passwords': saved,
+        }
+    return users
+
+
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--entries", type=int, default=1000, help="saved passwords per account")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    users = make_users(random.Random(args.seed), args.users, args.entries)
+    total = args.users * args.entries
+    formats = (
+        ("json indent=2", lambda: json.dumps(users, indent=2).encode("utf-8"), json.loads),
+        ("json compact", lambda: json.dumps(users).encode("utf-8"), json.loads),
+        ("dump_store", lambda: dump_store(users)[0], json.loads),
+        ("vault_codec", lambda: vault_codec.dumps(users), vault_codec.loads),
+    )
+
+    print(f"{args.users} accounts, {total} saved passwords")
+    print(f"{'format':<14} {'bytes':>12} {'B/entry':>8} {'serialize':>10} {'parse':>10}")
+    baseline = None
+    for name, serialize, parse in formats:
+        dump_s, data = timed(serialize, args.repeat)
+        load_s, loaded = timed(lambda: parse(data), args.repeat)
+        assert loaded == users, f"{name} did not round-trip"
+        print(f"{name:<14} {len(data):>12,} {len(data) / total:>8.1f} "
+              f"{dump_s * 1000:>8.0f}ms {load_s * 1000:>8.0f}ms")
+        if baseline is None:
+            baseline = (len(data), dump_s, load_s)
+    size, dump_s, load_s = baseline
+    print(f"vault_codec vs json indent=2: {size / len(data):.1f}x smaller, "
+          f"{dump_s / timed(serialize, 1)[0]:.1f}x faster to serialize, "
+          f"{load_s / timed(lambda: parse(data), 1)[0]:.1f}x faster to parse")
+
+    # Streaming: the first account is available without reading the rest
+    stream = io.BytesIO(data)
+    seconds, _ = timed(lambda: (stream.seek(0), next(vault_codec.iter_users(stream))), args.repeat)
+    print(f"first account via iter_users: {seconds * 1000:.1f}ms")
+
+    exported = json.dumps(dict(vault_codec.iter_users(io.BytesIO(data))), indent=2)
+    assert exported == json.dumps(users, indent=2), "JSON export differs"
+    assert dump_store(users)[0] == exported.encode("utf-8"), "dump_store output differs"
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
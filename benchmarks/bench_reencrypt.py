@@ -0,0 +1,93 @@
+"""Vault encryption benchmark: sealing, revealing and key rotation
+
+Times sealing a synthetic vault, revealing single passwords the way the
+Show button does, and re-encrypting the whole vault to a new key as
+happens when an account moves to new key derivation parameters. The last
+step is also run end to end: an account in a temporary JSON store is
+recalibrated and logged into again.
+
+    python benchmarks/bench_reencrypt.py --entries 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from auth_system import AuthenticationSystem  # noqa: E402
+from password_engine import build_charset, generate_many  # noqa: E402
+from storage import open_storage  # noqa: E402
+from vault_crypto import VaultKey, reseal_entries  # noqa: E402
+
+
+def make_entries(count):
+    passwords = generate_many(count, 16, build_charset())
+    return [{
+        'website': f"site{i}.example.com",
+        'username': f"user{i}@example.com",
+        'password': password,
+        'created': "2025-09-01 12:00:00.000000",
+        'strength': "💚 Very Strong",
+        'entropy': 104.9,
+    } for i, password in enumerate(passwords)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--reveals", type=int, default=10_000)
+    parser.add_argument("--kdf-ms", type=float, default=20,
+                        help="key derivation target for the end-to-end run")
+    args = parser.parse_args(argv)
+
+    entries = make_entries(args.entries)
+    old_key = VaultKey(os.urandom(32))
+    new_key = VaultKey(os.urandom(32))
+
+    start = time.perf_counter()
+    sealed = [old_key.seal_entry(entry) for entry in entries]
+    seconds = time.perf_counter() - start
+    print(f"seal: {args.entries} entries in {seconds:.2f}s "
+          f"({args.entries / seconds:,.0f} entries/sec)")
+
+    sample = sealed[:args.reveals]
+    start = time.perf_counter()
+    for entry in sample:
+        old_key.open_entry(entry)
+    seconds = time.perf_counter() - start
+    print(f"reveal: {seconds / len(sample) * 1e6:.2f} us/entry")
+
+    start = time.perf_counter()
+    rotated = reseal_entries(old_key, new_key, sealed)
+    seconds = time.perf_counter() - start
+    assert new_key.open_entry(rotated[-1]) == entries[-1]['password']
+    print(f"rotate: {args.entries} entries in {seconds:.2f}s "
+          f"({args.entries / seconds:,.0f} entries/sec)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "users.json")
+        auth = AuthenticationSystem(open_storage("json", path))
+        auth.recalibrate(args.kdf_ms)
+        auth.start_session("1234", "Bench")
+        auth.save_account(auth.current_user, {
+            'name': "Bench",
+            'saved_passwords': [auth.seal_entry(entry) for entry in entries],
+        })
+        auth.recalibrate(args.kdf_ms)
+        auth.close()
+
+        auth = AuthenticationSystem(open_storage("json", path))
+        start = time.perf_counter()
+        user_data = auth.login("1234")
+        seconds = time.perf_counter() - start
+        assert auth.reveal_password(user_data['saved_passwords'][-1]) == entries[-1]['password']
+        auth.close()
+        print(f"login with rotation: {seconds:.2f}s for {args.entries} entries, "
+              f"including key derivation and the commit")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
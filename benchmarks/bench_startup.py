@@ -0,0 +1,112 @@
+"""Cold start benchmark and import budget check
+
+Starts a fresh interpreter for each module with `python -X importtime`,
+reports the wall-clock start time and the module's cumulative import time,
+and fails if a module goes over budget or pulls in a GUI-only or optional
+dependency at import time. The command line is also run as a user would
+run it (`cli.py generate -n 1`, start to exit), and it and the cli module
+have their own, tighter budget. That one is counted on top of a bare
+interpreter's start-up, which alone varies widely between machines
+and Python builds, so it measures this code rather than the host.
+
+    python benchmarks/bench_startup.py --budget-ms 100 --cli-budget-ms 40
+"""
+import argparse
+import compileall
+import os
+import subprocess
+import sys
+import time
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+MODULES = ("password_engine", "strength", "storage", "auth_system", "cli",
+           "secure_password_generator")
+
+# Only loaded when a window opens or an optional backend is chosen
+FORBIDDEN = ("tkinter", "_tkinter", "vault_view", "numpy", "sqlite3")
+
+# Commands timed end to end, held to the cli budget like the cli module
+COMMANDS = {
+    "cli.py generate -n 1": ["cli.py", "generate", "-n", "1"],
+}
+
+
+def import_profile(module):
+    """(wall seconds, cumulative import us of module, every imported package)"""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=env, capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - start
+    cumulative = 0
+    packages = set()
+    # Lines look like "import time:   self [us] | cumulative |   package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        name = fields[2].strip()
+        if not fields[1].strip().isdigit():
+            continue
+        packages.add(name)
+        if name == module:
+            cumulative = int(fields[1])
+    return seconds, cumulative, packages
+
+
+def run_time(argv):
+    """Wall seconds to run a script in src from start to exit"""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(SRC, argv[0])] + argv[1:],
+                   env=env, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=100.0,
+                        help="maximum cold start of any module, interpreter included")
+    parser.add_argument("--cli-budget-ms", type=float, default=40.0,
+                        help="maximum for the cli module and a full cli.py generate run, "
+                             "over the interpreter's own start-up")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="starts per module; the fastest is reported")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args(argv)
+
+    # Measure loading, not compiling, even under PYTHONDONTWRITEBYTECODE
+    compileall.compile_dir(SRC, quiet=1)
+    baseline = min(import_profile("os")[0] for _ in range(args.repeat))
+    print(f"{'interpreter':<28}{baseline * 1000:8.1f} ms")
+    cli_budget = baseline * 1000 + args.cli_budget_ms
+
+    failures = []
+    for module in args.modules:
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        seconds = min(run[0] for run in runs)
+        cumulative = min(run[1] for run in runs)
+        loaded = sorted(set().union(*(run[2] for run in runs)) & set(FORBIDDEN))
+        budget = cli_budget if module == "cli" else args.budget_ms
+        print(f"{module:<28}{seconds * 1000:8.1f} ms  (imports {cumulative / 1000:.1f} ms)")
+        if seconds * 1000 > budget:
+            failures.append(f"{module}: {seconds * 1000:.1f} ms is over the "
+                            f"{budget:.0f} ms budget")
+        if loaded:
+            failures.append(f"{module}: imports {', '.join(loaded)} at start-up")
+
+    for name, argv in COMMANDS.items():
+        seconds = min(run_time(argv) for _ in range(args.repeat))
+        print(f"{name:<28}{seconds * 1000:8.1f} ms")
+        if seconds * 1000 > cli_budget:
+            failures.append(f"{name}: {seconds * 1000:.1f} ms is over the "
+                            f"{cli_budget:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
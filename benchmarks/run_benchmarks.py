@@ -0,0 +1,241 @@
+"""Benchmark suite for generation, scoring and vault persistence
+
+Runs headless and prints the results as JSON, so two runs can be compared:
+
+    python benchmarks/run_benchmarks.py -o before.json
+    python benchmarks/run_benchmarks.py -o after.json --compare before.json
+
+Each benchmark reports throughputs (*_per_sec, higher is better),
+latencies (*_ms / *_us) and memory held (*_bytes_per_entry), both lower
+is better. --compare prints the change for
+every metric and exits non-zero if any got worse by more than --tolerance.
+Stores are synthetic and built in a temporary directory; the real
+users.json is never touched.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from auth_system import AuthenticationSystem  # noqa: E402
+from password_engine import DIGITS, build_charset, generate_many  # noqa: E402
+from storage import open_storage  # noqa: E402
+from strength import score_many, score_password  # noqa: E402
+
+CHARSETS = {
+    "digits": DIGITS,
+    "alnum": build_charset(symbols=False),
+    "full": build_charset(),
+}
+
+
+def timed(func, repeat):
+    """Median wall time of func() over repeat runs, in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_generate(args):
+    results = {}
+    for name, charset in CHARSETS.items():
+        for length in args.lengths:
+            seconds = timed(lambda: generate_many(args.passwords, length, charset), args.repeat)
+            results[f"{name}_len{length}_per_sec"] = args.passwords / seconds
+    return results
+
+
+def bench_strength(args):
+    rng = random.Random(args.seed)
+    charset = CHARSETS["full"]
+    # A mix of weak and strong passwords, like the GUI sees
+    passwords = ["".join(rng.choice(charset[:rng.choice((10, 36, 62, len(charset)))])
+                         for _ in range(rng.randint(4, 32)))
+                 for _ in range(args.passwords)]
+
+    def one_at_a_time():
+        for password in passwords:
+            score_password(password)
+
+    return {
+        "calculate_strength_per_sec": len(passwords) / timed(one_at_a_time, args.repeat),
+        "score_many_per_sec": len(passwords) / timed(lambda: score_many(passwords), args.repeat),
+    }
+
+
+def make_entry(rng, i):
+    return {
+        'website': f"site{i}.example.com",
+        'username': f"user{rng.randrange(1_000_000)}@example.com",
+        'password': "".join(rng.choice(CHARSETS["full"]) for _ in range(16)),
+        'created': "2025-09-01 12:00:00.000000",
+        'strength': "💚 Very Strong",
+        'entropy': 104.9,
+    }
+
+
+def make_users(rng, count, entries):
+    """Synthetic store of count accounts with entries saved passwords each"""
+    return {
+        f"{i:06d}": {
+            'name': f"User {i}",
+            'password': f"{i:06d}",
+            'user_id': f"{i:016x}",
+            'created_date': "2025-09-01 12:00:00.000000",
+            'saved_passwords': [make_entry(rng, j) for j in range(entries)],
+        }
+        for i in range(count)
+    }
+
+
+def bench_store(args, directory, label, users):
+    """Latency of whole-store load/save and of single-account logins"""
+    path = os.path.join(directory, f"{label}.{args.engine}")
+
+    def auth():
+        return AuthenticationSystem(open_storage(args.engine, path))
+
+    seeded = auth()
+    seeded.save_users(users)
+    seeded.close()
+
+    def save():
+        system = auth()
+        system.save_users(users)
+        system.close()
+
+    def load_cold():
+        system = auth()
+        system.load_users()
+        system.close()
+
+    # Memory the loaded store holds per saved password (lower is better)
+    system = auth()
+    tracemalloc.start()
+    loaded = system.load_users()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded
+    system.close()
+    entries = max(1, sum(len(user.get('saved_passwords', [])) for user in users.values()))
+
+    warm = auth()
+    warm.load_users()
+    results = {
+        "loaded_bytes_per_entry": held / entries,
+        "save_users_ms": timed(save, args.repeat) * 1000,
+        "load_users_cold_ms": timed(load_cold, args.repeat) * 1000,
+        "load_users_warm_ms": timed(warm.load_users, args.repeat) * 1000,
+    }
+    warm.close()
+
+    rng = random.Random(args.seed)
+    keys = list(users)
+    hits = [rng.choice(keys) for _ in range(args.lookups)]
+    misses = [f"x{i:05d}" for i in range(args.lookups)]
+
+    system = auth()
+    start = time.perf_counter()
+    system.get_account(hits[0])
+    results["login_first_ms"] = (time.perf_counter() - start) * 1000
+    for name, lookups in (("hit", hits), ("miss", misses)):
+        start = time.perf_counter()
+        for key in lookups:
+            system.get_account(key)
+        results[f"login_{name}_us"] = (time.perf_counter() - start) / len(lookups) * 1e6
+    system.close()
+    return results
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    results = {
+        "generate": bench_generate(args),
+        "strength": bench_strength(args),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.users:
+            users = make_users(rng, count, args.entries)
+            results[f"store_{count}_users"] = bench_store(args, directory, f"u{count}", users)
+            del users
+        big_vault = make_users(rng, 1, args.vault_size)
+        results[f"store_vault_{args.vault_size}"] = bench_store(args, directory, "vault", big_vault)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "engine": args.engine,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print each metric against the baseline; returns the regressions"""
+    regressions = []
+    for group, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            old = baseline.get("results", {}).get(group, {}).get(metric)
+            if not old:
+                continue
+            higher_is_better = metric.endswith("_per_sec")
+            change = (value - old) / old
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            print(f"{group}.{metric}: {old:.4g} -> {value:.4g} ({change:+.1%}){flag}",
+                  file=sys.stderr)
+            if flag:
+                regressions.append(f"{group}.{metric}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed slowdown before --compare fails (default 10%%)")
+    parser.add_argument("--engine", default="json", choices=("json", "sqlite", "sharded", "binary"))
+    parser.add_argument("--quick", action="store_true",
+                        help="small sizes, for a smoke test")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.passwords, args.lengths, args.lookups = 10_000, (8, 16), 1_000
+        args.users, args.entries, args.vault_size = (1_000,), 3, 5_000
+    else:
+        args.passwords, args.lengths, args.lookups = 100_000, (8, 16, 32, 64), 10_000
+        args.users, args.entries, args.vault_size = (1_000, 10_000, 100_000), 3, 50_000
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Concurrency stress test: several processes writing one store at once
+
+Starts --processes workers on the same temporary store. Each creates an
+account of its own, then adds --entries saved passwords, half to its own
+account and half to one account they all share, as two app instances or
+the GUI plus a script would. Each entry saved to the shared account is
+then updated at the position it would have had with no other writers.
+Halfway through, each worker also does what logging in to the shared
+account can: seal one of its older plaintext entries in place, and give it
+a name. Afterwards every account must hold every entry written to it,
+once, with every update and seal applied; anything else was lost to a
+concurrent writer, and the exit status is 1.
+
+    python benchmarks/stress_concurrency.py --engine json --processes 8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from storage import DEFAULT_PATHS, ENGINES, open_storage  # noqa: E402
+
+SHARED = "shared"
+
+
+def make_entry(worker, i):
+    return {
+        'website': f"site{i}.worker{worker}.example.com",
+        'username': f"worker{worker}@example.com",
+        'password': f"password-{worker}-{i}",
+        'created': "2025-09-01 12:00:00.000000",
+        'strength': "💚 Very Strong",
+        'entropy': 104.9,
+    }
+
+
+def legacy_entry(worker):
+    """A plaintext entry of the shared account from before the vault was encrypted"""
+    return dict(make_entry(worker, "legacy"), password=f"plain-{worker}")
+
+
+def updated_entry(worker, i):
+    return dict(make_entry(worker, i), password=f"updated-{worker}-{i}")
+
+
+def sealed_entry(worker):
+    return dict(legacy_entry(worker), password=f"sealed-{worker}")
+
+
+def worker(engine, path, number, processes, entries, durability, start):
+    storage = open_storage(engine, path)
+    key = f"worker{number}"
+    start.wait()
+    storage.put_user(key, {'name': key, 'user_id': f"{number:016x}", 'saved_passwords': []},
+                     durability)
+    shared = 0
+    for i in range(entries):
+        target = key if i % 2 else SHARED
+        storage.add_saved_password(target, make_entry(number, i), durability)
+        if target == SHARED:
+            # Where it would be with no other writers: after the legacy entries
+            storage.update_saved_password(SHARED, processes + shared, updated_entry(number, i),
+                                          durability)
+            shared += 1
+        if i == entries // 2:
+            # What AuthenticationSystem.login and returning_user write
+            storage.update_saved_password(SHARED, number, sealed_entry(number), durability)
+            storage.update_user(SHARED, {'name': f"Shared {number}"}, durability)
+    storage.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", default="json", choices=sorted(ENGINES))
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--entries", type=int, default=200, help="saved passwords per process")
+    parser.add_argument("--durability", default="lazy", choices=("lazy", "normal", "full"))
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, os.path.basename(DEFAULT_PATHS[args.engine]))
+        storage = open_storage(args.engine, path)
+        storage.put_user(SHARED, {'user_id': "f" * 16, 'saved_passwords': [
+            legacy_entry(number) for number in range(args.processes)]}, "full")
+        storage.close()
+
+        # spawn, so the workers start like separate app instances would
+        context = multiprocessing.get_context("spawn")
+        start = context.Event()
+        workers = [context.Process(target=worker, args=(args.engine, path, number, args.processes,
+                                                        args.entries, args.durability, start))
+                   for number in range(args.processes)]
+        for process in workers:
+            process.start()
+        # Give them all time to import and open the store, then release them together
+        time.sleep(1)
+        began = time.perf_counter()
+        start.set()
+        for process in workers:
+            process.join()
+        seconds = time.perf_counter() - began
+        failed = [process.exitcode for process in workers if process.exitcode]
+
+        storage = open_storage(args.engine, path)
+        users = storage.load_all()
+        expected = {SHARED: set()}
+        updates = {}
+        for number in range(args.processes):
+            expected[f"worker{number}"] = set()
+            for i in range(args.entries):
+                target = f"worker{number}" if i % 2 else SHARED
+                expected[target].add(make_entry(number, i)['website'])
+                if target == SHARED:
+                    updates[make_entry(number, i)['website']] = updated_entry(number, i)
+        lost = 0
+        for key, websites in expected.items():
+            user = users.get(key)
+            found = {entry['website'] for entry in user.get('saved_passwords', [])} if user else set()
+            lost += len(websites - found)
+        shared = users.get(SHARED) or {}
+        stored = shared.get('saved_passwords', [])
+        # Each legacy entry sealed where it was, and the name one of those written
+        lost += sum(position >= len(stored) or dict(stored[position]) != sealed_entry(position)
+                    for position in range(args.processes))
+        lost += not shared.get('name', "").startswith("Shared ")
+        # Every update applied to its own entry, and no entry stored twice
+        found = {entry['website']: dict(entry) for entry in stored[args.processes:]}
+        lost += len(stored) - args.processes - len(found)
+        lost += sum(found.get(website) != entry for website, entry in updates.items())
+        storage.close()
+
+    total = args.processes * args.entries
+    print(f"{args.engine}: {args.processes} processes wrote {total} entries "
+          f"in {seconds:.2f}s, {lost} lost")
+    if failed:
+        print(f"{len(failed)} workers failed", file=sys.stderr)
+    return 1 if lost or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
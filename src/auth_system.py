@@ -1,35 +1,374 @@
-import tkinter as tk
-from tkinter import messagebox
-import json
-import os
 import secrets
 import datetime
+import hmac
+import threading
+import kdf
+from breach_check import default_index
+from instrumentation import timed, timer
+from io_worker import IOWorker
+from storage import open_storage
+from strength import score_password
+from vault_crypto import VaultKey, is_sealed, reseal_entries
+from vault_index import VaultIndex
+# Saved passwords and accounts are held as these compact records once loaded
+from vault_records import SavedPassword, UserAccount, compact_entry, compact_user  # noqa: F401
+
+# tkinter is imported when the login window opens, so headless callers such
+# as the command line can use AuthenticationSystem without a display
+tk = None
+messagebox = None
+
+
+def load_tk():
+    """Import tkinter into this module on first use; returns (tk, messagebox)
+
+    The other GUI modules bind their own tk and messagebox from the result.
+    """
+    global tk, messagebox
+    if tk is None:
+        import tkinter
+        from tkinter import messagebox as tk_messagebox
+        tk = tkinter
+        messagebox = tk_messagebox
+    return tk, messagebox
+
+
+def new_saved_entry(website, username, password):
+    """Build a saved-password record in the layout stored in users.json"""
+    strength = score_password(password, default_index())
+    return {
+        'website': website,
+        'username': username,
+        'password': password,
+        'created': str(datetime.datetime.now()),
+        'strength': strength.label,
+        'entropy': round(strength.entropy, 1)
+    }
+
 
 class AuthenticationSystem:
-    def __init__(self):
-        # store users.json next to this module for predictable behavior
-        self.users_file = os.path.join(os.path.dirname(__file__), "users.json")
+    def __init__(self, storage=None):
+        # users.json next to this module unless SPG_STORAGE picks another engine
+        self.storage = storage or open_storage()
         self.current_user = None
         self.current_user_name = None
-
+        self._vault_index = None
+        self._vault_index_key = None
+        # storage.version() of the account when the index was built
+        self._vault_index_version = None
+        # Key derivation settings of the store, and keys derived this session
+        # keyed by an HMAC of the password under a per-session nonce
+        self._kdf = None
+        self._nonce = secrets.token_bytes(32)
+        self._derived = {}
+        # Second half of the logged-in account's derived key, and the vault
+        # key made from it that seals saved passwords
+        self.session_secret = None
+        self._vault_key = None
+        # Storage is shared with the background I/O thread
+        self._lock = threading.RLock()
+        self._io = None
+
+    @property
+    def io(self):
+        """Background I/O worker, started on first use"""
+        if self._io is None:
+            # Callbacks wait for the commit, so "saved" means on disk
+            self._io = IOWorker(commit=lambda: self._call(self.storage.flush))
+        return self._io
+
+    def flush_io(self):
+        """Wait until every background write has been handed to storage"""
+        if self._io is not None:
+            self._io.flush()
+
+    def flush(self):
+        """Commit every pending write to disk now"""
+        self.flush_io()
+        self._call(self.storage.flush)
+
+    def close(self):
+        """Finish background writes and release storage
+
+        Raises StorageError if the writes cannot be committed, before
+        anything is released: the session and its attached I/O worker carry
+        on as they were, so the caller can keep going or try again.
+        """
+        self.flush()
+        if self._io is not None:
+            self._io.close()
+            self._io = None
+        self._call(self.storage.close)
+        self._derived.clear()
+        self.session_secret = None
+        self._vault_key = None
+
+    def _call(self, method, *args):
+        with self._lock:
+            return method(*args)
+
+    @timed("load_users")
     def load_users(self):
-        """Load users from JSON file"""
-        if os.path.exists(self.users_file):
-            try:
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    return json.load(f) or {}
-            except (json.JSONDecodeError, OSError):
-                return {}
-        return {}
-
-    def save_users(self, users):
-        """Save users to JSON file"""
-        try:
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(users, f, indent=2)
-        except OSError:
-            # In a simple app show an error dialog could be added if needed
-            pass
+        """Load all users from storage"""
+        return self._call(self.storage.load_all)
+
+    @timed("save_users")
+    def save_users(self, users, durability=None):
+        """Save all users to storage"""
+        self._call(self.storage.save_all, users, durability)
+
+    def get_account(self, key):
+        """Return one account's data, or None if there is no such account"""
+        return self._call(self.storage.get_user, key)
+
+    def account_exists(self, key):
+        return self._call(self.storage.has_user, key)
+
+    def save_account(self, key, user_data, durability=None):
+        """Create or update one account
+
+        durability is one of storage.DURABILITY; new accounts use "full" so
+        they are on disk before the user is told they exist.
+        """
+        self._call(self.storage.put_user, key, user_data, durability)
+
+    def save_account_async(self, key, user_data, durability=None, on_done=None, on_error=None):
+        """save_account on the I/O thread; callbacks run on the next poll"""
+        self.io.submit(self.save_account, key, user_data, durability,
+                       on_done=on_done, on_error=on_error)
+
+    def update_account(self, key, fields, durability=None):
+        """Change some fields of an existing account, such as its name
+
+        Saved passwords another process has just added are left alone,
+        which saving the whole account would not do.
+        """
+        self._call(self.storage.update_user, key, fields, durability)
+
+    def update_account_async(self, key, fields, durability=None, on_done=None, on_error=None):
+        """update_account on the I/O thread; callbacks run on the next poll"""
+        self.io.submit(self.update_account, key, fields, durability,
+                       on_done=on_done, on_error=on_error)
+
+    def saved_passwords(self, key):
+        """Return the saved-password records of one account"""
+        return self._call(self.storage.saved_passwords, key)
+
+    def seal_entry(self, entry):
+        """A plaintext entry with its password encrypted for the logged-in account
+
+        Returned as a SavedPassword (or a dict if its layout is unusual).
+        """
+        if self._vault_key is None:
+            raise RuntimeError("log in before saving passwords")
+        return compact_entry(self._vault_key.seal_entry(entry))
+
+    def reveal_password(self, entry):
+        """Decrypt one saved password; raises ValueError if it cannot be"""
+        if self._vault_key is None:
+            if is_sealed(entry['password']):
+                raise ValueError("log in to decrypt saved passwords")
+            return entry['password']
+        return self._vault_key.open_entry(entry)
+
+    def add_saved_password(self, user_key, entry, durability=None):
+        """Append a plaintext saved-password record to a user's vault, encrypted"""
+        entry = self.seal_entry(entry)
+        self._call(self.storage.add_saved_password, user_key, entry, durability)
+        if self._vault_index_key == user_key:
+            self._vault_index.add(entry)
+
+    def vault_index(self, user_key):
+        """Website/username index of a user's vault
+
+        Built on first use, and again once storage has committed since, as
+        another process may have saved to the vault meanwhile.
+        """
+        if (self._vault_index_key != user_key
+                or self._vault_index_version != self._call(self.storage.version, user_key)):
+            # Writes still queued for storage would be missing from a new index
+            self.flush_io()
+            # Version first: a commit landing in between only means another rebuild
+            self._vault_index_version = self._call(self.storage.version, user_key)
+            self._vault_index = VaultIndex(self.saved_passwords(user_key))
+            self._vault_index_key = user_key
+        return self._vault_index
+
+    def find_saved_password(self, user_key, website, username):
+        """The saved entry for website and username, or None"""
+        return self.vault_index(user_key).find(website, username)
+
+    def _stage_saved_password(self, user_key, entry):
+        """Apply an upsert to the index; returns the storage write and whether it replaces"""
+        entry = self.seal_entry(entry)
+        index = self.vault_index(user_key)
+        position = index.position(entry['website'], entry['username'])
+        if position is None:
+            index.add(entry)
+            return (self.storage.add_saved_password, user_key, entry), False
+        index.replace(position, entry)
+        return (self.storage.update_saved_password, user_key, position, entry), True
+
+    def upsert_saved_password(self, user_key, entry):
+        """Save an entry, updating the existing one for the same site and username
+
+        Returns True if an existing entry was replaced.
+        """
+        write, replaced = self._stage_saved_password(user_key, entry)
+        self._call(*write)
+        return replaced
+
+    def upsert_saved_password_async(self, user_key, entry, on_done=None, on_error=None):
+        """upsert_saved_password with the storage write on the I/O thread
+
+        The index is updated straight away, so lookups and the saved-passwords
+        view see the entry before it reaches disk. on_done gets the same
+        True/False as upsert_saved_password.
+        """
+        write, replaced = self._stage_saved_password(user_key, entry)
+        done = None if on_done is None else (lambda _: on_done(replaced))
+        self.io.submit(self._call, *write, on_done=done, on_error=on_error)
+
+    def kdf_params(self):
+        """Key derivation parameters of the store, calibrated on first use"""
+        if self._kdf is None:
+            settings = self._call(self.storage.get_meta, "kdf")
+            if settings is None:
+                calibrated = {'current': kdf.calibrate(), 'previous': []}
+                # Another process may be calibrating too; whichever commits first
+                # wins, and everyone uses its settings
+                settings = self._call(self.storage.update_meta, "kdf",
+                                      lambda stored: stored or calibrated, "full")
+            self._kdf = settings
+        return self._kdf['current']
+
+    def recalibrate(self, target_ms=kdf.TARGET_MS):
+        """Calibrate new parameters for this host
+
+        Accounts keep their old keys until they next log in, when
+        find_account moves them over. Earlier parameters no account is
+        stored under any more are dropped, since a login with a wrong
+        password pays for every one kept. Returns the new parameters.
+        """
+        self.kdf_params()
+        current = kdf.calibrate(target_ms)
+        in_use = self._salts_in_use()
+
+        def rotate(stored):
+            # From what is stored now, which another process may have recalibrated.
+            # The outgoing parameters are always kept: accounts may be created
+            # under them until every process has seen the new ones
+            stored = stored or self._kdf
+            previous = [params for params in stored['previous']
+                        if in_use is None or params['salt'] in in_use]
+            return {'current': current, 'previous': [stored['current']] + previous}
+
+        self._kdf = self._call(self.storage.update_meta, "kdf", rotate, "full")
+        return self._kdf['current']
+
+    def _salts_in_use(self):
+        """Salts of the parameters accounts are stored under, or None if unknown
+
+        Accounts record theirs in 'kdf_salt' when created or logged into;
+        one that has not yet (such as a legacy account) could be under any.
+        """
+        salts = set()
+        for user_data in self.load_users().values():
+            salt = user_data.get('kdf_salt')
+            if salt is None:
+                return None
+            salts.add(salt)
+        return salts
+
+    def _derive(self, password, params):
+        """(lookup key, session secret) for password, derived once per session"""
+        tag = hmac.new(self._nonce, password.encode('utf-8'), 'sha256').digest()
+        cache_key = (tag, tuple(sorted(params.items())))
+        keys = self._derived.get(cache_key)
+        if keys is None:
+            with timer("kdf"):
+                keys = kdf.split(kdf.derive(password, params))
+            self._derived[cache_key] = keys
+        return keys
+
+    def account_key(self, password):
+        """Storage key of the account for password"""
+        return self._derive(password, self.kdf_params())[0]
+
+    def find_account(self, password):
+        """(key, user_data) of the account for password, or (None, None)
+
+        Accounts stored under earlier parameters, or under the plain
+        password by older versions, are moved to the current key when found.
+        """
+        key, secret = self._derive(password, self.kdf_params())
+        user_data = self.get_account(key)
+        if user_data is not None:
+            return key, user_data
+        old_keys = [self._derive(password, params) for params in self._kdf['previous']]
+        # Keyed by the password itself, with plaintext entries, before keys were derived
+        old_keys.append((password, None))
+        for old_key, old_secret in old_keys:
+            user_data = self.get_account(old_key)
+            if user_data is not None:
+                self._rekey(old_key, key, user_data, old_secret, secret)
+                return key, user_data
+        return None, None
+
+    def _rekey(self, old_key, new_key, user_data, old_secret, new_secret):
+        """Move an account to a new key, re-encrypting its saved passwords"""
+        old_vault_key = None if old_secret is None else VaultKey(old_secret)
+        user_data['saved_passwords'] = [compact_entry(entry) for entry in reseal_entries(
+            old_vault_key, VaultKey(new_secret), user_data.get('saved_passwords', []))]
+        # The plain password was only ever needed as the old key
+        user_data.pop('password', None)
+        user_data['kdf_salt'] = self.kdf_params()['salt']
+        with self._lock:
+            self.storage.put_user(new_key, user_data, "full")
+            self.storage.delete_user(old_key, "full")
+
+    def start_session(self, password, name):
+        """Log in as the account for password"""
+        self.current_user, self.session_secret = self._derive(password, self.kdf_params())
+        self.current_user_name = name
+        self._vault_key = VaultKey(self.session_secret)
+
+    def login(self, password):
+        """Log in with password; returns the account data, or None if there is none"""
+        key, user_data = self.find_account(password)
+        if user_data is not None:
+            self.start_session(password, user_data.get('name', ''))
+            entries = user_data.get('saved_passwords', [])
+            # Entries saved before the vault was encrypted, sealed one by one so
+            # entries another process adds meanwhile are kept
+            sealed = [(position, self.seal_entry(entry)) for position, entry in enumerate(entries)
+                      if not is_sealed(entry['password'])]
+            for position, entry in sealed:
+                entries[position] = entry
+                self._call(self.storage.update_saved_password, key, position, entry)
+            # Accounts from before kdf_salt was recorded get it now
+            salt = self.kdf_params()['salt']
+            stamped = user_data.get('kdf_salt') != salt
+            if stamped:
+                user_data['kdf_salt'] = salt
+                self.update_account(key, {'kdf_salt': salt})
+            if sealed or stamped:
+                self._call(self.storage.flush)
+        return user_data
+
+    def verify_password(self, password):
+        """True if password is the logged-in account's
+
+        The right password was derived at login, so this costs no key
+        derivation; a wrong one pays the full cost like a login would.
+        """
+        if self.current_user is None:
+            return False
+        return hmac.compare_digest(self.account_key(password), self.current_user)
+
+    def cache_stats(self):
+        """Hit/miss/write counters of the storage cache, if it has one"""
+        return self._call(self.storage.cache_stats)
 
     def generate_simple_id(self):
         """Generate simple user ID"""
@@ -47,6 +386,7 @@ class AuthenticationSystem:
 
 class LoginWindow:
     def __init__(self, success_callback):
+        load_tk()
         self.success_callback = success_callback
         self.auth = AuthenticationSystem()
         self.root = None
@@ -68,6 +408,7 @@ class LoginWindow:
         self.center_window()
 
         self.setup_ui()
+        self.auth.io.attach(self.root)
         self.root.mainloop()
 
     def center_window(self):
@@ -165,6 +506,10 @@ class LoginWindow:
             "🔹 Your information is stored locally on your device")
         instructions.config(state="disabled")
 
+    def on_save_error(self, error):
+        """Report a background account write that failed"""
+        messagebox.showerror("❌ Save Failed", f"Your account could not be saved:\n\n{error}")
+
     def on_name_enter(self, event):
         """Handle Enter key in name field"""
         if self.name_var.get().strip():
@@ -226,9 +571,9 @@ class LoginWindow:
             self.password_entry.select_range(0, tk.END)
             return
 
-        # Check if user already exists (password is used as key here)
-        users = self.auth.load_users()
-        if password in users:
+        # Check if user already exists (the key is derived from the password)
+        key, _ = self.auth.find_account(password)
+        if key is not None:
             result = messagebox.askyesno("Account Exists",
                 f"An account with this password already exists.\n\nWould you like to sign in instead?")
             if result:
@@ -238,17 +583,16 @@ class LoginWindow:
         # Create user account
         user_id = self.auth.generate_simple_id()
 
-        users[password] = {
+        self.auth.start_session(password, name)
+
+        # Written on the I/O thread; a failure is reported once it is known
+        self.auth.save_account_async(self.auth.current_user, {
             'name': name,
-            'password': password,
             'user_id': user_id,
             'created_date': str(datetime.datetime.now()),
-            'saved_passwords': []
-        }
-
-        self.auth.save_users(users)
-        self.auth.current_user = password
-        self.auth.current_user_name = name
+            'saved_passwords': [],
+            'kdf_salt': self.auth.kdf_params()['salt'],
+        }, durability="full", on_error=self.on_save_error)
 
         messagebox.showinfo("Welcome!",
             f"Account created successfully!\n\n"
@@ -269,19 +613,17 @@ class LoginWindow:
             self.password_entry.focus_set()
             return
 
-        # Load users and check if account exists
-        users = self.auth.load_users()
+        # Derive the account key and load the account, if it exists
+        with timer("returning_user"):
+            user_data = self.auth.login(password)
 
-        if password not in users:
+        if user_data is None:
             messagebox.showerror("Account Not Found",
                 f"No account found for the provided password.\n\nPlease check your password or create a new account.")
             self.password_entry.focus_set()
             self.password_entry.select_range(0, tk.END)
             return
 
-        # Get user data and handle missing name field
-        user_data = users[password]
-
         # Handle old user data that might not have 'name' field or empty name
         if 'name' not in user_data or not user_data.get('name'):
             if not name:
@@ -291,13 +633,9 @@ class LoginWindow:
 
             # Update user data with name
             user_data['name'] = name
-            user_data['password'] = password
-            users[password] = user_data
-            self.auth.save_users(users)
-
-        # Successful login
-        self.auth.current_user = user_data.get('password', password)
-        self.auth.current_user_name = user_data.get('name', '')
+            self.auth.current_user_name = name
+            self.auth.update_account_async(self.auth.current_user, {'name': name},
+                                           on_error=self.on_save_error)
 
         messagebox.showinfo("Welcome Back!",
             f"Welcome back, {self.auth.current_user_name}!\n\n"
@@ -0,0 +1,206 @@
+"""Offline breached-password check against a prebuilt SHA-1 index
+
+The index is a sorted file of raw 20-byte SHA-1 digests behind a small
+header. Lookups memory-map it and binary-search, so a corpus of tens of
+millions of hashes (such as the offline Have I Been Pwned dumps) is never
+loaded into RAM.
+
+    python src/cli.py breach build pwned-passwords-sha1.txt -o breach_index.bin
+    python src/cli.py breach check < candidates.txt
+"""
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"SPGSHA1\x00"
+HEADER = struct.Struct("<8sQ")
+RECORD_SIZE = 20
+
+# Digests sorted in memory at once while building (roughly 300 MB)
+RUN_SIZE = 5_000_000
+
+# Where the app looks for an index unless SPG_BREACH_INDEX points elsewhere
+DEFAULT_INDEX = os.path.join(os.path.dirname(__file__), "breach_index.bin")
+
+
+def password_digest(password):
+    return hashlib.sha1(password.encode("utf-8")).digest()
+
+
+def _parse_line(line, plaintext):
+    """Return the digest for one corpus line, or None to skip it"""
+    line = line.rstrip("\r\n")
+    if plaintext:
+        return password_digest(line) if line else None
+    # Hash dumps are "HEX" or "HEX:COUNT"
+    hex_digest = line.split(":", 1)[0].strip()
+    if len(hex_digest) != 40:
+        return None
+    try:
+        return bytes.fromhex(hex_digest)
+    except ValueError:
+        return None
+
+
+def _write_run(digests, directory):
+    # Only index builds need tempfile, so lookups do not pay to import it
+    import tempfile
+    digests.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(digests))
+    return path
+
+
+def _read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(RECORD_SIZE * 4096)
+            if not block:
+                return
+            for start in range(0, len(block), RECORD_SIZE):
+                yield block[start:start + RECORD_SIZE]
+
+
+def build_index(sources, index_path, plaintext=False, run_size=RUN_SIZE):
+    """Build a sorted, de-duplicated index from corpus files
+
+    sources are text files with one SHA-1 hex digest per line (an optional
+    ":count" suffix is ignored), or plain passwords when plaintext is True.
+    Large corpora are sorted in runs on disk and merged, so memory use is
+    bounded by run_size. Returns the number of digests written.
+    """
+    directory = os.path.dirname(os.path.abspath(index_path))
+    runs = []
+    try:
+        digests = []
+        for source in sources:
+            with open(source, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    digest = _parse_line(line, plaintext)
+                    if digest is not None:
+                        digests.append(digest)
+                        if len(digests) >= run_size:
+                            runs.append(_write_run(digests, directory))
+                            digests = []
+        if digests or not runs:
+            runs.append(_write_run(digests, directory))
+        del digests
+
+        count = 0
+        previous = None
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, 0))
+            pending = []
+            for digest in heapq.merge(*(_read_run(path) for path in runs)):
+                if digest != previous:
+                    pending.append(digest)
+                    previous = digest
+                    if len(pending) >= 4096:
+                        out.write(b"".join(pending))
+                        count += len(pending)
+                        pending = []
+            out.write(b"".join(pending))
+            count += len(pending)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, count))
+        os.replace(tmp_path, index_path)
+        return count
+    finally:
+        for path in runs:
+            os.remove(path)
+
+
+class BreachIndex:
+    """Read-only view of an index file; use `password in index`"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            header = self._file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise ValueError(f"{path} is not a breach index")
+            magic, self.count = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a breach index")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._map) != HEADER.size + self.count * RECORD_SIZE:
+                self._map.close()
+                raise ValueError(f"{path} is truncated or corrupt")
+        except Exception:
+            self._file.close()
+            raise
+
+    def contains_digest(self, digest):
+        """Binary-search the mapped records for a raw 20-byte digest"""
+        data = self._map
+        low, high = 0, self.count
+        base = HEADER.size
+        while low < high:
+            mid = (low + high) // 2
+            offset = base + mid * RECORD_SIZE
+            record = data[offset:offset + RECORD_SIZE]
+            if record < digest:
+                low = mid + 1
+            elif record > digest:
+                high = mid
+            else:
+                return True
+        return False
+
+    def __contains__(self, password):
+        return self.contains_digest(password_digest(password))
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default = None
+# Set once the configured index has failed to open, so it is reported once
+_default_failed = False
+
+
+def default_index_path():
+    """Where this install keeps its index: SPG_BREACH_INDEX, else DEFAULT_INDEX"""
+    return os.environ.get("SPG_BREACH_INDEX", DEFAULT_INDEX)
+
+
+def default_index():
+    """The index configured for this install, or None if there isn't a usable one
+
+    An index that exists but cannot be opened is reported on stderr once and
+    then treated as absent, so scoring and saving carry on without it.
+    """
+    global _default, _default_failed
+    if _default is None and not _default_failed:
+        path = default_index_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            _default = BreachIndex(path)
+        except (OSError, ValueError) as exc:
+            _default_failed = True
+            print(f"warning: cannot open breach index {path}: {exc}; "
+                  "breach checks are off", file=sys.stderr)
+    return _default
+
+
+def is_breached(password):
+    """True if the password is in the configured breach index"""
+    index = default_index()
+    return index is not None and password in index
@@ -0,0 +1,441 @@
+"""Command-line interface for scripted use without starting Tk
+
+    python src/cli.py generate -n 10 --length 20 --no-symbols
+    python src/cli.py score < passwords.txt
+    python src/cli.py vault list --account 1234
+    python src/cli.py breach check hunter2
+    python src/cli.py passphrase generate -n 5 --words 6
+
+Nothing imported here pulls in tkinter, so it runs in headless CI and cron.
+Results are written line by line as they are produced.
+
+Each command imports what it needs when it runs, so `generate` and `score`
+start without loading storage, key derivation or the breach index code.
+"""
+import argparse
+import os
+import sys
+
+from password_engine import build_charset, generate_password, iter_passwords
+
+
+def _terminal_width():
+    """shutil.get_terminal_size().columns, without importing shutil (and bz2 and lzma)"""
+    try:
+        return int(os.environ["COLUMNS"])
+    except (KeyError, ValueError):
+        pass
+    try:
+        return os.get_terminal_size(sys.__stdout__.fileno()).columns
+    except (AttributeError, ValueError, OSError):
+        return 80
+
+
+class HelpFormatter(argparse.HelpFormatter):
+    # argparse builds one of these for every add_argument(), and the stock
+    # one imports shutil to size itself: a tenth of the start-up time
+    def __init__(self, prog, indent_increment=2, max_help_position=24, width=None):
+        super().__init__(prog, indent_increment, max_help_position,
+                         _terminal_width() - 2 if width is None else width)
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    """argparse.ArgumentParser using HelpFormatter; subcommand parsers inherit it"""
+
+    def __init__(self, *args, formatter_class=HelpFormatter, **kwargs):
+        super().__init__(*args, formatter_class=formatter_class, **kwargs)
+
+
+def add_charset_options(parser):
+    """Character options matching the GUI's length slider and checkboxes"""
+    parser.add_argument("--length", type=int, default=16,
+                        help="password length (default: 16)")
+    parser.add_argument("--no-upper", action="store_true", help="leave out A-Z")
+    parser.add_argument("--no-lower", action="store_true", help="leave out a-z")
+    parser.add_argument("--no-digits", action="store_true", help="leave out 0-9")
+    parser.add_argument("--no-symbols", action="store_true", help="leave out !@#$%%...")
+    rules = parser.add_argument_group("policy", "passwords are built to meet these rules")
+    for name, what in (("upper", "uppercase letters"), ("lower", "lowercase letters"),
+                       ("digits", "digits"), ("symbols", "symbols")):
+        rules.add_argument(f"--min-{name}", type=int, default=0, metavar="N",
+                           help=f"at least N {what}")
+    rules.add_argument("--no-ambiguous", action="store_true",
+                       help="leave out look-alike characters such as l, 1, O and 0")
+    rules.add_argument("--max-run", type=int, metavar="N",
+                       help="no character repeated more than N times in a row")
+    rules.add_argument("--allowed", metavar="REGEX",
+                       help="only characters matching this pattern, e.g. '[A-Za-z0-9_-]'")
+
+
+def charset_from_args(args):
+    return build_charset(upper=not args.no_upper, lower=not args.no_lower,
+                         digits=not args.no_digits, symbols=not args.no_symbols)
+
+
+def policy_from_args(args):
+    """A PasswordPolicy if any policy rule was given, else None for the plain charset"""
+    minimums = {name: getattr(args, f"min_{name}") for name in ("upper", "lower", "digits", "symbols")}
+    if not (any(minimums.values()) or args.no_ambiguous or args.max_run is not None or args.allowed):
+        return None
+    excluded = {"upper": args.no_upper, "lower": args.no_lower,
+                "digits": args.no_digits, "symbols": args.no_symbols}
+    for name, count in minimums.items():
+        if excluded[name]:
+            if count:
+                raise ValueError(f"--min-{name} and --no-{name} contradict each other")
+            minimums[name] = None
+    from password_policy import PasswordPolicy
+    return PasswordPolicy(args.length, exclude_ambiguous=args.no_ambiguous,
+                          max_run=args.max_run, allowed=args.allowed, **minimums)
+
+
+def cmd_generate(args):
+    charset = charset_from_args(args)
+    policy = policy_from_args(args)
+    if args.workers:
+        # Only load the process pool when it is asked for
+        from bulk_generator import write_passwords
+        stats = write_passwords(args.count, args.length, charset, sys.stdout, args.workers,
+                                policy=policy)
+        print(f"{stats.rate:,.0f} passwords/sec", file=sys.stderr)
+        return 0
+    write = sys.stdout.write
+    if policy is not None:
+        passwords = policy.iter_passwords(args.count)
+    else:
+        passwords = iter_passwords(args.count, args.length, charset)
+    for password in passwords:
+        write(password + "\n")
+    return 0
+
+
+def read_passwords(args):
+    """Passwords from the command line, or one per line on stdin"""
+    return args.passwords or (line.rstrip("\n") for line in sys.stdin)
+
+
+def cmd_score(args):
+    from breach_check import default_index
+    from strength import score_password
+    index = default_index()
+    write = sys.stdout.write
+    for password in read_passwords(args):
+        result = score_password(password, index)
+        write(f"{result.label}\t{result.entropy:.1f}\n")
+    return 0
+
+
+def cmd_breach_build(args):
+    from breach_check import DEFAULT_INDEX, build_index
+    args.output = args.output or DEFAULT_INDEX
+    count = build_index(args.sources, args.output, plaintext=args.plaintext)
+    print(f"{count} hashes indexed in {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_breach_check(args):
+    from breach_check import BreachIndex, default_index_path
+    # Unlike scoring, a check without a usable index must fail, not pass all
+    path = args.index or default_index_path()
+    if not args.index and not os.path.exists(path):
+        raise SystemExit("No breach index found; build one or pass --index.")
+    try:
+        index = BreachIndex(path)
+    except (OSError, ValueError) as exc:
+        # A missing or corrupt --index, or SPG_BREACH_INDEX naming one
+        raise SystemExit(f"Cannot open breach index: {exc}")
+    write = sys.stdout.write
+    for password in read_passwords(args):
+        write("breached\n" if password in index else "ok\n")
+    return 0
+
+
+def cmd_passphrase_compile(args):
+    from passphrase import DEFAULT_WORDLIST, compile_wordlist
+    args.output = args.output or DEFAULT_WORDLIST
+    count = compile_wordlist(args.source, args.output)
+    print(f"{count} words compiled into {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_passphrase_generate(args):
+    from passphrase import DEFAULT_SEPARATOR, DEFAULT_WORDS, Wordlist, default_wordlist, iter_passphrases
+    if args.words is None:
+        args.words = DEFAULT_WORDS
+    if args.separator is None:
+        args.separator = DEFAULT_SEPARATOR
+    if args.wordlist:
+        wordlist = Wordlist(args.wordlist)
+    else:
+        wordlist = default_wordlist()
+        if wordlist is None:
+            raise SystemExit("No wordlist found; compile one or pass --wordlist.")
+    print(f"{wordlist.entropy(args.words):.1f} bits per passphrase "
+          f"({args.words} words from {len(wordlist):,})", file=sys.stderr)
+    write = sys.stdout.write
+    for phrase in iter_passphrases(args.count, wordlist, args.words, args.separator):
+        write(phrase + "\n")
+    return 0
+
+
+def open_account(args):
+    """Return (auth, user_key, user_data) for the account given on the command line"""
+    import getpass
+    from auth_system import AuthenticationSystem
+    auth = AuthenticationSystem()
+    password = args.account or os.environ.get("SPG_ACCOUNT") or getpass.getpass("Account password: ")
+    user_data = auth.login(password)
+    if user_data is None:
+        raise SystemExit("No account found for the provided password.")
+    return auth, auth.current_user, user_data
+
+
+def cmd_vault_list(args):
+    _, _, user_data = open_account(args)
+    write = sys.stdout.write
+    for entry in user_data.get('saved_passwords', []):
+        write(f"{entry['website']}\t{entry.get('username', '')}\t"
+              f"{entry['created'][:19]}\t{entry.get('strength', '')}\n")
+    return 0
+
+
+def cmd_vault_add(args):
+    from auth_system import new_saved_entry
+    from breach_check import is_breached
+    auth, key, _ = open_account(args)
+    policy = policy_from_args(args)
+    if args.secret:
+        password = args.secret
+    elif policy is not None:
+        password = policy.generate()
+    else:
+        password = generate_password(args.length, charset_from_args(args))
+    if is_breached(password):
+        print("warning: this password appears in the breach index", file=sys.stderr)
+    if auth.find_saved_password(key, args.website, args.username) and not args.replace:
+        raise SystemExit(f"{args.username} on {args.website} is already saved; "
+                         "use --replace to update it.")
+    auth.upsert_saved_password(key, new_saved_entry(args.website, args.username, password))
+    # Commit the write before printing, so a printed password is a saved one
+    auth.close()
+    print(password)
+    return 0
+
+
+def cmd_vault_get(args):
+    auth, key, _ = open_account(args)
+    index = auth.vault_index(key)
+    if args.username:
+        entry = index.find(args.website, args.username)
+        entries = [entry] if entry else []
+    else:
+        entries = index.for_site(args.website)
+    if not entries:
+        raise SystemExit(f"Nothing saved for {args.website}.")
+    for entry in entries:
+        print(f"{entry.get('username', '')}\t{auth.reveal_password(entry)}")
+    return 0
+
+
+def cmd_vault_export(args):
+    auth, _, user_data = open_account(args)
+    # Exported with plaintext passwords; keep the file somewhere safe
+    import json
+    entries = [dict(entry, password=auth.reveal_password(entry))
+               for entry in user_data.get('saved_passwords', [])]
+    if args.output == "-":
+        json.dump(entries, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2)
+    return 0
+
+
+def cmd_vault_migrate(args):
+    from storage import migrate, open_storage
+    source = open_storage(args.source, args.source_path)
+    target = open_storage(args.target, args.target_path)
+    try:
+        count = migrate(source, target)
+    finally:
+        source.close()
+        target.close()
+    print(f"{count} accounts copied from {source.path} to {target.path}", file=sys.stderr)
+    return 0
+
+
+def cmd_vault_convert(args):
+    from vault_codec import export_json, import_json
+    # The direction follows the input: a .json file is imported, anything else exported
+    if args.input.endswith(".json"):
+        count = import_json(args.input, args.output)
+    else:
+        count = export_json(args.input, args.output)
+    print(f"{count} accounts converted from {args.input} to {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_vault_calibrate(args):
+    import kdf
+    from auth_system import AuthenticationSystem
+    auth = AuthenticationSystem()
+    try:
+        params = auth.recalibrate(args.target_ms or kdf.TARGET_MS)
+    finally:
+        auth.close()
+    cost = params.get("n", params.get("iterations"))
+    print(f"{params['algorithm']} cost {cost}: {kdf.measure(params) * 1000:.0f} ms per login; "
+          "accounts switch over as they next log in", file=sys.stderr)
+    return 0
+
+
+def _generate_options(generate):
+    generate.add_argument("-n", "--count", type=int, default=1)
+    generate.add_argument("--workers", type=int, default=0,
+                          help="generate on this many processes")
+    add_charset_options(generate)
+    generate.set_defaults(func=cmd_generate)
+
+
+def _score_options(score):
+    score.add_argument("passwords", nargs="*")
+    score.set_defaults(func=cmd_score)
+
+
+def _breach_options(breach):
+    breach_commands = breach.add_subparsers(dest="breach_command", required=True)
+
+    build = breach_commands.add_parser("build", help="build an index from SHA-1 dumps")
+    build.add_argument("sources", nargs="+", help="files of SHA-1 hex digests (HASH or HASH:COUNT)")
+    build.add_argument("-o", "--output", help="index file to write (default: src/breach_index.bin)")
+    build.add_argument("--plaintext", action="store_true",
+                       help="sources hold plain passwords rather than hashes")
+    build.set_defaults(func=cmd_breach_build)
+
+    check = breach_commands.add_parser("check", help="print breached/ok for each password")
+    check.add_argument("passwords", nargs="*")
+    check.add_argument("--index", help="index file (default: SPG_BREACH_INDEX or src/breach_index.bin)")
+    check.set_defaults(func=cmd_breach_check)
+
+
+def _passphrase_options(passphrase):
+    passphrase_commands = passphrase.add_subparsers(dest="passphrase_command", required=True)
+
+    compile_cmd = passphrase_commands.add_parser("compile", help="compile a text wordlist for use")
+    compile_cmd.add_argument("source", help="one word per line, or the EFF 'NUMBER<tab>word' layout")
+    compile_cmd.add_argument("-o", "--output", help="file to write (default: src/wordlist.bin)")
+    compile_cmd.set_defaults(func=cmd_passphrase_compile)
+
+    phrase = passphrase_commands.add_parser("generate", help="print new passphrases, one per line")
+    phrase.add_argument("-n", "--count", type=int, default=1)
+    phrase.add_argument("--words", type=int, help="words per passphrase (default: 6)")
+    phrase.add_argument("--separator", help="text between words (default: -)")
+    phrase.add_argument("--wordlist", help="compiled wordlist (default: SPG_WORDLIST or src/wordlist.bin)")
+    phrase.set_defaults(func=cmd_passphrase_generate)
+
+
+def _vault_options(vault):
+    vault_commands = vault.add_subparsers(dest="vault_command", required=True)
+
+    account_args = ArgumentParser(add_help=False)
+    account_args.add_argument("--account", help="account password (or set SPG_ACCOUNT)")
+
+    listing = vault_commands.add_parser("list", parents=[account_args],
+                                        help="list saved websites and usernames")
+    listing.set_defaults(func=cmd_vault_list)
+
+    add = vault_commands.add_parser("add", parents=[account_args],
+                                    help="save a password, generating one unless --secret is given")
+    add.add_argument("website")
+    add.add_argument("username")
+    add.add_argument("--secret", help="password to store instead of a generated one")
+    add.add_argument("--replace", action="store_true",
+                     help="update the entry if this website and username are already saved")
+    add_charset_options(add)
+    add.set_defaults(func=cmd_vault_add)
+
+    get = vault_commands.add_parser("get", parents=[account_args],
+                                    help="print the saved username and password for a website")
+    get.add_argument("website")
+    get.add_argument("--username", help="only the entry for this username")
+    get.set_defaults(func=cmd_vault_get)
+
+    export = vault_commands.add_parser("export", parents=[account_args],
+                                       help="write saved passwords as JSON")
+    export.add_argument("-o", "--output", default="-", help="file path or - for stdout")
+    export.set_defaults(func=cmd_vault_export)
+
+    migrate_cmd = vault_commands.add_parser("migrate", help="copy every account to another storage engine")
+    # Engine names are checked by open_storage, so parsing never loads storage
+    migrate_cmd.add_argument("--from", dest="source", default="json",
+                             help="engine to copy from: json, sqlite, sharded or binary (default: json)")
+    migrate_cmd.add_argument("--from-path", dest="source_path")
+    migrate_cmd.add_argument("--to", dest="target", default="sqlite",
+                             help="engine to copy to (default: sqlite)")
+    migrate_cmd.add_argument("--to-path", dest="target_path")
+    migrate_cmd.set_defaults(func=cmd_vault_migrate)
+
+    convert = vault_commands.add_parser("convert",
+                                        help="convert a users.json file to the binary format or back")
+    convert.add_argument("input", help="users.json to import, or a binary file to export")
+    convert.add_argument("output")
+    convert.set_defaults(func=cmd_vault_convert)
+
+    calibrate = vault_commands.add_parser("calibrate",
+                                          help="re-tune account key derivation for this machine")
+    calibrate.add_argument("--target-ms", type=float,
+                           help="time a login should spend deriving its key "
+                                "(default: SPG_KDF_TARGET_MS or 250)")
+    calibrate.set_defaults(func=cmd_vault_calibrate)
+
+
+# (name, help, function adding its options) of each command
+COMMANDS = (
+    ("generate", "print new passwords, one per line",
+     _generate_options),
+    ("score", "rate passwords given as arguments or on stdin (label and entropy bits)",
+     _score_options),
+    ("breach", "offline breached-password index",
+     _breach_options),
+    ("passphrase", "diceware-style passphrases",
+     _passphrase_options),
+    ("vault", "work with saved passwords",
+     _vault_options),
+)
+
+
+def build_parser(command=None):
+    """The command-line parser
+
+    argparse spends a good part of start-up on every option it is given, so
+    with command (the first argument) only that command's options are
+    added; the others are still listed in the top-level help.
+    """
+    parser = ArgumentParser(prog="secure-password-generator",
+                            description="Secure Password Generator (command line)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text, add_options in COMMANDS:
+        subparser = commands.add_parser(name, help=help_text)
+        if command is None or command == name:
+            add_options(subparser)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser(argv[0] if argv else None).parse_args(argv)
+    if getattr(args, "length", 1) < 1:
+        raise SystemExit("--length must be at least 1")
+    try:
+        return args.func(args)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head); stop quietly
+        sys.stdout = open(os.devnull, "w")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""Fixtures shared by the tests beside the modules they cover"""
+import os
+
+import pytest
+
+import kdf
+from storage import DEFAULT_PATHS, ENGINES, open_storage
+
+
+@pytest.fixture
+def fast_kdf(monkeypatch):
+    """Key derivation cheap enough for tests; every calibration gets a new salt"""
+    monkeypatch.setattr(kdf, "calibrate",
+                        lambda target_ms=None, algorithm=None: kdf.new_params("pbkdf2_sha256", 1000))
+
+
+@pytest.fixture(params=sorted(ENGINES))
+def store_path(request, tmp_path):
+    """(engine, path) of a new store, once for each engine"""
+    return request.param, str(tmp_path / os.path.basename(DEFAULT_PATHS[request.param]))
+
+
+@pytest.fixture
+def storage(store_path):
+    store = open_storage(*store_path)
+    yield store
+    store.close()
@@ -0,0 +1,193 @@
+"""Call timing and byte counters for the hot paths
+
+Off unless the app is started with SPG_STATS=1. The switch is read once at
+import: with it off, @timed returns the function unchanged, timer() hands
+back a shared do-nothing context manager and add() is an empty function, so
+instrumented code runs at full speed.
+
+With it on, each timed name keeps a call count, total, min and max, and a
+latency histogram with power-of-two microsecond buckets. Counters such as
+bytes_read and bytes_written are plain totals. The data is shown in the
+Diagnostics dialog (Ctrl+Shift+D in the main window) and written on exit
+to SPG_STATS_FILE, as Prometheus text if the name ends in .prom and JSON
+otherwise, or to stderr if no file is set.
+"""
+import atexit
+import contextlib
+import functools
+import os
+import sys
+import threading
+import time
+
+ENABLED = os.environ.get("SPG_STATS", "") not in ("", "0")
+
+# Histogram bucket i counts calls that took under 2**i microseconds;
+# the last bucket catches everything slower (about 67 s and up)
+BUCKETS = 27
+
+_lock = threading.Lock()
+_timings = {}
+_counters = {}
+
+
+class _Timing:
+    __slots__ = ("count", "total_ns", "min_ns", "max_ns", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.buckets = [0] * BUCKETS
+
+    def record(self, elapsed_ns):
+        bucket = min((elapsed_ns // 1000).bit_length(), BUCKETS - 1)
+        with _lock:
+            self.count += 1
+            self.total_ns += elapsed_ns
+            if self.min_ns is None or elapsed_ns < self.min_ns:
+                self.min_ns = elapsed_ns
+            if elapsed_ns > self.max_ns:
+                self.max_ns = elapsed_ns
+            self.buckets[bucket] += 1
+
+
+def _timing(name):
+    with _lock:
+        return _timings.setdefault(name, _Timing())
+
+
+def timed(name):
+    """Decorator recording every call of the function under name"""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        timing = _timing(name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timing.record(time.perf_counter_ns() - start)
+        return wrapper
+    return decorate
+
+
+class _Timer:
+    __slots__ = ("timing", "start")
+
+    def __init__(self, timing):
+        self.timing = timing
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.timing.record(time.perf_counter_ns() - self.start)
+
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+def timer(name):
+    """Context manager timing a block under name, for code that is not a whole function"""
+    if not ENABLED:
+        return _NO_TIMER
+    return _Timer(_timing(name))
+
+
+def _add(name, amount=1):
+    """Add amount to the counter called name"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def _add_disabled(name, amount=1):
+    pass
+
+
+add = _add if ENABLED else _add_disabled
+
+
+def snapshot():
+    """Every timing and counter as plain data"""
+    with _lock:
+        timings = {
+            name: {
+                "count": t.count,
+                "total_ms": t.total_ns / 1e6,
+                "mean_ms": t.total_ns / t.count / 1e6 if t.count else 0.0,
+                "min_ms": (t.min_ns or 0) / 1e6,
+                "max_ms": t.max_ns / 1e6,
+                # Upper bound in microseconds -> calls, skipping empty buckets
+                "histogram_us": {str(1 << i) if i < BUCKETS - 1 else "inf": n
+                                 for i, n in enumerate(t.buckets) if n},
+            }
+            for name, t in _timings.items()
+        }
+        return {"enabled": ENABLED, "timings": timings, "counters": dict(_counters)}
+
+
+def to_json():
+    # Imported here so the command line does not load json just to be timed
+    import json
+    return json.dumps(snapshot(), indent=2)
+
+
+def to_prometheus():
+    """snapshot() in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        if _timings:
+            lines.append("# HELP spg_call_duration_seconds Time spent in instrumented calls")
+            lines.append("# TYPE spg_call_duration_seconds histogram")
+        for name, t in _timings.items():
+            cumulative = 0
+            for i, n in enumerate(t.buckets[:-1]):
+                cumulative += n
+                lines.append(f'spg_call_duration_seconds_bucket{{name="{name}",'
+                             f'le="{(1 << i) / 1e6:g}"}} {cumulative}')
+            lines.append(f'spg_call_duration_seconds_bucket{{name="{name}",le="+Inf"}} {t.count}')
+            lines.append(f'spg_call_duration_seconds_sum{{name="{name}"}} {t.total_ns / 1e9:.9f}')
+            lines.append(f'spg_call_duration_seconds_count{{name="{name}"}} {t.count}')
+        for name, value in _counters.items():
+            lines.append(f"# TYPE spg_{name}_total counter")
+            lines.append(f"spg_{name}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+def report():
+    """Human-readable summary for the Diagnostics dialog"""
+    if not ENABLED:
+        return "Instrumentation is off. Start the app with SPG_STATS=1 to record timings.\n"
+    data = snapshot()
+    lines = [f"{'call':<24}{'count':>8}{'mean ms':>11}{'min ms':>10}{'max ms':>10}"]
+    for name, t in sorted(data["timings"].items()):
+        lines.append(f"{name:<24}{t['count']:>8}{t['mean_ms']:>11.3f}"
+                     f"{t['min_ms']:>10.3f}{t['max_ms']:>10.3f}")
+    lines.append("")
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"{name:<24}{value:>12,}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path=None):
+    """Write the stats to path (.prom for Prometheus, else JSON), or stderr"""
+    path = path or os.environ.get("SPG_STATS_FILE")
+    if path and path.endswith(".prom"):
+        text = to_prometheus()
+    else:
+        text = to_json() + "\n"
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stderr.write(text)
+
+
+if ENABLED:
+    atexit.register(dump)
@@ -0,0 +1,97 @@
+"""Background thread for vault I/O
+
+Tk callbacks hand storage operations to IOWorker.submit() and return at
+once; the single worker thread runs them in order. Completion callbacks are
+queued back and run on the Tk thread by poll(), which attach() schedules
+with after() so no widget is ever touched from the worker.
+
+Storage may hold writes back to coalesce them, so an operation returning
+does not mean its data is on disk. Given a commit function, the worker
+calls it whenever its queue runs dry and only then reports the operations
+since the last commit: on_done once commit() has returned, on_error with
+its exception if it raised.
+"""
+import queue
+import threading
+
+# How often attached windows check for finished operations, in ms
+POLL_INTERVAL = 50
+
+
+class IOWorker:
+    def __init__(self, commit=None):
+        self.commit = commit
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        # (on_done, on_error, result) of operations waiting for the next commit
+        self._uncommitted = []
+        self._thread = threading.Thread(target=self._run, name="vault-io", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            try:
+                if request is None:
+                    return
+                func, args, on_done, on_error = request
+                try:
+                    result = func(*args)
+                except Exception as exc:
+                    self._results.put((on_error, exc))
+                else:
+                    self._uncommitted.append((on_done, on_error, result))
+                # Before task_done, so flush() also waits for the commit
+                if self._requests.empty():
+                    self._commit()
+            finally:
+                self._requests.task_done()
+
+    def _commit(self):
+        finished, self._uncommitted = self._uncommitted, []
+        if finished and self.commit is not None:
+            try:
+                self.commit()
+            except Exception as exc:
+                for _, on_error, _ in finished:
+                    self._results.put((on_error, exc))
+                return
+        for on_done, _, result in finished:
+            self._results.put((on_done, result))
+
+    def submit(self, func, *args, on_done=None, on_error=None):
+        """Queue func(*args); on_done(result) or on_error(exc) runs on a later poll()"""
+        self._requests.put((func, args, on_done, on_error))
+
+    @property
+    def pending(self):
+        """Operations queued or running"""
+        return self._requests.unfinished_tasks
+
+    def poll(self):
+        """Run the callbacks of finished operations on the calling thread"""
+        while True:
+            try:
+                callback, value = self._results.get_nowait()
+            except queue.Empty:
+                return
+            if callback is not None:
+                callback(value)
+
+    def attach(self, widget, interval=POLL_INTERVAL):
+        """Poll from widget's event loop for as long as the widget exists"""
+        def tick():
+            if widget.winfo_exists():
+                self.poll()
+                widget.after(interval, tick)
+        widget.after(interval, tick)
+
+    def flush(self):
+        """Wait for every queued operation, then run its callbacks"""
+        self._requests.join()
+        self.poll()
+
+    def close(self):
+        self.flush()
+        self._requests.put(None)
+        self._thread.join()
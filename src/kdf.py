@@ -0,0 +1,91 @@
+"""Key derivation for account lookup
+
+Accounts are stored under a key derived from the account password with
+scrypt (or PBKDF2-SHA256 where this Python's OpenSSL lacks scrypt) instead
+of under the password itself. One random salt and one set of cost
+parameters are kept per store, so a login can still find its account with
+a single lookup.
+
+derive() returns 64 bytes: the first half is the stored lookup key, the
+second half never leaves memory and is available to the session as a
+secret only the password holder can reproduce.
+
+calibrate() benchmarks the host and picks the cost that takes about
+TARGET_MS per derivation, so brute-forcing the short account passwords
+costs an attacker the same time per guess that a login costs the user.
+"""
+import hashlib
+import os
+import time
+
+# Aim for a login to spend this long deriving its key (SPG_KDF_TARGET_MS)
+TARGET_MS = float(os.environ.get("SPG_KDF_TARGET_MS", "250"))
+
+KEY_SIZE = 32
+SALT_SIZE = 16
+
+SCRYPT_R = 8
+SCRYPT_P = 1
+# 2**20 blocks of 1 KiB is a 1 GiB working set; never go past it
+SCRYPT_MAX_N = 1 << 20
+PBKDF2_MIN_ITERATIONS = 100_000
+
+HAS_SCRYPT = hasattr(hashlib, "scrypt")
+
+
+def derive(password, params):
+    """The 64-byte key for password under params (see new_params)"""
+    secret = password.encode("utf-8")
+    salt = bytes.fromhex(params["salt"])
+    if params["algorithm"] == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p,
+                              maxmem=128 * r * (n + p + 2), dklen=2 * KEY_SIZE)
+    if params["algorithm"] == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", secret, salt, params["iterations"],
+                                   dklen=2 * KEY_SIZE)
+    raise ValueError(f"unknown key derivation algorithm: {params['algorithm']!r}")
+
+
+def split(derived):
+    """(lookup key as hex, session secret) from a derive() result"""
+    return derived[:KEY_SIZE].hex(), derived[KEY_SIZE:]
+
+
+def new_params(algorithm, cost, salt=None):
+    """Parameters for an algorithm at a cost (scrypt n, or PBKDF2 iterations)"""
+    salt = salt or os.urandom(SALT_SIZE).hex()
+    if algorithm == "scrypt":
+        return {"algorithm": "scrypt", "n": cost, "r": SCRYPT_R, "p": SCRYPT_P, "salt": salt}
+    if algorithm == "pbkdf2_sha256":
+        return {"algorithm": "pbkdf2_sha256", "iterations": cost, "salt": salt}
+    raise ValueError(f"unknown key derivation algorithm: {algorithm!r}")
+
+
+def measure(params, password="0000"):
+    """Seconds one derivation takes with params on this host"""
+    start = time.perf_counter()
+    derive(password, params)
+    return time.perf_counter() - start
+
+
+def calibrate(target_ms=TARGET_MS, algorithm=None):
+    """Parameters that take about target_ms per derivation here, with a new salt
+
+    scrypt's cost must be a power of two, so it gets the largest n that
+    stays within the target; PBKDF2 is scaled linearly from a probe.
+    """
+    algorithm = algorithm or ("scrypt" if HAS_SCRYPT else "pbkdf2_sha256")
+    target = target_ms / 1000
+    if algorithm == "scrypt":
+        n = 1 << 10
+        seconds = measure(new_params("scrypt", n))
+        # Time grows linearly with n; double while the next step still fits
+        while n < SCRYPT_MAX_N and seconds * 2 <= target:
+            n *= 2
+            seconds = measure(new_params("scrypt", n))
+        return new_params("scrypt", n)
+    probe = 20_000
+    seconds = min(measure(new_params(algorithm, probe)) for _ in range(3))
+    iterations = max(PBKDF2_MIN_ITERATIONS, int(probe * target / seconds) // 1000 * 1000)
+    return new_params(algorithm, iterations)
@@ -0,0 +1,175 @@
+"""Diceware-style passphrases from a precompiled, memory-mapped wordlist
+
+A wordlist (the EFF long list, or any text file with one word per line) is
+compiled once into a binary file: a small header, a table of word offsets
+and the UTF-8 words packed end to end. Opening it memory-maps the file, so
+start-up parses nothing and a 100k-word list costs no Python string
+objects until words are actually picked.
+
+    python src/cli.py passphrase compile eff_large_wordlist.txt
+    python src/cli.py passphrase generate -n 5 --words 6
+
+Each word is drawn uniformly with the OS random source, so a phrase of w
+words from a list of n words has exactly w * log2(n) bits of entropy.
+"""
+import math
+import mmap
+import os
+import struct
+from array import array
+
+MAGIC = b"SPGWORD\x00"
+HEADER = struct.Struct("<8sI")
+OFFSET = struct.Struct("<I")
+WORD_SPAN = struct.Struct("<II")
+
+DEFAULT_WORDS = 6
+DEFAULT_SEPARATOR = "-"
+
+# Where the app looks for a compiled list unless SPG_WORDLIST points elsewhere
+DEFAULT_WORDLIST = os.path.join(os.path.dirname(__file__), "wordlist.bin")
+
+
+def _parse_line(line):
+    """The word on one wordlist line, or None to skip it
+
+    Accepts plain lists and the EFF/diceware layout "16655\tword".
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    return line.split()[-1]
+
+
+def compile_wordlist(source, output=DEFAULT_WORDLIST):
+    """Compile a text wordlist into the binary format; returns the word count
+
+    Duplicate words are dropped, since they would make picks non-uniform
+    and overstate the entropy.
+    """
+    words = []
+    seen = set()
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            word = _parse_line(line)
+            if word is not None and word not in seen:
+                seen.add(word)
+                words.append(word)
+    if len(words) < 2:
+        raise ValueError(f"{source} has fewer than two distinct words")
+
+    encoded = [word.encode("utf-8") for word in words]
+    offsets = array("I", [0])
+    for word in encoded:
+        offsets.append(offsets[-1] + len(word))
+    if offsets.itemsize != 4:
+        raise ValueError("array('I') is not 32-bit on this platform")
+    if struct.pack("=I", 1) != OFFSET.pack(1):
+        offsets.byteswap()
+
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, len(encoded)))
+        out.write(offsets.tobytes())
+        out.write(b"".join(encoded))
+    os.replace(tmp_path, output)
+    return len(encoded)
+
+
+class Wordlist:
+    """Read-only view of a compiled wordlist; index it like a list"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            header = self._file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise ValueError(f"{path} is not a compiled wordlist")
+            magic, self.count = HEADER.unpack(header)
+            if magic != MAGIC or self.count < 2:
+                raise ValueError(f"{path} is not a compiled wordlist")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._blob = HEADER.size + (self.count + 1) * OFFSET.size
+            blob_size = OFFSET.unpack_from(self._map, self._blob - OFFSET.size)[0]
+            if len(self._map) != self._blob + blob_size:
+                self._map.close()
+                raise ValueError(f"{path} is truncated or corrupt")
+        except Exception:
+            self._file.close()
+            raise
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        start, end = WORD_SPAN.unpack_from(self._map, HEADER.size + i * OFFSET.size)
+        return self._map[self._blob + start:self._blob + end].decode("utf-8")
+
+    @property
+    def bits_per_word(self):
+        return math.log2(self.count)
+
+    def entropy(self, words=DEFAULT_WORDS):
+        """Bits of entropy in a phrase of this many words"""
+        return words * self.bits_per_word
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def random_indices(count, n):
+    """count uniform random integers in range(n), by rejection sampling"""
+    limit = (1 << 32) - (1 << 32) % n
+    picks = array("I")
+    while len(picks) < count:
+        # Ask for a little extra so one round is almost always enough
+        block = array("I")
+        block.frombytes(os.urandom(4 * (count - len(picks) + 8)))
+        picks.extend(value % n for value in block if value < limit)
+    return picks[:count]
+
+
+def generate_passphrase(wordlist, words=DEFAULT_WORDS, separator=DEFAULT_SEPARATOR):
+    """One passphrase of words picked uniformly from wordlist"""
+    if words < 1:
+        raise ValueError("a passphrase needs at least one word")
+    return separator.join([wordlist[i] for i in random_indices(words, len(wordlist))])
+
+
+def iter_passphrases(n, wordlist, words=DEFAULT_WORDS, separator=DEFAULT_SEPARATOR,
+                     batch=4096):
+    """Yield n passphrases, drawing the random words in batches"""
+    if words < 1:
+        raise ValueError("a passphrase needs at least one word")
+    size = len(wordlist)
+    while n > 0:
+        count = min(n, batch)
+        picks = random_indices(count * words, size)
+        chosen = [wordlist[i] for i in picks]
+        for start in range(0, len(chosen), words):
+            yield separator.join(chosen[start:start + words])
+        n -= count
+
+
+_default = None
+
+
+def default_wordlist():
+    """The wordlist configured for this install, or None if there isn't one"""
+    global _default
+    if _default is None:
+        path = os.environ.get("SPG_WORDLIST", DEFAULT_WORDLIST)
+        if not os.path.exists(path):
+            return None
+        _default = Wordlist(path)
+    return _default
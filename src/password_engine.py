@@ -0,0 +1,163 @@
+"""Headless password generation engine
+
+Randomness is read from the OS in large blocks and mapped onto the alphabet
+with rejection sampling, so every character is equally likely and no Tk
+variables are needed to produce a password.
+"""
+import functools
+import os
+import string
+
+UPPERCASE = string.ascii_uppercase
+LOWERCASE = string.ascii_lowercase
+DIGITS = string.digits
+SYMBOLS = "!@#$%^&*()_+-=[]{}|;:,.<>?"
+
+# Largest single read from os.urandom; bigger requests are split into blocks
+BLOCK_SIZE = 1 << 20
+
+# Passwords produced per block in iter_passwords
+BATCH_SIZE = 4096
+
+
+def _load_numpy():
+    """Import NumPy on first use, or return None when it is not installed
+
+    Kept out of module import so scripted callers do not pay NumPy's start-up
+    cost unless they ask for the array backend.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def build_charset(upper=True, lower=True, digits=True, symbols=True):
+    """Build the alphabet from the same options the GUI offers"""
+    chars = ""
+    if upper:
+        chars += UPPERCASE
+    if lower:
+        chars += LOWERCASE
+    if digits:
+        chars += DIGITS
+    if symbols:
+        chars += SYMBOLS
+    return chars
+
+
+@functools.lru_cache(maxsize=64)
+def _prepare(charset):
+    """Validate an alphabet and build the byte tables used for sampling"""
+    # Duplicates would make some characters more likely than others
+    charset = "".join(dict.fromkeys(charset))
+    if not charset:
+        raise ValueError("charset must contain at least one character")
+    try:
+        encoded = charset.encode("ascii")
+    except UnicodeEncodeError:
+        raise ValueError("charset must only contain ASCII characters") from None
+    if len(encoded) > 256:
+        raise ValueError("charset can hold at most 256 characters")
+
+    size = len(encoded)
+    # Bytes at or above limit would bias the modulo, so they are dropped
+    limit = 256 - (256 % size)
+    table = bytes(encoded[b % size] for b in range(limit)) + bytes(256 - limit)
+    reject = bytes(range(limit, 256))
+    return table, reject, limit
+
+
+def validate_charset(charset):
+    """Raise ValueError if charset cannot be sampled from"""
+    _prepare(charset)
+
+
+def _draw(count, table, reject, limit):
+    """Return count uniformly chosen alphabet bytes"""
+    out = bytearray()
+    while len(out) < count:
+        missing = count - len(out)
+        # Over-read by the expected rejection rate so one read usually suffices
+        size = min(missing * 256 // limit + 32, BLOCK_SIZE)
+        out += os.urandom(size).translate(table, reject)
+    del out[count:]
+    return out
+
+
+def random_chars(count, charset):
+    """Return a string of count characters drawn uniformly from charset"""
+    if count < 0:
+        raise ValueError("count must not be negative")
+    return _draw(count, *_prepare(charset)).decode("ascii")
+
+
+def generate_password(length, charset):
+    """Generate a single password"""
+    if length < 1:
+        raise ValueError("length must be at least 1")
+    return random_chars(length, charset)
+
+
+def iter_passwords(n, length, charset, batch=BATCH_SIZE):
+    """Yield n passwords, drawing randomness for a whole batch at a time"""
+    if length < 1:
+        raise ValueError("length must be at least 1")
+    if n < 0:
+        raise ValueError("n must not be negative")
+    prepared = _prepare(charset)
+    remaining = n
+    while remaining > 0:
+        count = min(batch, remaining)
+        chars = _draw(count * length, *prepared).decode("ascii")
+        for start in range(0, count * length, length):
+            yield chars[start:start + length]
+        remaining -= count
+
+
+def generate_array(n, length, charset):
+    """Generate an (n, length) uint8 array of password characters with NumPy
+
+    One OS-random buffer is read, out-of-range bytes are masked away in a
+    single vectorised step and the survivors index straight into the alphabet.
+    """
+    np = _load_numpy()
+    if np is None:
+        raise RuntimeError("NumPy is not installed")
+    if length < 1:
+        raise ValueError("length must be at least 1")
+    if n < 0:
+        raise ValueError("n must not be negative")
+    table, _, limit = _prepare(charset)
+    lookup = np.frombuffer(table, dtype=np.uint8)
+    count = n * length
+
+    # Expected bytes plus slack for the rejected ones; topped up if unlucky
+    raw = np.frombuffer(os.urandom(count * 256 // limit + 64), dtype=np.uint8)
+    kept = raw[raw < limit]
+    while kept.size < count:
+        extra = np.frombuffer(os.urandom((count - kept.size) * 256 // limit + 64),
+                              dtype=np.uint8)
+        kept = np.concatenate((kept, extra[extra < limit]))
+    return lookup[kept[:count]].reshape(n, length)
+
+
+def array_to_passwords(array):
+    """Convert a generate_array result into a list of strings"""
+    n, length = array.shape
+    chars = array.tobytes().decode("ascii")
+    return [chars[start:start + length] for start in range(0, n * length, length)]
+
+
+def generate_many(n, length, charset, backend="python"):
+    """Generate n passwords of the given length
+
+    backend is "python" or "numpy"; "numpy" quietly falls back to the
+    pure-Python path when NumPy is not installed.
+    """
+    if backend not in ("python", "numpy"):
+        raise ValueError(f"unknown backend: {backend!r}")
+    if backend == "numpy" and _load_numpy() is not None:
+        return array_to_passwords(generate_array(n, length, charset))
+    return list(iter_passwords(n, length, charset))
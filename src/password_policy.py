@@ -0,0 +1,246 @@
+"""Passwords that satisfy a policy by construction
+
+A PasswordPolicy says how many characters of each class a password needs,
+which characters are allowed at all and how long a run of one repeated
+character may be. generate() meets it in a single pass instead of drawing
+whole passwords until one happens to comply, and every password that
+meets the policy is equally likely:
+
+1. pick how many characters of each class the password gets, with odds in
+   proportion to how many compliant passwords have that mix (the number
+   of ways to place the classes times the characters each can be),
+2. draw that many characters from each class,
+3. shuffle with a Fisher-Yates shuffle driven by the secrets module.
+
+The odds for step 1 come from a table of running totals per class and
+number of places left, which stays small whatever the minimums. Placing only the required characters
+and filling the rest from everything, as this module first did, favours
+passwords with more of a required class than they need.
+
+max_run cannot be met that way, so policies with it pick one character at
+a time instead, weighted by how many compliant endings each choice leaves.
+That table has a row for every combination of counts the classes still
+need, so it grows quickly with the minimums; policies that would need more
+than MAX_RUN_STATES rows are refused rather than left to run for minutes.
+
+Retrying whole passwords gets very slow for strict policies on short
+lengths (three digits and three symbols in eight characters succeeds about
+once in a hundred draws); neither way here retries.
+"""
+import bisect
+import functools
+import itertools
+import math
+import re
+import secrets
+
+from password_engine import DIGITS, LOWERCASE, SYMBOLS, UPPERCASE, random_chars
+
+CLASSES = (
+    ("upper", UPPERCASE),
+    ("lower", LOWERCASE),
+    ("digits", DIGITS),
+    ("symbols", SYMBOLS),
+)
+
+# Characters easily mistaken for one another when read or typed
+AMBIGUOUS = "Il1|O0o`'\""
+
+# Most rows a max_run table may have, one per characters left, what each
+# class still needs, last class and run; about a tenth of a second here
+MAX_RUN_STATES = 20_000
+
+
+@functools.lru_cache(maxsize=4)
+def _class_counts(sizes, minimums, length):
+    """choices[c][r]: running totals of the ways to fill r places from classes c onwards
+
+    Entry i counts the passwords whose class c gets minimums[c] + i of the
+    r places, the rest going to later classes; the last total is all of them.
+    """
+    ways = [1] + [0] * length
+    choices = [None] * len(sizes)
+    for c in range(len(sizes) - 1, -1, -1):
+        powers = [sizes[c] ** k for k in range(length + 1)]
+        totals = []
+        for r in range(length + 1):
+            running = 0
+            column = []
+            for k in range(minimums[c], r + 1):
+                running += math.comb(r, k) * powers[k] * ways[r - k]
+                column.append(running)
+            totals.append(column)
+        choices[c] = totals
+        ways = [column[-1] if column else 0 for column in totals]
+    return choices
+
+
+def _moves(sizes, max_run, need, last, run):
+    """(class, repeats last character, characters to choose from, next state)
+
+    The possible next characters of a password in state (need, last, run):
+    need is what each class still needs, last the class of the last
+    character and run the length of the run it ends.
+    """
+    for c, size in enumerate(sizes):
+        after = need[:c] + (max(need[c] - 1, 0),) + need[c + 1:]
+        if c != last:
+            yield c, False, size, (after, c, 1)
+        else:
+            yield c, False, size - 1, (after, c, 1)
+            if run < max_run:
+                yield c, True, 1, (after, c, run + 1)
+
+
+def _run_states(sizes, minimums, max_run, length):
+    """Rows of the max_run table"""
+    return math.prod(n + 1 for n in minimums) * (1 + len(sizes) * max_run) * (length + 1)
+
+
+@functools.lru_cache(maxsize=4)
+def _count_completions(sizes, minimums, max_run, length):
+    """counts[r][state]: how many ways r more characters can finish a password"""
+    needs = list(itertools.product(*(range(n + 1) for n in minimums)))
+    tails = [(None, 0)] + [(c, run) for c in range(len(sizes)) for run in range(1, max_run + 1)]
+    counts = [{(need, *tail): 0 if any(need) else 1 for need in needs for tail in tails}]
+    for left in range(1, length + 1):
+        done = counts[-1]
+        counts.append({
+            (need, *tail): 0 if sum(need) > left else sum(
+                options * done[after]
+                for _, _, options, after in _moves(sizes, max_run, need, *tail) if options)
+            for need in needs for tail in tails})
+    return counts
+
+
+class PasswordPolicy:
+    """Rules a generated password must meet
+
+    upper, lower, digits and symbols give the minimum count of each class;
+    0 allows the class without requiring it and None leaves it out.
+    allowed is a regular expression matched against each single character
+    (e.g. "[A-Za-z0-9_-]"), max_run the longest run of one repeated
+    character (1 means no character twice in a row).
+    """
+
+    def __init__(self, length=16, upper=0, lower=0, digits=0, symbols=0,
+                 exclude_ambiguous=False, max_run=None, allowed=None):
+        if length < 1:
+            raise ValueError("length must be at least 1")
+        if max_run is not None and max_run < 1:
+            raise ValueError("max_run must be at least 1")
+        self.length = length
+        self.minimums = {"upper": upper, "lower": lower, "digits": digits, "symbols": symbols}
+        self.exclude_ambiguous = exclude_ambiguous
+        self.max_run = max_run
+        self.allowed = allowed
+
+        try:
+            pattern = re.compile(allowed) if allowed else None
+        except re.error as exc:
+            raise ValueError(f"allowed is not a valid regular expression: {exc}") from None
+        # Allowed characters of each class in use, and their union
+        self.pools = {}
+        for name, chars in CLASSES:
+            if self.minimums[name] is None:
+                continue
+            if self.minimums[name] < 0:
+                raise ValueError(f"minimum {name} count must not be negative")
+            pool = "".join(c for c in chars
+                           if not (exclude_ambiguous and c in AMBIGUOUS)
+                           and (pattern is None or pattern.fullmatch(c)))
+            if pool:
+                self.pools[name] = pool
+            elif self.minimums[name]:
+                raise ValueError(f"the policy requires {name} but allows none of them")
+        self.charset = "".join(self.pools.values())
+        if not self.charset:
+            raise ValueError("the policy allows no characters")
+        required = sum(n for n in self.minimums.values() if n)
+        if required > length:
+            raise ValueError(f"the policy requires {required} characters "
+                             f"but the length is {length}")
+        self._sizes = tuple(len(pool) for pool in self.pools.values())
+        needs = tuple(self.minimums[name] or 0 for name in self.pools)
+        self._counts = None
+        if max_run is None or max_run >= length:
+            # No run can be too long
+            self._choices = _class_counts(self._sizes, needs, length)
+            return
+        if _run_states(self._sizes, needs, max_run, length) > MAX_RUN_STATES:
+            raise ValueError("the minimums are too high to combine with max_run; "
+                             "lower them or leave max_run out")
+        self._start = (needs, None, 0)
+        self._counts = _count_completions(self._sizes, needs, max_run, length)
+        if not self._counts[length][self._start]:
+            raise ValueError("no password of this length can meet the policy's max_run")
+
+    @classmethod
+    def from_options(cls, length, upper=True, lower=True, digits=True, symbols=True, **rules):
+        """The GUI's rule: at least one character of every selected class"""
+        return cls(length, upper=1 if upper else None, lower=1 if lower else None,
+                   digits=1 if digits else None, symbols=1 if symbols else None, **rules)
+
+    def generate(self):
+        """One password meeting the policy, each such password equally likely"""
+        if self._counts is not None:
+            return self._generate_runs()
+        chars = []
+        left = self.length
+        for choices, (name, pool) in zip(self._choices, self.pools.items()):
+            # How many of this class: its minimum, plus one for each total passed
+            totals = choices[left]
+            count = (self.minimums[name] or 0) + bisect.bisect_right(
+                totals, secrets.randbelow(totals[-1]))
+            chars.extend(random_chars(count, pool))
+            left -= count
+        # Fisher-Yates
+        for i in range(len(chars) - 1, 0, -1):
+            j = secrets.randbelow(i + 1)
+            chars[i], chars[j] = chars[j], chars[i]
+        return "".join(chars)
+
+    def _generate_runs(self):
+        """generate() for max_run: one character at a time"""
+        pools = list(self.pools.values())
+        chars = []
+        state = self._start
+        for left in range(self.length, 0, -1):
+            # One draw picks both the kind of character and which one
+            pick = secrets.randbelow(self._counts[left][state])
+            for c, repeat, options, after in _moves(self._sizes, self.max_run, *state):
+                weight = options * self._counts[left - 1][after]
+                if pick < weight:
+                    break
+                pick -= weight
+            index = pick // self._counts[left - 1][after]
+            if repeat:
+                chars.append(chars[-1])
+            elif c == state[1]:
+                chars.append(pools[c].replace(chars[-1], "")[index])
+            else:
+                chars.append(pools[c][index])
+            state = after
+        return "".join(chars)
+
+    def iter_passwords(self, n):
+        """Yield n passwords meeting the policy"""
+        if n < 0:
+            raise ValueError("n must not be negative")
+        for _ in range(n):
+            yield self.generate()
+
+    def check(self, password):
+        """True if password meets the policy"""
+        if len(password) != self.length or any(c not in self.charset for c in password):
+            return False
+        for name, pool in self.pools.items():
+            if sum(c in pool for c in password) < (self.minimums[name] or 0):
+                return False
+        if self.max_run is not None:
+            run = 1
+            for a, b in zip(password, password[1:]):
+                run = run + 1 if a == b else 1
+                if run > self.max_run:
+                    return False
+        return True
@@ -1,12 +1,22 @@
-import tkinter as tk
-from tkinter import messagebox, simpledialog
-import secrets
-import string
-import datetime
-from auth_system import AuthenticationSystem, LoginWindow
+from auth_system import AuthenticationSystem, LoginWindow, load_tk, new_saved_entry
+from breach_check import is_breached
+import instrumentation
+from instrumentation import timed
+from passphrase import default_wordlist, generate_passphrase
+from password_policy import PasswordPolicy
+from storage import StorageError
+from strength import score_password
+
+# tkinter (and the widgets built on it) are imported when a window opens,
+# so importing this module stays cheap and works without a display
+tk = None
+messagebox = None
+
 
 class SecurePasswordGenerator:
     def __init__(self):
+        global tk, messagebox
+        tk, messagebox = load_tk()
         # Start with login screen
         print("🚀 Starting Secure Password Generator...")
         LoginWindow(self.on_login_success)
@@ -26,6 +36,10 @@ class SecurePasswordGenerator:
         self.setup_ui()
         self.center_window()
         self.app.protocol("WM_DELETE_WINDOW", self.on_closing)
+        # Deliver completed background saves on the Tk thread
+        self.auth.io.attach(self.app)
+        # Hidden diagnostics for slowness reports
+        self.app.bind("<Control-Shift-D>", lambda e: self.show_diagnostics())
         self.app.mainloop()
     
     def center_window(self):
@@ -120,14 +134,27 @@ class SecurePasswordGenerator:
                       selectcolor="#404040", font=("Arial", 9),
                       activebackground="#2b2b2b", activeforeground="white").grid(row=1, column=1, sticky="w", padx=5, pady=2)
         
-        # Generate button
-        generate_btn = tk.Button(self.app, text="🎲 Generate Secure Password", 
+        # Generate buttons
+        generate_frame = tk.Frame(self.app, bg="#2b2b2b")
+        generate_frame.pack(pady=15)
+        
+        generate_btn = tk.Button(generate_frame, text="🎲 Generate Secure Password", 
                                command=self.generate, 
                                bg="#4CAF50", fg="white", 
                                font=("Arial", 13, "bold"),
                                relief="flat", padx=15, pady=10,
                                cursor="hand2")
-        generate_btn.pack(pady=15)
+        generate_btn.pack(side="left")
+        
+        # Passphrases need a compiled wordlist (cli.py passphrase compile)
+        if default_wordlist() is not None:
+            passphrase_btn = tk.Button(generate_frame, text="📖 Passphrase", 
+                                     command=self.generate_passphrase, 
+                                     bg="#00897B", fg="white", 
+                                     font=("Arial", 13, "bold"),
+                                     relief="flat", padx=15, pady=10,
+                                     cursor="hand2")
+            passphrase_btn.pack(side="left", padx=(10, 0))
         
         # Result frame
         result_frame = tk.LabelFrame(self.app, text="Generated Password", 
@@ -188,41 +215,39 @@ class SecurePasswordGenerator:
     def update_length_label(self, value):
         self.length_label.config(text=str(int(float(value))))
     
+    @timed("generate")
     def generate(self):
-        chars = ""
-        if self.include_upper.get(): 
-            chars += string.ascii_uppercase
-        if self.include_lower.get(): 
-            chars += string.ascii_lowercase  
-        if self.include_numbers.get(): 
-            chars += string.digits
-        if self.include_symbols.get(): 
-            chars += "!@#$%^&*()_+-=[]{}|;:,.<>?"
-        
-        if not chars:
+        selected = dict(upper=self.include_upper.get(),
+                        lower=self.include_lower.get(),
+                        digits=self.include_numbers.get(),
+                        symbols=self.include_symbols.get())
+        
+        if not any(selected.values()):
             messagebox.showwarning("⚠️ Warning", "Please select at least one character type!")
             return
             
+        # Every ticked character type appears at least once
         length = self.length_var.get()
-        password = ''.join(secrets.choice(chars) for _ in range(length))
+        try:
+            policy = PasswordPolicy.from_options(length, **selected)
+        except ValueError as error:
+            messagebox.showwarning("⚠️ Warning", str(error))
+            return
+        password = policy.generate()
         self.result_var.set(password)
         
-        strength = self.calculate_strength(password)
-        self.status_label.config(text=f"Generated! Strength: {strength}")
+        strength = score_password(password)
+        self.status_label.config(
+            text=f"Generated! Strength: {strength.label} ({strength.entropy:.0f} bits)")
     
-    def calculate_strength(self, password):
-        score = 0
-        if len(password) >= 8: score += 1
-        if len(password) >= 12: score += 1
-        if any(c.isupper() for c in password): score += 1
-        if any(c.islower() for c in password): score += 1
-        if any(c.isdigit() for c in password): score += 1
-        if any(c in "!@#$%^&*()_+-=[]{}|;:,.<>?" for c in password): score += 1
-        
-        if score <= 2: return "🔴 Weak"
-        elif score <= 4: return "🟡 Medium"
-        elif score <= 5: return "🟢 Strong"
-        else: return "💚 Very Strong"
+    @timed("generate_passphrase")
+    def generate_passphrase(self):
+        wordlist = default_wordlist()
+        phrase = generate_passphrase(wordlist)
+        self.result_var.set(phrase)
+        self.status_label.config(
+            text=f"Generated passphrase! {wordlist.entropy():.0f} bits "
+                 f"({len(wordlist):,} words)")
     
     def copy_password(self):
         password = self.result_var.get()
@@ -307,24 +332,33 @@ class SecurePasswordGenerator:
                 username_entry.focus_set()
                 return
             
-            # Save to user's account
-            users = self.auth.load_users()
-            user_data = users[self.auth.current_user]
+            if is_breached(password):
+                if not messagebox.askyesno("⚠️ Breached Password",
+                        "This password appears in a known breach list.\n\n"
+                        "Save it anyway?"):
+                    return
             
-            saved_entry = {
-                'website': website,
-                'username': username,
-                'password': password,
-                'created': str(datetime.datetime.now()),
-                'strength': self.calculate_strength(password)
-            }
+            if self.auth.find_saved_password(self.auth.current_user, website, username):
+                if not messagebox.askyesno("Already Saved",
+                        f"A password for {username} on {website} is already saved.\n\n"
+                        "Replace it with this one?"):
+                    return
             
-            user_data.setdefault('saved_passwords', []).append(saved_entry)
-            users[self.auth.current_user] = user_data
-            self.auth.save_users(users)
+            def saved(replaced):
+                messagebox.showinfo("✅ Saved!", f"Password saved for {website}!")
+                self.status_label.config(text=f"💾 Password saved for {website}")
             
-            messagebox.showinfo("✅ Saved!", f"Password saved for {website}!")
-            self.status_label.config(text=f"💾 Password saved for {website}")
+            def failed(error):
+                messagebox.showerror("❌ Save Failed", 
+                    f"Could not save the password for {website}:\n\n{error}")
+                self.status_label.config(text=f"❌ Saving failed for {website}")
+            
+            # Save to user's account, updating the old entry in place; the
+            # write happens on the I/O thread so the window never freezes
+            saved_entry = new_saved_entry(website, username, password)
+            self.auth.upsert_saved_password_async(self.auth.current_user, saved_entry,
+                                                  on_done=saved, on_error=failed)
+            self.status_label.config(text=f"⏳ Saving password for {website}...")
             save_dialog.destroy()
         
         def cancel():
@@ -391,8 +425,8 @@ class SecurePasswordGenerator:
                 password_entry.focus_set()
                 return
             
-            # Verify email matches current user
-            if entered_password != self.auth.current_user:
+            # Checked against the key derived at login
+            if not self.auth.verify_password(entered_password):
                 messagebox.showerror("❌ Access Denied", 
                     "Password doesn't match your account! Access denied.")
                 password_entry.focus_set()
@@ -427,11 +461,11 @@ class SecurePasswordGenerator:
                  relief="flat", padx=20, pady=8,
                  cursor="hand2").pack(side="left", padx=10)
     
+    @timed("show_saved_passwords")
     def show_saved_passwords(self):
         """Display saved passwords after verification"""
-        users = self.auth.load_users()
-        user_data = users[self.auth.current_user]
-        saved_passwords = user_data.get('saved_passwords', [])
+        vault_index = self.auth.vault_index(self.auth.current_user)
+        saved_passwords = vault_index.entries
         
         if not saved_passwords:
             messagebox.showinfo("No Passwords", "No saved passwords found.")
@@ -454,77 +488,37 @@ class SecurePasswordGenerator:
                 font=("Arial", 16, "bold"), 
                 fg="#4caf50", bg="#2b2b2b").pack(pady=15)
         
-        # Create scrollable frame
-        canvas = tk.Canvas(view_window, bg="#2b2b2b", highlightthickness=0)
-        scrollbar = tk.Scrollbar(view_window, orient="vertical", command=canvas.yview)
-        scrollable_frame = tk.Frame(canvas, bg="#2b2b2b")
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        # Add saved passwords with better formatting
-        for i, entry in enumerate(saved_passwords, 1):
-            # Create frame for each password entry
-            entry_frame = tk.LabelFrame(scrollable_frame, 
-                                       text=f"🌐 {entry['website']}", 
-                                       font=("Arial", 12, "bold"),
-                                       fg="#00ff88", bg="#2b2b2b",
-                                       relief="ridge", bd=2)
-            entry_frame.pack(fill="x", padx=15, pady=8)
-            
-            # Info display
-            info_frame = tk.Frame(entry_frame, bg="#2b2b2b")
-            info_frame.pack(fill="x", padx=10, pady=8)
-            
-            # Username/Email
-            tk.Label(info_frame, text=f"👤 Username/Email: {entry.get('username', 'N/A')}", 
-                    font=("Arial", 10), fg="white", bg="#2b2b2b",
-                    anchor="w").pack(fill="x", pady=2)
-            
-            # Password (hidden by default)
-            password_frame = tk.Frame(info_frame, bg="#2b2b2b")
-            password_frame.pack(fill="x", pady=5)
-            
-            tk.Label(password_frame, text="🔑 Password:", 
-                    font=("Arial", 10), fg="white", bg="#2b2b2b").pack(side="left")
-            
-            password_var = tk.StringVar(value="••••••••••••")
-            password_display = tk.Entry(password_frame, textvariable=password_var,
-                                       font=("Courier", 10), bg="#404040", fg="#000000",
-                                       state="readonly", width=25, relief="flat", bd=3)
-            password_display.pack(side="left", padx=10)
-            
-            # Show/Hide button
-            def create_toggle_func(pwd=entry['password'], var=password_var):
-                def toggle():
-                    if var.get() == "••••••••••••":
-                        var.set(pwd)
-                        toggle_btn.config(text="🙈 Hide")
-                    else:
-                        var.set("••••••••••••")
-                        toggle_btn.config(text="👁️ Show")
-                return toggle
-            
-            toggle_btn = tk.Button(password_frame, text="👁️ Show",
-                                  command=create_toggle_func(),
-                                  bg="#000000", fg="white", font=("Arial", 8),
-                                  relief="flat", padx=8, pady=2, cursor="hand2")
-            toggle_btn.pack(side="left", padx=5)
-            
-            # Additional info
-            info_text = f"💪 Strength: {entry.get('strength', 'Unknown')} | 📅 Created: {entry['created'][:19]}"
-            tk.Label(info_frame, text=info_text, 
-                    font=("Arial", 9), fg="#cccccc", bg="#2b2b2b",
-                    anchor="w").pack(fill="x", pady=2)
+        # Search box, filtering by website or username as you type
+        search_frame = tk.Frame(view_window, bg="#2b2b2b")
+        search_frame.pack(fill="x", padx=15)
+        
+        tk.Label(search_frame, text="🔍 Search:", 
+                font=("Arial", 10), fg="white", bg="#2b2b2b").pack(side="left")
+        
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(search_frame, textvariable=search_var, 
+                              font=("Arial", 11), bg="#404040", fg="white", 
+                              insertbackground="white", relief="flat", bd=5)
+        search_entry.pack(side="left", fill="x", expand=True, padx=10)
+        search_entry.focus_set()
+        
+        # Only the rows in view get widgets; they are reused while scrolling
+        from vault_view import VirtualVaultList
+        vault_list = VirtualVaultList(view_window, saved_passwords,
+                                      reveal=self.auth.reveal_password)
+        vault_list.pack(fill="both", expand=True, padx=(10,0), pady=10)
+        
+        def filter_entries(*_):
+            query = search_var.get()
+            if not query.strip():
+                vault_list.set_entries(saved_passwords)
+                return
+            positions = vault_index.search(query)
+            vault_list.set_entries([saved_passwords[p] for p in positions])
         
-        # Pack canvas and scrollbar
-        canvas.pack(side="left", fill="both", expand=True, padx=(10,0), pady=10)
-        scrollbar.pack(side="right", fill="y", pady=10)
+        search_var.trace_add("write", filter_entries)
+        # Build the search index while the window is idle, before the first keystroke
+        view_window.after_idle(vault_index.prepare_search)
         
         # Close button
         close_btn = tk.Button(view_window, text="✖️ Close", 
@@ -535,15 +529,70 @@ class SecurePasswordGenerator:
                              cursor="hand2")
         close_btn.pack(pady=15)
     
+    def show_diagnostics(self):
+        """Timings, counters and storage cache stats (Ctrl+Shift+D)"""
+        dialog = tk.Toplevel(self.app)
+        dialog.title("🩺 Diagnostics")
+        dialog.geometry("560x420")
+        dialog.configure(bg="#2b2b2b")
+        dialog.transient(self.app)
+        
+        text = tk.Text(dialog, font=("Courier", 9), bg="#1a1a1a", fg="white",
+                       relief="flat", bd=5)
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        def refresh():
+            cache = self.auth.cache_stats()
+            lines = [instrumentation.report(), "storage:"]
+            lines += [f"  {name:<22}{value:>12,.1f}" if isinstance(value, float)
+                      else f"  {name:<22}{value:>12,}" for name, value in cache.items()]
+            text.config(state="normal")
+            text.delete("1.0", tk.END)
+            text.insert("1.0", "\n".join(lines))
+            text.config(state="disabled")
+        
+        def copy_json():
+            self.app.clipboard_clear()
+            self.app.clipboard_append(instrumentation.to_json())
+        
+        buttons_frame = tk.Frame(dialog, bg="#2b2b2b")
+        buttons_frame.pack(pady=(0, 10))
+        
+        tk.Button(buttons_frame, text="🔄 Refresh", command=refresh,
+                 bg="#2196f3", fg="white", font=("Arial", 10),
+                 relief="flat", padx=15, pady=4, cursor="hand2").pack(side="left", padx=5)
+        tk.Button(buttons_frame, text="📋 Copy JSON", command=copy_json,
+                 bg="#4caf50", fg="white", font=("Arial", 10),
+                 relief="flat", padx=15, pady=4, cursor="hand2").pack(side="left", padx=5)
+        tk.Button(buttons_frame, text="✖️ Close", command=dialog.destroy,
+                 bg="#f44336", fg="white", font=("Arial", 10),
+                 relief="flat", padx=15, pady=4, cursor="hand2").pack(side="left", padx=5)
+        
+        refresh()
+    
+    def close_session(self):
+        """Let pending saves finish before the session goes away
+
+        Returns False if they could not be written and the user chose to
+        stay, so nothing is lost without them knowing.
+        """
+        try:
+            self.auth.close()
+        except StorageError as error:
+            return messagebox.askyesno("❌ Save Failed",
+                f"Your latest changes could not be saved:\n\n{error}\n\n"
+                "Close anyway and lose them?")
+        return True
+    
     def logout(self):
         result = messagebox.askyesno("Logout", "Are you sure you want to logout?")
-        if result:
+        if result and self.close_session():
             self.app.destroy()
             # Restart login screen
             SecurePasswordGenerator()
     
     def on_closing(self):
-        if messagebox.askokcancel("Quit", "Do you want to quit the application?"):
+        if messagebox.askokcancel("Quit", "Do you want to quit the application?") and self.close_session():
             self.app.destroy()
 
 # Run the application
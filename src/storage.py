@@ -0,0 +1,1154 @@
+"""Storage engines behind AuthenticationSystem
+
+Every engine stores the same data: accounts keyed by their login key, each
+with a list of saved-password records. Storage holds whole-store defaults so
+a simple engine only needs load_all/save_all; engines that can do better
+override the targeted operations.
+
+    SPG_STORAGE=json    users.json next to this module (default), with a
+                        users.idx of where each account sits in it
+    SPG_STORAGE=sqlite  users.db with indexed users and saved_passwords tables
+    SPG_STORAGE=sharded users.d/ with an index file and one vault file per user
+    SPG_STORAGE=binary  users.vault in the compact format of vault_codec
+
+SPG_STORAGE_PATH overrides the file location.
+
+Several processes may share a store (two app instances, or the app and the
+CLI). The file engines commit under a lock held only for the commit itself,
+one per file, so writers to different sharded vaults never wait for each
+other; a change another process committed first is never overwritten (see
+CachedJsonFile.update). SQLite does its own locking.
+"""
+import contextlib
+import json
+import os
+import re
+import secrets
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+import instrumentation
+from instrumentation import timed, timer
+from store_index import RecordIndex, build_index, dump_store
+from vault_index import entry_key
+from vault_records import compact_entry, compact_store, compact_user, plain_user, to_json
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_PATHS = {
+    "json": os.path.join(DATA_DIR, "users.json"),
+    "sqlite": os.path.join(DATA_DIR, "users.db"),
+    "sharded": os.path.join(DATA_DIR, "users.d"),
+    "binary": os.path.join(DATA_DIR, "users.vault"),
+}
+
+
+# Durability levels a write can ask for, weakest first:
+#   lazy    coalesced with other writes, not fsynced
+#   normal  coalesced, file fsynced before it replaces the old one
+#   full    committed at once, file and directory fsynced
+DURABILITY = ("lazy", "normal", "full")
+
+# Seconds a commit waits for further writes to fold into it (SPG_COMMIT_DELAY)
+COMMIT_DELAY = float(os.environ.get("SPG_COMMIT_DELAY", "0.05"))
+
+
+class StorageError(Exception):
+    """The store could not be written"""
+
+
+def _stronger(a, b):
+    if a is None:
+        return b
+    return a if DURABILITY.index(a) >= DURABILITY.index(b) else b
+
+
+def atomic_write(path, data, durability="normal"):
+    """Replace path with data (bytes) so readers see the old or new file, never half of one
+
+    Returns the number of bytes written.
+    """
+    # Imported on first commit; tempfile is slow to import and reads never need it
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp",
+                                    prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            if durability != "lazy":
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durability == "full" and hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable (POSIX only)
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return len(data)
+
+
+def _entry_position(entries, position, entry):
+    """Where the record for entry's website and username is, with position as a hint
+
+    Another process may have saved entries since the caller looked, so the
+    record is found by what it is for rather than trusted to be at position;
+    the newest one wins, as in VaultIndex. Raises KeyError if there is none.
+    """
+    key = entry_key(entry)
+    if position < len(entries) and entry_key(entries[position]) == key:
+        return position
+    for found in range(len(entries) - 1, -1, -1):
+        if entry_key(entries[found]) == key:
+            return found
+    raise KeyError(key)
+
+
+class Storage:
+    """Interface for account storage engines
+
+    Writes take an optional durability level from DURABILITY; None means
+    "normal". Engines serialise their own state with self.lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+
+    def load_all(self):
+        """Return every account as {key: user_data}"""
+        raise NotImplementedError
+
+    def save_all(self, users, durability=None):
+        """Replace the whole store with users"""
+        raise NotImplementedError
+
+    def get_user(self, key):
+        """Return one account's data, or None"""
+        return self.load_all().get(key)
+
+    def has_user(self, key):
+        return self.get_user(key) is not None
+
+    def put_user(self, key, data, durability=None):
+        """Insert or replace one account, including its saved passwords"""
+        with self.lock:
+            users = self.load_all()
+            users[key] = data
+            self.save_all(users, durability)
+
+    def update_user(self, key, fields, durability=None):
+        """Set some top-level fields of an existing account, such as its name
+
+        Unlike put_user this leaves everything else alone, including saved
+        passwords another process has just added. fields must not include
+        saved_passwords. Raises KeyError if there is no such account.
+        """
+        with self.lock:
+            users = self.load_all()
+            users[key].update(fields)
+            self.save_all(users, durability)
+
+    def saved_passwords(self, key):
+        """Return the saved-password records of one account"""
+        user = self.get_user(key)
+        return user.get('saved_passwords', []) if user else []
+
+    def add_saved_password(self, key, entry, durability=None):
+        """Append one saved-password record to an account"""
+        with self.lock:
+            users = self.load_all()
+            users[key].setdefault('saved_passwords', []).append(entry)
+            self.save_all(users, durability)
+
+    def update_saved_password(self, key, position, entry, durability=None):
+        """Replace the saved-password record for entry's website and username
+
+        position is where the caller last saw it; see _entry_position.
+        """
+        with self.lock:
+            users = self.load_all()
+            entries = users[key]['saved_passwords']
+            entries[_entry_position(entries, position, entry)] = entry
+            self.save_all(users, durability)
+
+    def delete_user(self, key, durability=None):
+        """Remove one account and its saved passwords, if it exists"""
+        with self.lock:
+            users = self.load_all()
+            if users.pop(key, None) is not None:
+                self.save_all(users, durability)
+
+    def version(self, key):
+        """A value that changes whenever a commit may have changed an account
+
+        Lets callers that keep their own view of an account, like the vault
+        index, tell when another process has written to it. Engines that
+        cannot tell return a new object every time.
+        """
+        return object()
+
+    def load_meta(self):
+        """Store-wide settings such as the key derivation parameters, as a dict"""
+        raise NotImplementedError
+
+    def save_meta(self, meta, durability=None):
+        raise NotImplementedError
+
+    def get_meta(self, name, default=None):
+        return self.load_meta().get(name, default)
+
+    def set_meta(self, name, value, durability=None):
+        with self.lock:
+            meta = dict(self.load_meta())
+            meta[name] = value
+            self.save_meta(meta, durability)
+
+    def update_meta(self, name, change, durability=None):
+        """Set one setting to change(its stored value or None), atomically
+
+        Committed at once. Engines shared between processes may call change
+        again with what another process stored first, so it must not modify
+        its argument. Returns the value now stored.
+        """
+        with self.lock:
+            meta = dict(self.load_meta())
+            meta[name] = change(meta.get(name))
+            self.save_meta(meta, durability)
+            self.flush()
+            return meta[name]
+
+    def cache_stats(self):
+        """Counters for engines that cache the store in memory"""
+        return {}
+
+    def flush(self):
+        """Commit any writes still waiting to be coalesced"""
+
+    def close(self):
+        self.flush()
+
+
+def _new_stats():
+    return {'hits': 0, 'misses': 0, 'commits': 0, 'bytes_written': 0, 'conflicts': 0,
+            'started': time.monotonic()}
+
+
+def _report(stats):
+    """Public view of an engine's counters, with the commit rate"""
+    report = dict(stats)
+    elapsed = time.monotonic() - report.pop('started')
+    report['commits_per_sec'] = report['commits'] / elapsed if elapsed > 0 else 0.0
+    return report
+
+
+_GENERATION = struct.Struct("<Q")
+
+
+class FileLock:
+    """A lock shared between processes, and a commit counter, for one data file
+
+    Both live in a hidden file beside the data file (".users.json.lock");
+    the data file is replaced on every commit, so it cannot hold a lock
+    itself. The counter lets a process tell that someone else committed
+    since it read the file, which a stat() cannot always show: a rewrite
+    of the same size can land within the same mtime tick, on a reused inode.
+    """
+
+    def __init__(self, path):
+        directory, name = os.path.split(os.path.abspath(path))
+        self.path = os.path.join(directory, f".{name}.lock")
+
+    def generation(self):
+        """Commits made so far by every process, 0 if none yet"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read(_GENERATION.size)
+        except OSError:
+            return 0
+        return _GENERATION.unpack(data)[0] if len(data) == _GENERATION.size else 0
+
+    @contextlib.contextmanager
+    def held(self):
+        """Hold the lock exclusively; yields the file descriptor of the lock file"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                # A byte past the counter, so generation() can still read it
+                os.lseek(fd, _GENERATION.size, os.SEEK_SET)
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after ten seconds; keep waiting
+                        continue
+            try:
+                yield fd
+            finally:
+                if fcntl is None:
+                    os.lseek(fd, _GENERATION.size, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            # Closing also releases an flock
+            os.close(fd)
+
+    @staticmethod
+    def read_generation(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        data = os.read(fd, _GENERATION.size)
+        return _GENERATION.unpack(data)[0] if len(data) == _GENERATION.size else 0
+
+    @staticmethod
+    def write_generation(fd, generation):
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, _GENERATION.pack(generation))
+
+
+class CachedJsonFile:
+    """One JSON file whose parsed contents are kept in memory
+
+    The cache is revalidated with a single stat() (mtime, size and inode),
+    so repeated reads do not re-parse an unchanged file. load returns the
+    cached object itself; hand it back to save after changing it.
+
+    records, if given, converts freshly parsed data to the compact records
+    of vault_records (compact_store for a whole store, compact_user for one
+    account); anything they produce is written back out as plain JSON.
+
+    Saves are write-behind: they mark the data dirty and a commit runs
+    commit_delay seconds later, so a burst of saves costs one write. Each
+    commit goes to a temporary file that atomically replaces the old one.
+    A "full" save, flush() and close() commit straight away.
+
+    A commit that fails in the background is kept pending and its error in
+    last_error; from then on every save commits straight away, raising
+    StorageError for as long as committing keeps failing.
+
+    Commits hold the file's FileLock. If another process has committed
+    since this one read the file, the commit starts again from that
+    process's data and reapplies the changes made through update(); a
+    save() of a whole new object replaces the file as it always did. A
+    change that no longer applies (its account was deleted or moved to a
+    new key meanwhile) is left out of the commit, which then raises
+    StorageError, or if it ran in the background, the next flush() does.
+    """
+
+    def __init__(self, path, stats, lock, commit_delay=None, records=None):
+        self.path = path
+        self.stats = stats
+        self.lock = lock
+        self.records = records
+        self.commit_delay = COMMIT_DELAY if commit_delay is None else commit_delay
+        self.last_error = None
+        self.file_lock = FileLock(path)
+        self._data = None
+        self._stamp = None
+        # FileLock generation of the data in the cache
+        self._generation = None
+        # Strongest durability asked for by the uncommitted saves, or None
+        self._pending = None
+        # update() changes not yet committed; None once save() replaced the data
+        self._changes = []
+        # StorageError for changes a background commit had to leave out
+        self._dropped = None
+        self._timer = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _parse(self, f):
+        return json.load(f)
+
+    def _serialize(self, data):
+        return json.dumps(data, indent=2, default=to_json).encode('utf-8')
+
+    @timed("store_load")
+    def _read(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rb') as f:
+                    data = self._parse(f) or {}
+            except (ValueError, OSError):
+                return {}
+            return self.records(data) if self.records else data
+        return {}
+
+    def load(self):
+        with self.lock:
+            # Uncommitted saves are newer than anything on disk
+            if self._pending is not None:
+                self.stats['hits'] += 1
+                return self._data
+            stamp = self._file_stamp()
+            if self._data is not None and stamp == self._stamp:
+                self.stats['hits'] += 1
+                return self._data
+            self.stats['misses'] += 1
+            # Counter before data, so a commit landing in between counts as a conflict
+            self._generation = self.file_lock.generation()
+            self._data = self._read()
+            self._stamp = stamp
+            if stamp is not None:
+                instrumentation.add("bytes_read", stamp[1])
+            return self._data
+
+    def save(self, data, durability=None):
+        with self.lock:
+            self._data = data
+            self._changes = None
+            self._schedule(durability)
+
+    def update(self, change, durability=None):
+        """Apply change(data) to the cached data and save it
+
+        The change is kept until it is committed, so if another process
+        commits first it is made again on top of that process's data rather
+        than overwriting it. change should only touch what it means to
+        change, and may raise LookupError when what it changes is gone.
+        """
+        with self.lock:
+            change(self.load())
+            if self._changes is not None:
+                self._changes.append(change)
+            self._schedule(durability)
+
+    def _schedule(self, durability):
+        with self.lock:
+            self._pending = _stronger(self._pending, durability or "normal")
+            # After a failed background commit, retry (and report) right now
+            if self._pending == "full" or self.commit_delay <= 0 or self.last_error is not None:
+                self.flush()
+            elif self._timer is None:
+                # Non-daemon, so a pending commit still lands if the process exits
+                self._timer = threading.Timer(self.commit_delay, self._commit_later)
+                self._timer.start()
+
+    def _commit_later(self):
+        try:
+            self.flush()
+        except StorageError as exc:
+            # A failed write is kept pending in last_error, and the next save or
+            # flush retries and raises it; left-out changes are reported once
+            if exc is not self.last_error:
+                self._dropped = exc
+
+    def flush(self):
+        """Commit the cached data now if it has unsaved changes"""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending is None:
+                if self._dropped is not None:
+                    error, self._dropped = self._dropped, None
+                    raise error
+                return
+            dropped = 0
+            try:
+                with timer("store_commit"), self.file_lock.held() as fd:
+                    generation = FileLock.read_generation(fd)
+                    if generation != self._generation and self._changes:
+                        dropped = self._merge()
+                    if dropped and dropped == len(self._changes):
+                        # Nothing left to write; the file stays as the other process left it
+                        self._generation = generation
+                        self._stamp = self._file_stamp()
+                    else:
+                        data = self._serialize(self._data)
+                        written = atomic_write(self.path, data, self._pending)
+                        FileLock.write_generation(fd, generation + 1)
+                        self._generation = generation + 1
+                        self._stamp = self._file_stamp()
+                        self.stats['commits'] += 1
+                        self.stats['bytes_written'] += written
+                        instrumentation.add("bytes_written", written)
+                        self._committed()
+                    self._pending = None
+                    self._changes = []
+                    self.last_error = None
+            except OSError as exc:
+                self.last_error = StorageError(f"could not write {self.path}: {exc}")
+                raise self.last_error from exc
+            if dropped:
+                raise StorageError(f"{dropped} change(s) to {self.path} were not saved: "
+                                   "another process removed what they changed")
+
+    def _merge(self):
+        """Reapply the uncommitted changes to the file as another process left it
+
+        Returns how many no longer applied and were left out.
+        """
+        self.stats['conflicts'] += 1
+        data = self._read()
+        dropped = 0
+        for change in self._changes:
+            try:
+                change(data)
+            except LookupError:
+                # What it changed was removed meanwhile, e.g. an account that
+                # was deleted or moved to a new key
+                dropped += 1
+        self._data = data
+        return dropped
+
+    def _committed(self):
+        """Called after each commit, with the new file's stamp in self._stamp"""
+
+    def close(self):
+        """Commit any pending changes and release whatever is held open"""
+        self.flush()
+
+    def lookup(self, key):
+        """One top-level value of the cached data, or None"""
+        return self.load().get(key)
+
+
+class IndexedJsonFile(CachedJsonFile):
+    """A CachedJsonFile of accounts that also keeps an index of them
+
+    Each commit writes the index (see store_index) beside the file, and
+    lookup() uses it to decode a single account instead of loading the
+    whole file, so long as nothing newer is cached and the index still
+    matches the file. Accounts decoded that way are kept, like the whole
+    file would be, until the file changes.
+    """
+
+    def __init__(self, path, stats, lock, commit_delay=None, records=None):
+        super().__init__(path, stats, lock, commit_delay, records)
+        self.index_path = f"{os.path.splitext(path)[0]}.idx"
+        self.stats.setdefault('index_lookups', 0)
+        self._spans = None
+        self._reader = None
+        self._found = {}
+
+    def _serialize(self, data):
+        # The mapping must go before the file it views is replaced (Windows)
+        self._close_reader()
+        data, self._spans = dump_store(data)
+        return data
+
+    def _committed(self):
+        spans, self._spans = self._spans, None
+        if spans is None or self._stamp is None:
+            return
+        try:
+            # Lazy is enough: an index left stale by a crash fails its stamp check
+            atomic_write(self.index_path, build_index(spans, self._stamp), "lazy")
+        except OSError:
+            # Lookups fall back to loading the whole file
+            pass
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._found = {}
+
+    def close(self):
+        with self.lock:
+            super().close()
+            self._close_reader()
+
+    @timed("store_lookup")
+    def lookup(self, key):
+        with self.lock:
+            if self._pending is None:
+                stamp = self._file_stamp()
+                if stamp is not None and (self._data is None or stamp != self._stamp):
+                    if self._reader is None or self._reader.stamp != stamp:
+                        self._close_reader()
+                        self._reader = RecordIndex.open(self.index_path, self.path)
+                    if self._reader is not None:
+                        user = self._found.get(key)
+                        if user is not None:
+                            self.stats['hits'] += 1
+                            return user
+                        try:
+                            user = self._reader.find(key)
+                        except ValueError:
+                            self._close_reader()
+                        else:
+                            self.stats['index_lookups'] += 1
+                            if user is not None:
+                                user = self._found[key] = compact_user(user)
+                            return user
+            return super().lookup(key)
+
+
+class CachedVaultFile(CachedJsonFile):
+    """A CachedJsonFile holding the store in the binary format of vault_codec"""
+
+    def _parse(self, f):
+        # Imported here so the JSON engines never load the codec
+        import vault_codec
+        return vault_codec.load(f)
+
+    def _serialize(self, data):
+        import vault_codec
+        return vault_codec.dumps({key: plain_user(user) for key, user in data.items()})
+
+
+class JsonStorage(Storage):
+    """The original single users.json layout, cached by IndexedJsonFile
+
+    Store settings live beside it in users.meta.json, so users.json keeps
+    holding nothing but accounts, and users.idx locates each account in it
+    so a login decodes one account rather than all of them.
+    """
+
+    file_class = IndexedJsonFile
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.stats = _new_stats()
+        self._file = self.file_class(path, self.stats, self.lock, records=compact_store)
+        root = os.path.splitext(path)[0]
+        self._meta = CachedJsonFile(f"{root}.meta.json", self.stats, self.lock)
+
+    def load_all(self):
+        return self._file.load()
+
+    def save_all(self, users, durability=None):
+        self._file.save(users, durability)
+
+    def get_user(self, key):
+        return self._file.lookup(key)
+
+    # Targeted writes go through update(), so another process's changes survive them
+
+    def put_user(self, key, data, durability=None):
+        def change(users):
+            users[key] = data
+        self._file.update(change, durability)
+
+    def add_saved_password(self, key, entry, durability=None):
+        def change(users):
+            users[key].setdefault('saved_passwords', []).append(entry)
+        self._file.update(change, durability)
+
+    def update_user(self, key, fields, durability=None):
+        def change(users):
+            users[key].update(fields)
+        self._file.update(change, durability)
+
+    def update_saved_password(self, key, position, entry, durability=None):
+        def change(users):
+            entries = users[key]['saved_passwords']
+            entries[_entry_position(entries, position, entry)] = entry
+        self._file.update(change, durability)
+
+    def delete_user(self, key, durability=None):
+        def change(users):
+            del users[key]
+        with self.lock:
+            if key in self._file.load():
+                self._file.update(change, durability)
+
+    def version(self, key):
+        # Every commit to the file, by any process, bumps its generation
+        return self._file.file_lock.generation()
+
+    def load_meta(self):
+        return self._meta.load()
+
+    def save_meta(self, meta, durability=None):
+        self._meta.save(meta, durability)
+
+    def set_meta(self, name, value, durability=None):
+        def change(meta):
+            meta[name] = value
+        self._meta.update(change, durability)
+
+    def update_meta(self, name, change, durability=None):
+        def apply(meta):
+            meta[name] = change(meta.get(name))
+        with self.lock:
+            self._meta.update(apply, durability)
+            self._meta.flush()
+            return self._meta.load().get(name)
+
+    def cache_stats(self):
+        with self.lock:
+            return _report(self.stats)
+
+    def flush(self):
+        with self.lock:
+            self._file.flush()
+            self._meta.flush()
+
+    def close(self):
+        with self.lock:
+            self._file.close()
+            self._meta.close()
+
+
+class BinaryStorage(JsonStorage):
+    """JsonStorage with the accounts in users.vault, in vault_codec's format
+
+    Several times smaller and quicker to load and save than users.json.
+    Settings stay in the JSON file users.meta.json beside it. There is no
+    per-account index: accounts share the string table of earlier records,
+    so one cannot be decoded on its own.
+    """
+
+    file_class = CachedVaultFile
+
+
+_SHARD_NAME = re.compile(r"[0-9A-Za-z_-]+")
+
+
+class ShardedStorage(Storage):
+    """A small index file plus one vault file per account
+
+        <path>/index.json              {user key: user_id}
+        <path>/vaults/<user_id>.json   that account's data
+        <path>/meta.json               store settings
+
+    Saving a password rewrites only the owner's vault file, and a login
+    reads only the index and one vault. Each file has its own FileLock, so
+    processes saving to different accounts never wait for one another.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.vault_dir = os.path.join(path, "vaults")
+        os.makedirs(self.vault_dir, exist_ok=True)
+        self.stats = _new_stats()
+        self._index = CachedJsonFile(os.path.join(path, "index.json"), self.stats, self.lock)
+        self._meta = CachedJsonFile(os.path.join(path, "meta.json"), self.stats, self.lock)
+        self._shards = {}
+
+    def _shard(self, user_id):
+        shard = self._shards.get(user_id)
+        if shard is None:
+            shard = CachedJsonFile(os.path.join(self.vault_dir, f"{user_id}.json"),
+                                   self.stats, self.lock, records=compact_user)
+            self._shards[user_id] = shard
+        return shard
+
+    def _shard_id(self, key, data, taken):
+        """The vault file name for an account, reusing its user_id when usable
+
+        taken holds the names other accounts' vaults have. An account moved
+        to a new key keeps its user_id, and must not share the old key's file.
+        """
+        user_id = self._index.load().get(key)
+        if user_id is None or user_id in taken:
+            user_id = data.get('user_id') or ''
+        if user_id in taken or not _SHARD_NAME.fullmatch(user_id):
+            user_id = secrets.token_hex(8)
+        return user_id
+
+    def load_all(self):
+        with self.lock:
+            users = {key: self._shard(user_id).load()
+                     for key, user_id in self._index.load().items()}
+            # A vault removed by another process reads as {}
+            return {key: data for key, data in users.items() if data}
+
+    def _remove_shard(self, user_id):
+        shard = self._shard(user_id)
+        del self._shards[user_id]
+        # Let any pending write land first so the timer cannot recreate it
+        shard.flush()
+        # A new generation, so other processes' pending changes to it see it gone
+        with shard.file_lock.held() as fd:
+            try:
+                os.remove(shard.path)
+            except OSError:
+                pass
+            FileLock.write_generation(fd, FileLock.read_generation(fd) + 1)
+        # Its lock file stays: another process may be holding or waiting on it
+
+    def save_all(self, users, durability=None):
+        with self.lock:
+            old_ids = set(self._index.load().values())
+            new_index = {}
+            for key, data in users.items():
+                user_id = self._shard_id(key, data, set(new_index.values()))
+                self._shard(user_id).save(data, durability)
+                new_index[key] = user_id
+            self._index.save(new_index, durability)
+            for user_id in old_ids - set(new_index.values()):
+                self._remove_shard(user_id)
+
+    def get_user(self, key):
+        with self.lock:
+            user_id = self._index.load().get(key)
+            if user_id is None:
+                return None
+            # A vault removed by another process reads as {}
+            return self._shard(user_id).load() or None
+
+    def has_user(self, key):
+        with self.lock:
+            return key in self._index.load()
+
+    def put_user(self, key, data, durability=None):
+        def change(index):
+            index[key] = user_id
+        with self.lock:
+            taken = {other for other_key, other in self._index.load().items() if other_key != key}
+            user_id = self._shard_id(key, data, taken)
+            self._shard(user_id).save(data, durability)
+            if self._index.load().get(key) != user_id:
+                self._index.update(change, durability)
+
+    def _update_vault(self, key, change, durability):
+        """update() an account's vault with change, which fails if the vault is gone"""
+        def apply(data):
+            # A missing vault file reads as {}: another process removed the account
+            if not data:
+                raise KeyError(key)
+            change(data)
+        with self.lock:
+            self._shard(self._index.load()[key]).update(apply, durability)
+
+    def update_user(self, key, fields, durability=None):
+        def change(data):
+            data.update(fields)
+        self._update_vault(key, change, durability)
+
+    def add_saved_password(self, key, entry, durability=None):
+        def change(data):
+            data.setdefault('saved_passwords', []).append(entry)
+        self._update_vault(key, change, durability)
+
+    def update_saved_password(self, key, position, entry, durability=None):
+        def change(data):
+            entries = data['saved_passwords']
+            entries[_entry_position(entries, position, entry)] = entry
+        self._update_vault(key, change, durability)
+
+    def delete_user(self, key, durability=None):
+        def change(index):
+            del index[key]
+        with self.lock:
+            user_id = self._index.load().get(key)
+            if user_id is None:
+                return
+            # Index first, so it never names a vault that is gone
+            self._index.update(change, durability)
+            self._index.flush()
+            # Stores written before vault names were kept unique can share one
+            if user_id not in self._index.load().values():
+                self._remove_shard(user_id)
+
+    def version(self, key):
+        with self.lock:
+            user_id = self._index.load().get(key)
+            vault = None if user_id is None else self._shard(user_id).file_lock.generation()
+            return self._index.file_lock.generation(), vault
+
+    def load_meta(self):
+        return self._meta.load()
+
+    def save_meta(self, meta, durability=None):
+        self._meta.save(meta, durability)
+
+    def set_meta(self, name, value, durability=None):
+        def change(meta):
+            meta[name] = value
+        self._meta.update(change, durability)
+
+    def update_meta(self, name, change, durability=None):
+        def apply(meta):
+            meta[name] = change(meta.get(name))
+        with self.lock:
+            self._meta.update(apply, durability)
+            self._meta.flush()
+            return self._meta.load().get(name)
+
+    def cache_stats(self):
+        with self.lock:
+            return _report(self.stats)
+
+    def flush(self):
+        with self.lock:
+            # Vaults before the index, so the index never names a missing vault
+            for shard in self._shards.values():
+                shard.flush()
+            self._index.flush()
+            self._meta.flush()
+
+
+# Columns kept for the fields every record has; anything else goes in extra
+USER_FIELDS = ('name', 'password', 'user_id', 'created_date')
+ENTRY_FIELDS = ('website', 'username', 'password', 'created', 'strength', 'entropy')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    key TEXT PRIMARY KEY,
+    name TEXT,
+    password TEXT,
+    user_id TEXT,
+    created_date TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS saved_passwords (
+    id INTEGER PRIMARY KEY,
+    user_key TEXT NOT NULL REFERENCES users(key) ON DELETE CASCADE,
+    website TEXT,
+    username TEXT,
+    password TEXT,
+    created TEXT,
+    strength TEXT,
+    entropy REAL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS saved_passwords_user ON saved_passwords (user_key, id);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _split(record, fields, skip=()):
+    """Column values for fields, plus the remaining keys as a JSON string"""
+    values = [record.get(field) for field in fields]
+    extra = {k: v for k, v in record.items() if k not in fields and k not in skip}
+    values.append(json.dumps(extra) if extra else None)
+    return values
+
+
+def _join(row, fields):
+    """Rebuild a record from column values and its extra JSON"""
+    record = {field: value for field, value in zip(fields, row) if value is not None}
+    if row[len(fields)]:
+        record.update(json.loads(row[len(fields)]))
+    return record
+
+
+def _key_fields(row):
+    """The website and username of an (id, website, username) row, as entry_key() takes them"""
+    return {'website': row[1] or '', 'username': row[2] or ''}
+
+
+class SqliteStorage(Storage):
+    """Accounts and saved passwords in indexed SQLite tables
+
+    Adding a saved password is a single-row insert in its own transaction
+    instead of a rewrite of the whole store.
+    """
+
+    # durability level -> PRAGMA synchronous setting
+    SYNCHRONOUS = {"lazy": "OFF", "normal": "NORMAL", "full": "FULL"}
+
+    def __init__(self, path):
+        # Imported here so the default JSON engine never loads sqlite3
+        import sqlite3
+        super().__init__()
+        self.path = path
+        # Access is serialised by self.lock, including from the I/O thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._synchronous = None
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+
+    def _set_durability(self, durability):
+        """Match PRAGMA synchronous to the write about to happen"""
+        setting = self.SYNCHRONOUS[durability or "normal"]
+        if setting != self._synchronous:
+            self.conn.execute(f"PRAGMA synchronous = {setting}")
+            self._synchronous = setting
+
+    def _entries(self, key):
+        rows = self.conn.execute(
+            f"SELECT {', '.join(ENTRY_FIELDS)}, extra FROM saved_passwords "
+            "WHERE user_key = ? ORDER BY id", (key,))
+        return [compact_entry(_join(row, ENTRY_FIELDS)) for row in rows]
+
+    def _insert_user(self, key, data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO users (key, name, password, user_id, created_date, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [key] + _split(data, USER_FIELDS, skip=('saved_passwords',)))
+        self.conn.execute("DELETE FROM saved_passwords WHERE user_key = ?", (key,))
+        self.conn.executemany(
+            f"INSERT INTO saved_passwords (user_key, {', '.join(ENTRY_FIELDS)}, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ([key] + _split(entry, ENTRY_FIELDS) for entry in data.get('saved_passwords', [])))
+
+    def load_all(self):
+        with self.lock:
+            users = {}
+            rows = self.conn.execute(f"SELECT key, {', '.join(USER_FIELDS)}, extra FROM users")
+            for row in rows.fetchall():
+                user = _join(row[1:], USER_FIELDS)
+                user['saved_passwords'] = self._entries(row[0])
+                users[row[0]] = compact_user(user)
+            return users
+
+    def save_all(self, users, durability=None):
+        with self.lock:
+            self._set_durability(durability)
+            with self.conn:
+                self.conn.execute("DELETE FROM saved_passwords")
+                self.conn.execute("DELETE FROM users")
+                for key, data in users.items():
+                    self._insert_user(key, data)
+
+    def get_user(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(USER_FIELDS)}, extra FROM users WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            user = _join(row, USER_FIELDS)
+            user['saved_passwords'] = self._entries(key)
+            return compact_user(user)
+
+    def has_user(self, key):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM users WHERE key = ?",
+                                     (key,)).fetchone() is not None
+
+    def put_user(self, key, data, durability=None):
+        with self.lock:
+            self._set_durability(durability)
+            with self.conn:
+                self._insert_user(key, data)
+
+    def update_user(self, key, fields, durability=None):
+        with self.lock:
+            self._set_durability(durability)
+            with self.conn:
+                # Read and write in one write transaction, so no other process can slip in
+                self.conn.execute("BEGIN IMMEDIATE")
+                row = self.conn.execute(
+                    f"SELECT {', '.join(USER_FIELDS)}, extra FROM users WHERE key = ?",
+                    (key,)).fetchone()
+                if row is None:
+                    raise KeyError(key)
+                user = _join(row, USER_FIELDS)
+                user.update(fields)
+                self.conn.execute(
+                    f"UPDATE users SET {', '.join(f + ' = ?' for f in USER_FIELDS)}, extra = ? "
+                    "WHERE key = ?", _split(user, USER_FIELDS, skip=('saved_passwords',)) + [key])
+
+    def saved_passwords(self, key):
+        with self.lock:
+            return self._entries(key)
+
+    def add_saved_password(self, key, entry, durability=None):
+        with self.lock:
+            self._set_durability(durability)
+            with self.conn:
+                self.conn.execute(
+                    f"INSERT INTO saved_passwords (user_key, {', '.join(ENTRY_FIELDS)}, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [key] + _split(entry, ENTRY_FIELDS))
+
+    def update_saved_password(self, key, position, entry, durability=None):
+        with self.lock:
+            self._set_durability(durability)
+            with self.conn:
+                # Find and update in one write transaction, so no other process can slip in
+                self.conn.execute("BEGIN IMMEDIATE")
+                select = ("SELECT id, website, username FROM saved_passwords WHERE user_key = ? "
+                          "ORDER BY id")
+                row = self.conn.execute(select + " LIMIT 1 OFFSET ?", (key, position)).fetchone()
+                if row is None or entry_key(_key_fields(row)) != entry_key(entry):
+                    # Another process saved entries meanwhile; find it by website and username
+                    rows = self.conn.execute(select, (key,)).fetchall()
+                    row = rows[_entry_position([_key_fields(row) for row in rows], position, entry)]
+                self.conn.execute(
+                    f"UPDATE saved_passwords SET {', '.join(f + ' = ?' for f in ENTRY_FIELDS)}, "
+                    "extra = ? WHERE id = ?", _split(entry, ENTRY_FIELDS) + [row[0]])
+
+    def delete_user(self, key, durability=None):
+        with self.lock:
+            self._set_durability(durability)
+            with self.conn:
+                self.conn.execute("DELETE FROM saved_passwords WHERE user_key = ?", (key,))
+                self.conn.execute("DELETE FROM users WHERE key = ?", (key,))
+
+    def version(self, key):
+        with self.lock:
+            # Changes only when another connection commits; this one's writes
+            # went through the caller already
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load_meta(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT name, value FROM meta").fetchall()
+            return {name: json.loads(value) for name, value in rows}
+
+    def save_meta(self, meta, durability=None):
+        with self.lock:
+            self._set_durability(durability)
+            with self.conn:
+                self.conn.execute("DELETE FROM meta")
+                self.conn.executemany("INSERT INTO meta (name, value) VALUES (?, ?)",
+                                      [(name, json.dumps(value)) for name, value in meta.items()])
+
+    def update_meta(self, name, change, durability=None):
+        with self.lock:
+            self._set_durability(durability)
+            with self.conn:
+                # Take the write lock before reading, so no other process can slip in
+                self.conn.execute("BEGIN IMMEDIATE")
+                row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+                value = change(None if row is None else json.loads(row[0]))
+                self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                                  (name, json.dumps(value)))
+            return value
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+ENGINES = {
+    "json": JsonStorage,
+    "sqlite": SqliteStorage,
+    "sharded": ShardedStorage,
+    "binary": BinaryStorage,
+}
+
+
+def open_storage(engine=None, path=None):
+    """Open the configured engine (SPG_STORAGE / SPG_STORAGE_PATH by default)"""
+    engine = engine or os.environ.get("SPG_STORAGE", "json")
+    if engine not in ENGINES:
+        raise ValueError(f"unknown storage engine: {engine!r}")
+    path = path or os.environ.get("SPG_STORAGE_PATH") or DEFAULT_PATHS[engine]
+    return ENGINES[engine](path)
+
+
+def migrate(source, target):
+    """Copy every account and the store settings into another engine; returns the count
+
+    Account keys are derived with the salt in the settings, so the two are
+    only ever copied together.
+    """
+    users = source.load_all()
+    target.save_meta(source.load_meta(), durability="full")
+    target.save_all(users, durability="full")
+    return len(users)
@@ -0,0 +1,214 @@
+"""Byte-offset index of the accounts in users.json
+
+Logging in needs one account, but finding it in users.json meant parsing
+every account in the file. When the JSON engine commits the store it now
+also writes users.idx beside it:
+
+    header   MAGIC, record count, and the mtime / size / inode of the
+             users.json it describes
+    records  (8-byte BLAKE2b of the account key, offset, length), sorted
+
+dump_store() writes users.json itself, byte for byte as
+json.dumps(users, indent=2) would (so older versions and hand edits keep
+working), and reports where each account's `"key": {...}` member landed.
+RecordIndex memory-maps both files, binary-searches the digests and
+decodes only the member it points at, so a lookup costs the same however
+many accounts and saved passwords the store holds.
+
+The index is only trusted while users.json still has the mtime, size and
+inode recorded in its header; after any other writer touches users.json
+lookups fall back to parsing the whole file until the next commit.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+import instrumentation
+from vault_records import SavedPassword, UserAccount, to_json
+
+MAGIC = b"SPGRIDX\x01"
+HEADER = struct.Struct("<8sQQQQ")
+RECORD = struct.Struct("<8sQQ")
+
+_encode_str = json.encoder.encode_basestring_ascii
+_INFINITY = float("inf")
+
+
+def key_digest(key):
+    return hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+
+
+def file_stamp(st):
+    """(mtime_ns, size, inode) of an os.stat result, as CachedJsonFile stamps files"""
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _float(value):
+    if value != value:
+        return "NaN"
+    if value == _INFINITY:
+        return "Infinity"
+    if value == -_INFINITY:
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def _indented(value, indent):
+    """value as json.dumps(value, indent=2) writes it, nested indent spaces deep
+
+    The standard library only has a C encoder for compact output; with
+    indent it falls back to a pure-Python one that yields every token
+    separately. This builds each container with one join instead.
+    """
+    if isinstance(value, str):
+        return _encode_str(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return _float(value)
+    if isinstance(value, (SavedPassword, UserAccount)):
+        value = value.to_dict()
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return "[]"
+        inner = "\n" + " " * (indent + 2)
+        return ("[" + inner
+                + ("," + inner).join([_indented(item, indent + 2) for item in value])
+                + "\n" + " " * indent + "]")
+    if isinstance(value, Mapping):
+        if not value:
+            return "{}"
+        if not all(isinstance(key, str) for key in value):
+            # json turns int/float/bool/None keys into strings; leave that to it
+            return _fallback(value, indent)
+        inner = "\n" + " " * (indent + 2)
+        return ("{" + inner
+                + ("," + inner).join([_encode_str(key) + ": " + _indented(item, indent + 2)
+                                      for key, item in value.items()])
+                + "\n" + " " * indent + "}")
+    return _fallback(value, indent)
+
+
+def _fallback(value, indent):
+    return json.dumps(value, indent=2, default=to_json).replace("\n", "\n" + " " * indent)
+
+
+def dump_store(users):
+    """(bytes of json.dumps(users, indent=2), [(key, offset, length), ...])
+
+    Each span covers one account's `"key": {...}` member. The spans are None
+    if the store has keys json would have to convert, which cannot be indexed.
+    """
+    if not users:
+        return b"{}", []
+    if not all(isinstance(key, str) for key in users):
+        return json.dumps(users, indent=2, default=to_json).encode("utf-8"), None
+    parts = []
+    spans = []
+    offset = 2
+    for key, user in users.items():
+        member = f"  {_encode_str(key)}: {_indented(user, 2)}".encode("utf-8")
+        spans.append((key, offset, len(member)))
+        parts.append(member)
+        offset += len(member) + 2
+    return b"{\n" + b",\n".join(parts) + b"\n}", spans
+
+
+def build_index(spans, stamp):
+    """Index file contents for dump_store() spans of a file with this stamp"""
+    records = sorted((key_digest(key), offset, length) for key, offset, length in spans)
+    return HEADER.pack(MAGIC, len(records), *stamp) + b"".join(
+        RECORD.pack(*record) for record in records)
+
+
+class RecordIndex:
+    """Read-only view of an index and the users.json it describes
+
+    open() returns None unless the index matches the data file as it is now.
+    """
+
+    def __init__(self, index_map, data_file, data_map, count, stamp):
+        self._index = index_map
+        self._data_file = data_file
+        self._data = data_map
+        self.count = count
+        self.stamp = stamp
+
+    @classmethod
+    def open(cls, index_path, data_path):
+        try:
+            with open(index_path, "rb") as f:
+                header = f.read(HEADER.size)
+                if len(header) != HEADER.size:
+                    return None
+                magic, count, *stamp = HEADER.unpack(header)
+                if magic != MAGIC or os.fstat(f.fileno()).st_size != HEADER.size + count * RECORD.size:
+                    return None
+                index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        stamp = tuple(stamp)
+        try:
+            data_file = open(data_path, "rb")
+        except OSError:
+            index_map.close()
+            return None
+        try:
+            # Checked on the open file, so a replace after the check cannot slip in
+            if file_stamp(os.fstat(data_file.fileno())) != stamp or not stamp[1]:
+                raise ValueError("index is stale")
+            data_map = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            index_map.close()
+            data_file.close()
+            return None
+        return cls(index_map, data_file, data_map, count, stamp)
+
+    def _first(self, digest):
+        """Position of the first record with digest, or None"""
+        data = self._index
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            start = HEADER.size + mid * RECORD.size
+            if data[start:start + 8] < digest:
+                low = mid + 1
+            else:
+                high = mid
+        start = HEADER.size + low * RECORD.size
+        return low if low < self.count and data[start:start + 8] == digest else None
+
+    def find(self, key):
+        """The decoded account for key, or None if the store has no such account
+
+        Raises ValueError if the index does not point at a JSON member after
+        all, e.g. because another writer replaced users.json with a file of
+        the same size within the same mtime tick.
+        """
+        digest = key_digest(key)
+        position = self._first(digest)
+        while position is not None and position < self.count:
+            found, offset, length = RECORD.unpack_from(self._index, HEADER.size + position * RECORD.size)
+            if found != digest:
+                break
+            member = json.loads(b"{" + self._data[offset:offset + length] + b"}")
+            instrumentation.add("bytes_read", length)
+            # Digests can collide; the key inside the member settles it
+            if key in member:
+                return member[key]
+            position += 1
+        return None
+
+    def close(self):
+        self._index.close()
+        self._data.close()
+        self._data_file.close()
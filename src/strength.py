@@ -0,0 +1,102 @@
+"""Password strength rating shared by the GUI and the command line
+
+Characters are classified in a single str.translate pass against a
+precomputed table, and the rating comes with an entropy estimate in bits
+based on the size of the alphabet the password draws from.
+"""
+import collections
+import itertools
+import math
+
+from instrumentation import timed
+from password_engine import DIGITS, LOWERCASE, SYMBOLS, UPPERCASE
+
+StrengthResult = collections.namedtuple("StrengthResult", "label score entropy")
+
+LABELS = ("🔴 Weak", "🟡 Medium", "🟢 Strong", "💚 Very Strong")
+
+# Class codes written by the translate table
+_UPPER, _LOWER, _DIGIT, _SYMBOL, _OTHER = "ULDSO"
+
+# Every ASCII character maps to its class code; anything else is left as is
+_CLASS_TABLE = {code: _OTHER for code in range(128)}
+_CLASS_TABLE.update((ord(c), _UPPER) for c in UPPERCASE)
+_CLASS_TABLE.update((ord(c), _LOWER) for c in LOWERCASE)
+_CLASS_TABLE.update((ord(c), _DIGIT) for c in DIGITS)
+_CLASS_TABLE.update((ord(c), _SYMBOL) for c in SYMBOLS)
+
+# Alphabet size each class contributes to the entropy estimate
+_CLASS_SIZES = {
+    _UPPER: len(UPPERCASE),
+    _LOWER: len(LOWERCASE),
+    _DIGIT: len(DIGITS),
+    _SYMBOL: len(SYMBOLS),
+    # Printable ASCII that is neither letter, digit nor listed symbol
+    _OTHER: 95 - len(UPPERCASE) - len(LOWERCASE) - len(DIGITS) - len(SYMBOLS),
+}
+
+
+def _class_info(classes):
+    """Points and bits per character for a set of class codes"""
+    points = sum(c in classes for c in (_UPPER, _LOWER, _DIGIT, _SYMBOL))
+    alphabet = sum(_CLASS_SIZES[c] for c in classes)
+    return points, math.log2(alphabet) if alphabet > 1 else 0.0
+
+
+# Every combination of classes is known up front, so scoring is a dict hit
+_CLASS_INFO = {
+    frozenset(combo): _class_info(combo)
+    for size in range(len(_CLASS_SIZES) + 1)
+    for combo in itertools.combinations(_CLASS_SIZES, size)
+}
+
+# Label for each points total from 0 to 6
+_LABEL_BY_SCORE = (LABELS[0],) * 3 + (LABELS[1],) * 2 + (LABELS[2], LABELS[3])
+
+
+def _non_ascii_classes(found):
+    """Resolve non-ASCII characters with the str.isupper/islower/isdigit rules"""
+    classes = set()
+    for c in found:
+        if c in _CLASS_SIZES:
+            classes.add(c)
+        elif c.isupper():
+            classes.add(_UPPER)
+        elif c.islower():
+            classes.add(_LOWER)
+        elif c.isdigit():
+            classes.add(_DIGIT)
+        else:
+            classes.add(_OTHER)
+    return frozenset(classes)
+
+
+@timed("score_password")
+def score_password(password, breach_index=None):
+    """Rate a password, returning its label, points score and entropy bits
+
+    If a breach_check.BreachIndex is given and the password is in it, the
+    password is rated Weak with no entropy, however complex it looks.
+    """
+    if breach_index is not None and password in breach_index:
+        return StrengthResult(LABELS[0], 0, 0.0)
+    found = frozenset(password.translate(_CLASS_TABLE))
+    info = _CLASS_INFO.get(found)
+    if info is None:
+        info = _CLASS_INFO[_non_ascii_classes(found)]
+    points, bits_per_char = info
+
+    length = len(password)
+    score = points + (length >= 8) + (length >= 12)
+    return StrengthResult(_LABEL_BY_SCORE[score], score, length * bits_per_char)
+
+
+def score_many(passwords, breach_index=None):
+    """Score every password in an iterable, in order"""
+    score = score_password
+    return [score(password, breach_index) for password in passwords]
+
+
+def calculate_strength(password, breach_index=None):
+    """Rate a password as Weak, Medium, Strong or Very Strong"""
+    return score_password(password, breach_index).label
@@ -0,0 +1,103 @@
+"""Tests for AuthenticationSystem: accounts survive being moved to a new key
+
+    python -m pytest src
+"""
+from auth_system import AuthenticationSystem
+from storage import open_storage
+from vault_crypto import is_sealed
+
+LEGACY_ENTRY = {
+    'website': "example.com", 'username': "alice", 'password': "hunter2",
+    'created': "2025-09-01 12:00:00.000000", 'strength': "🔴 Weak", 'entropy': 23.5,
+}
+
+
+def log_in(store_path, password):
+    """(account data, its saved passwords in plain text) from a fresh session"""
+    auth = AuthenticationSystem(open_storage(*store_path))
+    try:
+        user = auth.login(password)
+        if user is None:
+            return None, None
+        return user, [auth.reveal_password(entry) for entry in user.get('saved_passwords', [])]
+    finally:
+        auth.close()
+
+
+def test_legacy_account_is_moved_to_a_derived_key(store_path, fast_kdf):
+    storage = open_storage(*store_path)
+    # Keyed by the plain password, as versions before key derivation stored it
+    storage.put_user("1234", {'name': "Alice", 'password': "1234", 'user_id': "ab" * 8,
+                              'saved_passwords': [LEGACY_ENTRY]}, "full")
+    storage.close()
+
+    for _ in range(3):
+        user, passwords = log_in(store_path, "1234")
+        assert user['name'] == "Alice"
+        assert passwords == ["hunter2"]
+        assert all(is_sealed(entry['password']) for entry in user['saved_passwords'])
+    assert open_storage(*store_path).get_user("1234") is None
+
+
+def test_account_survives_recalibration(store_path, fast_kdf):
+    auth = AuthenticationSystem(open_storage(*store_path))
+    key = auth.account_key("4321")
+    auth.save_account(key, {'name': "Bob", 'user_id': "cd" * 8, 'saved_passwords': []}, "full")
+    auth.login("4321")
+    auth.add_saved_password(key, dict(LEGACY_ENTRY, website="bob.example"), "full")
+    auth.close()
+
+    for _ in range(2):
+        auth = AuthenticationSystem(open_storage(*store_path))
+        auth.recalibrate()
+        auth.close()
+        for _ in range(2):
+            user, passwords = log_in(store_path, "4321")
+            assert user['name'] == "Bob"
+            assert passwords == ["hunter2"]
+
+
+def test_wrong_password_finds_nothing(store_path, fast_kdf):
+    assert log_in(store_path, "0000") == (None, None)
+
+
+def previous_salts(store_path):
+    storage = open_storage(*store_path)
+    try:
+        return [params['salt'] for params in storage.get_meta("kdf")['previous']]
+    finally:
+        storage.close()
+
+
+def recalibrate(store_path):
+    auth = AuthenticationSystem(open_storage(*store_path))
+    try:
+        return auth.recalibrate()['salt']
+    finally:
+        auth.close()
+
+
+def test_recalibration_drops_unused_parameters(store_path, fast_kdf):
+    auth = AuthenticationSystem(open_storage(*store_path))
+    auth.save_account(auth.account_key("4321"), {'name': "Bob", 'saved_passwords': []}, "full")
+    auth.close()
+    assert log_in(store_path, "4321")[0]['name'] == "Bob"
+
+    salts = []
+    for _ in range(4):
+        salts.append(recalibrate(store_path))
+        # Only the parameters just replaced are kept, as Bob is moved on each login
+        assert len(previous_salts(store_path)) <= 2
+        assert log_in(store_path, "4321")[0]['kdf_salt'] == salts[-1]
+    assert previous_salts(store_path) == [salts[-2]]
+
+
+def test_recalibration_keeps_parameters_an_account_may_use(store_path, fast_kdf):
+    storage = open_storage(*store_path)
+    # Never logged into since kdf_salt was recorded, so it could be under any
+    storage.put_user("1234", {'name': "Alice", 'password': "1234", 'saved_passwords': []}, "full")
+    storage.close()
+    for _ in range(3):
+        recalibrate(store_path)
+    assert len(previous_salts(store_path)) == 3
+    assert log_in(store_path, "1234")[0]['name'] == "Alice"
@@ -0,0 +1,71 @@
+"""Tests for breach_check: lookups, and an unusable index never stopping scoring
+
+    python -m pytest src
+"""
+import subprocess
+import sys
+
+import pytest
+
+import breach_check
+from breach_check import BreachIndex, build_index, default_index, is_breached
+
+CLI = [sys.executable, breach_check.__file__.replace("breach_check.py", "cli.py")]
+
+
+@pytest.fixture
+def fresh_default(monkeypatch):
+    # Each test configures its own index
+    monkeypatch.setattr(breach_check, "_default", None)
+    monkeypatch.setattr(breach_check, "_default_failed", False)
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_text("hunter2\npassword\n123456\n", encoding="utf-8")
+    path = tmp_path / "index.bin"
+    assert build_index([str(corpus)], str(path), plaintext=True) == 3
+    return path
+
+
+def test_lookup(index_path):
+    with BreachIndex(index_path) as index:
+        assert "hunter2" in index and "123456" in index
+        assert "correct horse" not in index
+
+
+def test_configured_index(fresh_default, monkeypatch, index_path):
+    monkeypatch.setenv("SPG_BREACH_INDEX", str(index_path))
+    assert is_breached("password")
+    assert not is_breached("correct horse")
+
+
+def test_missing_index_is_none(fresh_default, monkeypatch, tmp_path):
+    monkeypatch.setenv("SPG_BREACH_INDEX", str(tmp_path / "absent.bin"))
+    assert default_index() is None
+    assert not is_breached("password")
+
+
+@pytest.mark.parametrize("contents", [None, b"", b"not an index", breach_check.MAGIC],
+                         ids=["directory", "empty", "other file", "truncated"])
+def test_unusable_index_warns_once(fresh_default, monkeypatch, tmp_path, capsys, contents):
+    path = tmp_path / "index.bin"
+    if contents is None:
+        path.mkdir()
+    else:
+        path.write_bytes(contents)
+    monkeypatch.setenv("SPG_BREACH_INDEX", str(path))
+    assert default_index() is None
+    assert not is_breached("password")
+    assert capsys.readouterr().err.count("cannot open breach index") == 1
+
+
+def test_cli_scores_without_a_usable_index(tmp_path):
+    env = {"SPG_BREACH_INDEX": str(tmp_path), "PATH": ""}
+    score = subprocess.run(CLI + ["score", "abc"], capture_output=True, text=True, env=env)
+    assert score.returncode == 0 and score.stdout.count("\n") == 1
+    assert "cannot open breach index" in score.stderr
+    # An explicit check must not report every password as ok
+    check = subprocess.run(CLI + ["breach", "check", "abc"], capture_output=True, text=True, env=env)
+    assert check.returncode != 0 and "Cannot open breach index" in check.stderr
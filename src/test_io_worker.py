@@ -0,0 +1,113 @@
+"""Tests for IOWorker and closing a session: saves are reported only once on disk
+
+    python -m pytest src
+"""
+import threading
+
+import pytest
+
+import storage as storage_module
+from auth_system import AuthenticationSystem
+from io_worker import IOWorker
+from storage import StorageError, open_storage
+
+
+class Recorder:
+    """Callbacks that note what ran, in order"""
+
+    def __init__(self):
+        self.events = []
+
+    def done(self, name):
+        return lambda result: self.events.append(("done", name, result))
+
+    def error(self, name):
+        return lambda exc: self.events.append(("error", name, str(exc)))
+
+
+def test_operations_run_in_order_off_the_calling_thread():
+    seen = Recorder()
+    threads = []
+    release = threading.Event()
+    worker = IOWorker()
+    worker.submit(release.wait)
+    for i in range(5):
+        worker.submit(lambda i=i: threads.append(threading.current_thread()) or i,
+                      on_done=seen.done(i))
+    # submit() returned at once and nothing runs a callback before poll()
+    assert worker.pending == 6
+    release.set()
+    worker._requests.join()
+    assert seen.events == []
+    assert {thread.name for thread in threads} == {"vault-io"}
+    caller = []
+    worker.submit(lambda: None, on_done=lambda _: caller.append(threading.current_thread()))
+    worker.flush()
+    assert seen.events == [("done", i, i) for i in range(5)]
+    assert caller == [threading.current_thread()]
+    worker.close()
+
+
+def test_callbacks_wait_for_the_commit():
+    seen = Recorder()
+    commits = []
+    worker = IOWorker(commit=lambda: commits.append(list(seen.events)))
+    worker.submit(lambda: 1, on_done=seen.done("a"), on_error=seen.error("a"))
+    worker.submit(lambda: 2, on_done=seen.done("b"), on_error=seen.error("b"))
+    worker.flush()
+    # Nothing had been reported when the commit ran; both are now
+    assert commits and commits[0] == []
+    assert seen.events == [("done", "a", 1), ("done", "b", 2)]
+    worker.close()
+
+
+def test_failed_operation_reports_its_own_error():
+    seen = Recorder()
+    worker = IOWorker(commit=lambda: None)
+    worker.submit(lambda: 1 / 0, on_done=seen.done("a"), on_error=seen.error("a"))
+    worker.submit(lambda: "ok", on_done=seen.done("b"), on_error=seen.error("b"))
+    worker.flush()
+    assert seen.events == [("error", "a", "division by zero"), ("done", "b", "ok")]
+    worker.close()
+
+
+def test_failed_commit_fails_every_operation_since_the_last():
+    seen = Recorder()
+
+    def commit():
+        raise StorageError("disk full")
+
+    worker = IOWorker(commit=commit)
+    worker.submit(lambda: 1, on_done=seen.done("a"), on_error=seen.error("a"))
+    worker.submit(lambda: 2, on_done=seen.done("b"), on_error=seen.error("b"))
+    worker.flush()
+    assert seen.events == [("error", "a", "disk full"), ("error", "b", "disk full")]
+    worker.close()
+
+
+def test_failed_close_keeps_the_session(tmp_path, fast_kdf, monkeypatch):
+    auth = AuthenticationSystem(open_storage("json", str(tmp_path / "users.json")))
+    key = auth.account_key("1234")
+    auth.save_account(key, {'name': "Alice", 'user_id': "ab" * 8, 'saved_passwords': []}, "full")
+    auth.login("1234")
+    worker = auth.io
+
+    def full_disk(path, data, durability="normal"):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(storage_module, "atomic_write", full_disk)
+    seen = Recorder()
+    auth.upsert_saved_password_async(key, {'website': "a.com", 'username': "alice",
+                                           'password': "secret"},
+                                     on_done=seen.done("save"), on_error=seen.error("save"))
+    with pytest.raises(StorageError):
+        auth.close()
+    assert [event[:2] for event in seen.events] == [("error", "save")]
+    # The user chose to stay: the same worker, still logged in
+    assert auth.io is worker
+    assert auth.session_secret is not None
+
+    monkeypatch.undo()
+    auth.close()
+    assert [entry['website'] for entry in open_storage("json", str(tmp_path / "users.json"))
+            .saved_passwords(key)] == ["a.com"]
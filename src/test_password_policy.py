@@ -0,0 +1,89 @@
+"""Tests for PasswordPolicy: compliant, uniform, and quick to set up
+
+    python -m pytest src
+"""
+import collections
+import itertools
+import time
+
+import pytest
+
+from password_policy import PasswordPolicy
+
+SMALL = [
+    dict(length=4, upper=1, lower=0, digits=None, symbols=None, allowed="[ABab]"),
+    dict(length=4, upper=1, lower=0, digits=None, symbols=None, allowed="[ABab]", max_run=1),
+    dict(length=5, upper=2, lower=1, digits=1, symbols=None, allowed="[ABa1]"),
+    dict(length=4, upper=None, lower=None, digits=0, symbols=None, allowed="[0-3]", max_run=2),
+]
+
+
+def compliant(policy):
+    """Every password the policy allows, by brute force"""
+    candidates = itertools.product(policy.charset, repeat=policy.length)
+    return {"".join(chars) for chars in candidates if policy.check("".join(chars))}
+
+
+@pytest.mark.parametrize("rules", SMALL)
+def test_every_compliant_password_is_equally_likely(rules):
+    policy = PasswordPolicy(**rules)
+    space = compliant(policy)
+    draws = 100 * len(space)
+    seen = collections.Counter(policy.generate() for _ in range(draws))
+    assert set(seen) == space
+    # Pearson's chi-squared; a skew like the old redraw-based one scores in the thousands
+    expected = draws / len(space)
+    chi2 = sum((seen[password] - expected) ** 2 / expected for password in space)
+    degrees = len(space) - 1
+    assert chi2 < degrees + 6 * (2 * degrees) ** 0.5
+
+
+@pytest.mark.parametrize("rules", [
+    dict(length=8, digits=3, symbols=3),
+    dict(length=16, upper=1, lower=1, digits=1, symbols=1, exclude_ambiguous=True),
+    dict(length=12, upper=2, digits=2, max_run=1),
+    dict(length=10, upper=None, lower=None, symbols=None, max_run=2),
+    dict(length=20, allowed="[A-Za-z0-9_-]", symbols=1),
+])
+def test_generated_passwords_comply(rules):
+    policy = PasswordPolicy(**rules)
+    for _ in range(200):
+        assert policy.check(policy.generate())
+
+
+def test_check():
+    policy = PasswordPolicy(6, upper=1, lower=0, digits=2, symbols=None, max_run=2)
+    assert policy.check("Ab12cc")
+    assert not policy.check("Ab12c")            # too short
+    assert not policy.check("ab12cd")           # no uppercase
+    assert not policy.check("Abc1de")           # one digit
+    assert not policy.check("Ab12c!")           # symbols left out
+    assert not policy.check("Ab1ccc")           # run of three
+
+
+def test_minimums_cost_little():
+    start = time.perf_counter()
+    policy = PasswordPolicy(64, upper=16, lower=16, digits=16, symbols=16)
+    policy.generate()
+    PasswordPolicy(128, upper=1, lower=1, digits=1, symbols=1).generate()
+    assert time.perf_counter() - start < 0.5
+
+
+def test_max_run_costs_little_or_is_refused():
+    start = time.perf_counter()
+    PasswordPolicy(64, upper=1, lower=1, digits=1, symbols=1, max_run=2).generate()
+    with pytest.raises(ValueError, match="too high"):
+        PasswordPolicy(64, upper=8, lower=8, digits=8, symbols=8, max_run=2)
+    assert time.perf_counter() - start < 1
+
+
+@pytest.mark.parametrize("rules, message", [
+    (dict(allowed="["), "not a valid regular expression"),
+    (dict(length=2, upper=None, lower=None, symbols=None, allowed="1", max_run=1),
+     "can meet"),
+    (dict(length=4, digits=5), "requires 5"),
+    (dict(digits=1, allowed="[a-z]"), "allows none"),
+])
+def test_impossible_policies_are_refused(rules, message):
+    with pytest.raises(ValueError, match=message):
+        PasswordPolicy(**rules)
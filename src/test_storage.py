@@ -0,0 +1,120 @@
+"""Tests for the storage engines: writers sharing a store keep each other's changes
+
+Each test opens the same store twice, standing in for two app instances.
+
+    python -m pytest src
+"""
+import pytest
+
+from auth_system import AuthenticationSystem
+from storage import StorageError, open_storage
+
+
+def account(name, user_id):
+    return {'name': name, 'user_id': user_id, 'saved_passwords': []}
+
+
+def entry(website, password="secret"):
+    return {'website': website, 'username': "alice", 'password': password,
+            'created': "2025-09-01 12:00:00.000000", 'strength': "🔴 Weak", 'entropy': 20.0}
+
+
+def websites(storage, key):
+    return [saved['website'] for saved in storage.saved_passwords(key)]
+
+
+@pytest.fixture
+def two(store_path):
+    """Two storages open on one store holding account "k" """
+    first = open_storage(*store_path)
+    first.put_user("k", account("Alice", "ab" * 8), "full")
+    second = open_storage(*store_path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_concurrent_adds_are_kept(two):
+    first, second = two
+    first.saved_passwords("k")
+    second.saved_passwords("k")
+    first.add_saved_password("k", entry("a.com"))
+    second.add_saved_password("k", entry("b.com"))
+    first.flush()
+    second.flush()
+    for storage in two:
+        assert sorted(websites(storage, "k")) == ["a.com", "b.com"]
+
+
+def test_update_finds_its_entry_after_a_concurrent_add(two):
+    first, second = two
+    first.add_saved_password("k", entry("a.com"), "full")
+    second.saved_passwords("k")
+    # first expects c.com at position 1, but second's b.com lands there first
+    second.add_saved_password("k", entry("b.com"))
+    first.add_saved_password("k", entry("c.com"))
+    second.flush()
+    first.update_saved_password("k", 1, entry("c.com", "changed"))
+    first.flush()
+    saved = {item['website']: item['password'] for item in second.saved_passwords("k")}
+    assert websites(second, "k") == ["a.com", "b.com", "c.com"]
+    assert saved == {"a.com": "secret", "b.com": "secret", "c.com": "changed"}
+
+
+def test_update_of_a_missing_entry_fails(two):
+    first, _ = two
+    with pytest.raises((KeyError, StorageError)):
+        first.update_saved_password("k", 0, entry("nowhere.com"), "full")
+
+
+def test_update_user_keeps_concurrent_entries(two):
+    first, second = two
+    first.saved_passwords("k")
+    second.add_saved_password("k", entry("b.com"), "full")
+    first.update_user("k", {'name': "Alice B."}, "full")
+    user = second.get_user("k")
+    assert user['name'] == "Alice B."
+    assert websites(second, "k") == ["b.com"]
+
+
+def test_change_to_a_deleted_account_is_reported(two, store_path):
+    if store_path[0] == "sqlite":
+        pytest.skip("SQLite applies each write at once; there is nothing left to merge")
+    first, second = two
+    first.put_user("other", account("Bob", "cd" * 8), "full")
+    second.saved_passwords("k")
+    second.add_saved_password("k", entry("a.com"))
+    second.add_saved_password("other", entry("b.com"))
+    # As when another process moves the account to a new key
+    first.delete_user("k", "full")
+    with pytest.raises(StorageError, match="were not saved"):
+        second.flush()
+    # Reported once; what could be applied was
+    second.flush()
+    assert first.get_user("k") is None
+    assert websites(first, "other") == ["b.com"]
+
+
+def test_vault_index_follows_other_writers(store_path, fast_kdf):
+    """Saving and then updating an entry after another session saved one"""
+    first = AuthenticationSystem(open_storage(*store_path))
+    key = first.account_key("1234")
+    first.save_account(key, account("Alice", "ab" * 8), "full")
+    first.login("1234")
+    first.upsert_saved_password(key, entry("a.com"))
+    first.flush()
+    assert first.find_saved_password(key, "a.com", "alice") is not None
+
+    second = AuthenticationSystem(open_storage(*store_path))
+    second.login("1234")
+    second.upsert_saved_password(key, entry("b.com"))
+    second.close()
+
+    assert first.upsert_saved_password(key, entry("c.com")) is False
+    assert first.upsert_saved_password(key, entry("c.com", "changed")) is True
+    first.flush()
+    saved = first.saved_passwords(key)
+    assert [item['website'] for item in saved] == ["a.com", "b.com", "c.com"]
+    assert first.reveal_password(saved[2]) == "changed"
+    assert first.find_saved_password(key, "b.com", "alice") is not None
+    first.close()
@@ -0,0 +1,80 @@
+"""Tests for store_index: users.json exactly as json.dumps writes it, and lookups
+
+    python -m pytest src
+"""
+import json
+import os
+
+import pytest
+
+from store_index import RecordIndex, build_index, dump_store, file_stamp
+from vault_records import compact_store
+
+USERS = {
+    "key1": {'name': "Alice", 'user_id': "ab" * 8, 'saved_passwords': [{
+        'website': "example.com", 'username': "alice", 'password': "spg1:abc",
+        'created': "2025-09-01 12:00:00.000000", 'strength': "💚 Very Strong", 'entropy': 104.9,
+    }, {'website': "exämple.org", 'note': "line\nbreak \"quoted\" \\ tab\t"}]},
+    "kéy2 🔐": {'name': "Zoë", 'saved_passwords': []},
+    "key3": {'values': [1, -2, 0.1, 1e100, 1e-7, True, False, None, [], {}, [[1], {"a": [2]}]]},
+    "key4": {'odd floats': [float("nan"), float("inf"), float("-inf")]},
+    "key5": {},
+}
+
+
+def expected(users):
+    return json.dumps(users, indent=2).encode("utf-8")
+
+
+@pytest.mark.parametrize("users", [
+    USERS,
+    {},
+    {"only": {'name': "x"}},
+    {"key": {1: "int key", None: "none key"}},
+], ids=["store", "empty", "one", "non-string keys in an account"])
+def test_dump_is_json_dumps(users):
+    assert dump_store(users)[0] == expected(users)
+
+
+def test_dump_of_records_matches_plain_dicts():
+    records = compact_store(json.loads(json.dumps(USERS)))
+    assert dump_store(records)[0] == expected(USERS)
+
+
+def test_spans_cover_each_account():
+    data, spans = dump_store(USERS)
+    assert [key for key, _, _ in spans] == list(USERS)
+    for key, offset, length in spans:
+        member = json.loads(b"{" + data[offset:offset + length] + b"}")
+        assert same_json(member, {key: USERS[key]})
+
+
+def test_store_with_non_string_keys_has_no_spans():
+    users = {1: {'name': "x"}}
+    assert dump_store(users) == (expected(users), None)
+
+
+def same_json(a, b):
+    # NaN is not equal to itself, so compare what json makes of them
+    return json.dumps(a) == json.dumps(b)
+
+
+def test_index_lookup(tmp_path):
+    data_path = tmp_path / "users.json"
+    index_path = tmp_path / "users.idx"
+    data, spans = dump_store(USERS)
+    data_path.write_bytes(data)
+    index_path.write_bytes(build_index(spans, file_stamp(os.stat(data_path))))
+
+    index = RecordIndex.open(index_path, data_path)
+    try:
+        assert index.count == len(USERS)
+        for key, user in USERS.items():
+            assert same_json(index.find(key), user)
+        assert index.find("missing") is None
+    finally:
+        index.close()
+
+    # Any change to users.json makes the index stale
+    data_path.write_bytes(data + b" ")
+    assert RecordIndex.open(index_path, data_path) is None
@@ -0,0 +1,74 @@
+"""Tests for vault_codec: whatever goes in comes back out exactly
+
+    python -m pytest src
+"""
+import io
+import json
+
+import pytest
+
+import vault_codec
+from vault_codec import VaultFormatError, dumps, export_json, import_json, iter_users, loads
+
+
+def entry(i, **changes):
+    return dict({
+        'website': f"site{i}.example.com",
+        'username': "alice@example.com",
+        'password': f"spg1:token{i}",
+        'created': "2025-09-01 12:00:00.123456",
+        'strength': "💚 Very Strong",
+        'entropy': 104.9,
+    }, **changes)
+
+
+USERS = {
+    "key1": {'name': "Alice", 'user_id': "ab" * 8, 'created_date': "2025-01-01 10:00:00",
+             'saved_passwords': [entry(i) for i in range(50)] + [
+                 # Each goes where no column can hold it exactly
+                 entry(50, created="yesterday"),
+                 entry(51, entropy=12.345),
+                 entry(52, strength="unknown"),
+                 dict(entry(53), note="an extra key"),
+                 {'website': "only-a-website.example"},
+                 {'username': "keys", 'website': "out of order"},
+             ]},
+    "key2": {'name': "Bob", 'password': "1234"},
+    "key3": {'saved_passwords': []},
+    "kéy4 🔐": {'name': "Zoë", 'saved_passwords': [entry(0, website="exämple.org", entropy=0.0)]},
+}
+
+
+def same(a, b):
+    """Equal, keys in the same order included"""
+    return json.dumps(a, indent=2) == json.dumps(b, indent=2)
+
+
+def test_round_trip():
+    assert same(loads(dumps(USERS)), USERS)
+
+
+def test_empty_store():
+    assert loads(dumps({})) == {}
+
+
+def test_streams_across_records(monkeypatch):
+    # Small chunks, so the accounts land in several records
+    monkeypatch.setattr(vault_codec, "CHUNK_ENTRIES", 8)
+    monkeypatch.setattr(vault_codec, "CHUNK_ACCOUNTS", 2)
+    data = dumps(USERS)
+    assert same(dict(iter_users(io.BytesIO(data))), USERS)
+    assert same(loads(data), USERS)
+
+
+def test_rejects_other_files():
+    with pytest.raises(VaultFormatError):
+        loads(b"{}")
+
+
+def test_json_conversion_round_trip(tmp_path):
+    json_path = tmp_path / "users.json"
+    json_path.write_text(json.dumps(USERS, indent=2), encoding="utf-8")
+    assert import_json(json_path, tmp_path / "users.vault") == len(USERS)
+    assert export_json(tmp_path / "users.vault", tmp_path / "back.json") == len(USERS)
+    assert (tmp_path / "back.json").read_bytes() == json_path.read_bytes()
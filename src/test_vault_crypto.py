@@ -0,0 +1,97 @@
+"""Tests for vault_crypto: sealing round-trips, tampering is caught, the format holds
+
+    python -m pytest src
+"""
+from unittest import mock
+
+import pytest
+
+import vault_crypto
+from vault_crypto import VaultKey, entry_aad, is_sealed, reseal_entries
+
+SECRET = bytes(range(32))
+AAD = b"example.com\x00alice"
+
+# Sealed by this version with SECRET, AAD and nonce bytes 100..115; every
+# later version must still open it, and seal to it given the same nonce
+VECTOR = "spg1:ZGVmZ2hpamtsbW5vcHFyc9L4R1G3E5WsqLa7acRnQWp5vbt3cM8QOFFdMA9h"
+
+
+def fixed_nonce(size):
+    return bytes(range(100, 100 + size))
+
+
+def altered(token, position):
+    """token with one byte of its nonce | ciphertext | tag flipped"""
+    raw = bytearray(vault_crypto.base64.urlsafe_b64decode(token[len(vault_crypto.PREFIX):]))
+    raw[position] ^= 1
+    return vault_crypto.PREFIX + vault_crypto.base64.urlsafe_b64encode(bytes(raw)).decode("ascii")
+
+
+@pytest.mark.parametrize("plaintext", ["", "x", "correct horse battery staple", "pässwörd 🔐" * 20])
+def test_round_trip(plaintext):
+    key = VaultKey(SECRET)
+    token = key.seal(plaintext, AAD)
+    assert is_sealed(token)
+    raw = vault_crypto.base64.urlsafe_b64decode(token[len(vault_crypto.PREFIX):])
+    data = plaintext.encode("utf-8")
+    assert len(raw) == vault_crypto.NONCE_SIZE + len(data) + vault_crypto.TAG_SIZE
+    assert key.open(token, AAD) == plaintext
+
+
+def test_nonce_is_fresh_each_time():
+    key = VaultKey(SECRET)
+    assert key.seal("same", AAD) != key.seal("same", AAD)
+
+
+def test_format_is_stable():
+    key = VaultKey(SECRET)
+    assert key.open(VECTOR, AAD) == "correct horse"
+    with mock.patch.object(vault_crypto.os, "urandom", fixed_nonce):
+        assert key.seal("correct horse", AAD) == VECTOR
+
+
+@pytest.mark.parametrize("position", [
+    0,                                      # nonce
+    vault_crypto.NONCE_SIZE,                # ciphertext
+    -1,                                     # tag
+], ids=["nonce", "ciphertext", "tag"])
+def test_tampered_token_is_rejected(position):
+    with pytest.raises(ValueError, match="failed authentication"):
+        VaultKey(SECRET).open(altered(VECTOR, position), AAD)
+
+
+def test_other_aad_is_rejected():
+    with pytest.raises(ValueError, match="failed authentication"):
+        VaultKey(SECRET).open(VECTOR, b"example.com\x00mallory")
+
+
+def test_other_key_is_rejected():
+    with pytest.raises(ValueError, match="failed authentication"):
+        VaultKey(bytes(32)).open(VECTOR, AAD)
+
+
+@pytest.mark.parametrize("token", ["plaintext", "spg1:", "spg1:!!!!", "spg1:AAAA"])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(ValueError):
+        VaultKey(SECRET).open(token, AAD)
+
+
+def test_entry_is_bound_to_its_website_and_username():
+    key = VaultKey(SECRET)
+    entry = key.seal_entry({'website': "example.com", 'username': "alice", 'password': "hunter2"})
+    assert key.open_entry(entry) == "hunter2"
+    assert key.open_entry(dict(entry, password="legacy")) == "legacy"
+    with pytest.raises(ValueError):
+        key.open_entry(dict(entry, username="mallory"))
+
+
+def test_reseal_entries():
+    old, new = VaultKey(SECRET), VaultKey(bytes(32))
+    entries = [old.seal_entry({'website': "a.example", 'username': "u", 'password': "one"}),
+               {'website': "b.example", 'username': "u", 'password': "two"}]
+    resealed = reseal_entries(old, new, entries)
+    assert [new.open_entry(entry) for entry in resealed] == ["one", "two"]
+    assert [entry_aad(entry) for entry in resealed] == [entry_aad(entry) for entry in entries]
+    with pytest.raises(ValueError):
+        reseal_entries(None, new, entries)
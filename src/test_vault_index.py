@@ -0,0 +1,73 @@
+"""Tests for VaultIndex: lookups, duplicates and in-place updates
+
+    python -m pytest src
+"""
+import pytest
+
+from vault_index import VaultIndex, normalize_website
+
+
+def entry(website, username="alice", password="secret"):
+    return {'website': website, 'username': username, 'password': password}
+
+
+@pytest.mark.parametrize("website", [
+    "github.com", "GitHub.com", "https://www.github.com/", "http://github.com", " www.GITHUB.com ",
+])
+def test_website_forms_are_one_site(website):
+    assert normalize_website(website) == "github.com"
+
+
+def test_find_by_website_and_username():
+    index = VaultIndex([entry("github.com"), entry("github.com", "bob"), entry("example.org")])
+    assert index.find("https://GitHub.com/", " Alice ") is index.entries[0]
+    assert index.position("github.com", "BOB") == 1
+    assert index.find("github.com", "carol") is None
+    assert [item['username'] for item in index.for_site("www.github.com")] == ["alice", "bob"]
+    assert index.for_site("nowhere.net") == []
+    assert len(index) == 3
+
+
+def test_newest_duplicate_wins():
+    # Older vaults may hold the same site and username twice
+    index = VaultIndex([entry("a.com", password="old"), entry("A.com", password="new")])
+    assert index.find("a.com", "alice")['password'] == "new"
+    assert len(index.for_site("a.com")) == 2
+
+
+def test_add_and_replace():
+    index = VaultIndex()
+    assert index.add(entry("a.com")) == 0
+    assert index.add(entry("b.com")) == 1
+    index.replace(1, entry("B.com", password="changed"))
+    assert index.find("b.com", "alice")['password'] == "changed"
+    with pytest.raises(ValueError):
+        index.replace(1, entry("c.com"))
+
+
+SEARCH_ENTRIES = [entry("github.com"), entry("gitlab.com", "bob"), entry("x.io", "al"),
+                  entry("https://www.Example.org/", "Zoë"), entry("mail.google.com", "alice.g")]
+
+
+def brute_force(index, query):
+    query = query.strip().casefold()
+    return [position for position, (site, username) in enumerate(index._texts)
+            if query in site or query in username]
+
+
+@pytest.mark.parametrize("query", [
+    "", "  ", "g", "x", "ë", "al", "AL", "io", "git", "github", "lab.c", "alice",
+    "zoë", "example.org", "www", "https", "nothing", "q",
+])
+def test_search_matches_a_plain_scan(query):
+    index = VaultIndex(SEARCH_ENTRIES)
+    assert index.search(query) == brute_force(index, query)
+
+
+def test_search_sees_entries_added_after_prepare():
+    index = VaultIndex(SEARCH_ENTRIES)
+    index.prepare_search()
+    position = index.add(entry("gitea.io", "carol"))
+    assert position in index.search("gitea")
+    assert index.search("car") == [position]
+    assert index.search("git") == [0, 1, position]
@@ -0,0 +1,492 @@
+"""Compact binary encoding of the account store
+
+users.json repeats every key of every saved password, keeps the created
+time as a 26-character string and the strength as an emoji label. This
+format stores the same data column by column instead:
+
+    file     MAGIC, then records of one or more whole accounts
+    record   varint length, then
+               strings new to the string table ("\\0"-joined)
+               [key, fields, slot, count] per account as compact JSON:
+                 the fields except saved_passwords, where saved_passwords
+                 goes among them (0 = absent) and how many entries it has
+               entry count, entry shapes (JSON), one shape code per entry
+               entries that fit no column, as a JSON list
+               one column per field, in ENTRY_FIELDS order, covering the
+                 saved passwords of every account in the record (two for
+                 created: days, then times)
+
+Websites and usernames are indexes into a string table shared by the whole
+file, so a username used on forty sites is stored once. created is split
+into its "YYYY-MM-DD " day, also a string table index, and its 15-character
+"HH:MM:SS.ffffff" time of day, kept as fixed-width text so decoding only
+slices it; strength is a one-byte code into strength.LABELS and entropy an
+integer count of tenths. Each entry's keys are kept in order, and any
+value a column cannot hold exactly (an unknown key, a created string in
+another format, an entropy with more decimals) sends that entry to the
+JSON list, so decoding always gives back exactly what was encoded.
+
+Records are length-prefixed, so VaultWriter streams accounts out a chunk
+at a time and iter_users() reads them back the same way; small accounts
+share a record so the per-record work is spread over many of them.
+Decoding goes a column at a time with C-level helpers (str.split,
+array.frombytes, map) and never formats a number back into text, which
+is what makes it quicker than json.load on the same data.
+"""
+import io
+import json
+import math
+import re
+import sys
+from array import array
+from operator import itemgetter
+
+from strength import LABELS
+
+MAGIC = b"SPGVAULT\x01"
+
+ENTRY_FIELDS = ('website', 'username', 'password', 'created', 'strength', 'entropy')
+
+_STRENGTH_CODES = {label: code for code, label in enumerate(LABELS)}
+# A record is written once it holds this many saved passwords or accounts;
+# one account's saved passwords are never split across records
+CHUNK_ENTRIES = 16384
+CHUNK_ACCOUNTS = 1024
+# At most this many distinct entry shapes per record; 0 marks a JSON entry
+_MAX_SHAPES = 255
+
+
+class VaultFormatError(ValueError):
+    """The data is not a vault file this version can read"""
+
+
+def _varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf, pos):
+    n = shift = 0
+    while True:
+        try:
+            byte = buf[pos]
+        except IndexError:
+            raise VaultFormatError("truncated record") from None
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _put_bytes(out, data):
+    _varint(out, len(data))
+    out += data
+
+
+def _get_bytes(buf, pos):
+    size, pos = _read_varint(buf, pos)
+    end = pos + size
+    if end > len(buf):
+        raise VaultFormatError("truncated record")
+    return buf[pos:end], end
+
+
+# Lone surrogates survive a JSON round trip, so they must survive this one
+def _put_str(out, text):
+    _put_bytes(out, text.encode('utf-8', 'surrogatepass'))
+
+
+def _get_str(buf, pos):
+    data, pos = _get_bytes(buf, pos)
+    return str(data, 'utf-8', 'surrogatepass'), pos
+
+
+def _put_array(out, values, signed=False):
+    """Integers at the smallest width that holds them, as typecode + bytes"""
+    low, high = (min(values), max(values)) if values else (0, 0)
+    for typecode in ('bhiq' if signed else 'BHIQ'):
+        bits = 8 * array(typecode).itemsize
+        if signed and -(1 << (bits - 1)) <= low and high < 1 << (bits - 1):
+            break
+        if not signed and high < 1 << bits:
+            break
+    column = array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    out.append(ord(typecode))
+    _put_bytes(out, column.tobytes())
+
+
+def _get_array(buf, pos):
+    try:
+        column = array(chr(buf[pos]))
+    except (IndexError, ValueError):
+        raise VaultFormatError("bad column type") from None
+    data, pos = _get_bytes(buf, pos + 1)
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column, pos
+
+
+_CREATED = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2} (?:[01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]\.[0-9]{6}")
+# Length of the "YYYY-MM-DD " day and "HH:MM:SS.ffffff" time in a created string
+_DAY_SIZE = 11
+_TIME_SIZE = 15
+
+
+def _text_column(values):
+    """True if values are all strings without a NUL (the column separator)"""
+    return not set(map(type, values)) - {str} and "\x00" not in "".join(values)
+
+
+def _created_column(values):
+    """True if every created value is in str(datetime.now())'s
+    "YYYY-MM-DD HH:MM:SS.ffffff" form, so it splits into fixed-width parts"""
+    if set(map(type, values)) - {str}:
+        return False
+    return all(map(_CREATED.fullmatch, values))
+
+
+def _encode_entropy(values):
+    """Entropies as integer tenths, or None unless each is a float with one decimal"""
+    if set(map(type, values)) - {float}:
+        return None
+    try:
+        if values and max(map(abs, values)) >= 1e8:
+            return None
+        tenths = list(map(round, map((10.0).__mul__, values)))
+    except (OverflowError, ValueError):
+        # inf or nan
+        return None
+    if list(map((10).__rtruediv__, tenths)) != values:
+        return None
+    if 0.0 in values and any(math.copysign(1.0, v) < 0 for v in values if v == 0):
+        return None
+    return tenths
+
+
+class VaultWriter:
+    """Write accounts to a binary file object one at a time
+
+        with open(path, "wb") as f, VaultWriter(f) as writer:
+            for key, user in users.items():
+                writer.write(key, user)
+
+    Accounts are held back until CHUNK_ENTRIES saved passwords or
+    CHUNK_ACCOUNTS accounts have built up and then written as one record;
+    flush() (or leaving the with block) writes the rest.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self._strings = {}
+        self._pending = []
+        self._pending_entries = 0
+        f.write(MAGIC)
+
+    def _refs(self, values, new):
+        """String table indexes for values, adding the ones not seen before to new"""
+        strings = self._strings
+        for text in dict.fromkeys(values):
+            if text not in strings:
+                strings[text] = len(strings)
+                new.append(text)
+        return list(map(strings.__getitem__, values))
+
+    def _encode_column(self, field, values, new):
+        """One field's values in column form, or None if any will not fit"""
+        if field in ('website', 'username'):
+            return self._refs(values, new) if _text_column(values) else None
+        if field == 'password':
+            return values if _text_column(values) else None
+        if field == 'created':
+            return values if _created_column(values) else None
+        if field == 'strength':
+            if set(map(type, values)) - {str}:
+                return None
+            codes = list(map(_STRENGTH_CODES.get, values))
+            return None if None in codes else codes
+        if field == 'entropy':
+            return _encode_entropy(values)
+        return None
+
+    def _uniform_columns(self, entries, new):
+        """Columns for entries that all have every field in the usual order
+
+        The common case, encoded a whole column at a time; None if any entry
+        differs or any value will not fit, for _mixed_columns to sort out.
+        """
+        if set(map(type, entries)) != {dict} or not all(
+                map(ENTRY_FIELDS.__eq__, map(tuple, entries))):
+            return None
+        columns = []
+        for field, values in zip(ENTRY_FIELDS, zip(*map(itemgetter(*ENTRY_FIELDS), entries))):
+            column = self._encode_column(field, list(values), new)
+            if column is None:
+                return None
+            columns.append(column)
+        return columns
+
+    def _mixed_columns(self, entries, new):
+        """(shapes, kinds, irregular, columns) checking entries one at a time"""
+        shapes = {}
+        kinds = bytearray()
+        irregular = []
+        columns = {field: [] for field in ENTRY_FIELDS}
+        for entry in entries:
+            kind = 0
+            if type(entry) is dict:
+                values = [self._encode_column(field, [value], new)
+                          for field, value in entry.items()]
+                if None not in values:
+                    shape = tuple(entry)
+                    kind = shapes.get(shape)
+                    if kind is None and len(shapes) < _MAX_SHAPES:
+                        kind = shapes[shape] = len(shapes) + 1
+                    if kind:
+                        for field, value in zip(shape, values):
+                            columns[field] += value
+            if not kind:
+                kind = 0
+                irregular.append(entry)
+            kinds.append(kind)
+        return list(shapes), kinds, irregular, [columns[field] for field in ENTRY_FIELDS]
+
+    def encode(self, accounts):
+        """The record for a list of (key, user), as bytes (without its length prefix)"""
+        heads = []
+        entries = []
+        for key, user in accounts:
+            saved = user.get('saved_passwords')
+            if isinstance(saved, list):
+                fields = {k: v for k, v in user.items() if k != 'saved_passwords'}
+                heads.append((key, fields, list(user).index('saved_passwords') + 1, len(saved)))
+                entries += saved
+            else:
+                heads.append((key, user, 0, 0))
+
+        new = []
+        columns = self._uniform_columns(entries, new) if entries else None
+        if columns is not None:
+            shapes, kinds, irregular = [ENTRY_FIELDS], b"\x01" * len(entries), []
+        elif entries:
+            shapes, kinds, irregular, columns = self._mixed_columns(entries, new)
+        if entries:
+            created = columns[3]
+            days = self._refs([text[:_DAY_SIZE] for text in created], new)
+            times = "".join([text[_DAY_SIZE:] for text in created])
+
+        out = bytearray()
+        _varint(out, len(new))
+        if new:
+            _put_str(out, "\x00".join(new))
+        _put_str(out, json.dumps(heads, ensure_ascii=False, separators=(',', ':')))
+        _varint(out, len(entries))
+        if entries:
+            websites, usernames, passwords, _, strengths, entropies = columns
+            _put_str(out, json.dumps(shapes, separators=(',', ':')))
+            _put_bytes(out, kinds)
+            _put_str(out, json.dumps(irregular, ensure_ascii=False, separators=(',', ':'))
+                     if irregular else "")
+            _put_array(out, websites)
+            _put_array(out, usernames)
+            _put_str(out, "\x00".join(passwords))
+            _put_array(out, days)
+            _put_str(out, times)
+            _put_bytes(out, bytes(strengths))
+            _put_array(out, entropies, signed=True)
+        return out
+
+    def write(self, key, user):
+        """Add one account; records go out as chunks fill up"""
+        entries = user.get('saved_passwords')
+        self._pending.append((key, user))
+        self._pending_entries += len(entries) if isinstance(entries, list) else 0
+        if (self._pending_entries >= CHUNK_ENTRIES
+                or len(self._pending) >= CHUNK_ACCOUNTS):
+            self.flush()
+
+    def flush(self):
+        """Write out the accounts not yet in a record"""
+        if not self._pending:
+            return
+        record = self.encode(self._pending)
+        self._pending = []
+        self._pending_entries = 0
+        prefix = bytearray()
+        _varint(prefix, len(record))
+        self.f.write(prefix)
+        self.f.write(record)
+
+    close = flush
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.flush()
+
+
+class VaultReader:
+    """Decode the records written by a VaultWriter, in order"""
+
+    def __init__(self):
+        self._strings = []
+
+    def decode(self, record):
+        """[(key, user), ...] from one record"""
+        strings = self._strings
+        count, pos = _read_varint(record, 0)
+        if count:
+            text, pos = _get_str(record, pos)
+            added = text.split("\x00")
+            if len(added) != count:
+                raise VaultFormatError("bad string table")
+            strings.extend(added)
+        accounts, pos = _get_str(record, pos)
+        count, pos = _read_varint(record, pos)
+        try:
+            accounts = json.loads(accounts)
+        except ValueError:
+            raise VaultFormatError("bad account fields") from None
+
+        entries = []
+        if count:
+            shapes, pos = _get_str(record, pos)
+            kinds, pos = _get_bytes(record, pos)
+            irregular, pos = _get_str(record, pos)
+            websites, pos = _get_array(record, pos)
+            usernames, pos = _get_array(record, pos)
+            passwords, pos = _get_str(record, pos)
+            days, pos = _get_array(record, pos)
+            times, pos = _get_str(record, pos)
+            strengths, pos = _get_bytes(record, pos)
+            entropies, pos = _get_array(record, pos)
+            try:
+                shapes = [tuple(shape) for shape in json.loads(shapes)]
+                columns = (
+                    map(strings.__getitem__, websites),
+                    map(strings.__getitem__, usernames),
+                    passwords.split("\x00"),
+                    map(str.__add__, map(strings.__getitem__, days),
+                        [times[i:i + _TIME_SIZE] for i in range(0, len(times), _TIME_SIZE)]),
+                    map(LABELS.__getitem__, strengths),
+                    map((10).__rtruediv__, entropies),
+                )
+                if shapes == [ENTRY_FIELDS] and not irregular:
+                    # Every entry has every field in the usual order
+                    entries = [{'website': w, 'username': u, 'password': p,
+                                'created': c, 'strength': s, 'entropy': e}
+                               for w, u, p, c, s, e in zip(*columns)]
+                else:
+                    entries = self._entries(kinds, shapes, columns,
+                                            json.loads(irregular) if irregular else [])
+            except (ValueError, IndexError, StopIteration):
+                raise VaultFormatError("bad saved passwords") from None
+            if len(entries) != count:
+                raise VaultFormatError("bad saved passwords")
+
+        users = []
+        start = 0
+        try:
+            for key, fields, slot, count in accounts:
+                if slot:
+                    # Put saved_passwords back where it was among the account's keys
+                    items = list(fields.items())
+                    items.insert(slot - 1, ('saved_passwords', entries[start:start + count]))
+                    fields = dict(items)
+                    start += count
+                users.append((key, fields))
+        except (TypeError, ValueError, AttributeError):
+            raise VaultFormatError("bad account fields") from None
+        if start != len(entries):
+            raise VaultFormatError("bad saved passwords")
+        return users
+
+    def _entries(self, kinds, shapes, columns, irregular):
+        columns = dict(zip(ENTRY_FIELDS, map(iter, columns)))
+        irregular = iter(irregular)
+        entries = []
+        for kind in kinds:
+            if kind:
+                entries.append({field: next(columns[field]) for field in shapes[kind - 1]})
+            else:
+                entries.append(next(irregular))
+        return entries
+
+
+def iter_users(f):
+    """Yield (key, user) from a binary file object, one record at a time"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise VaultFormatError("not a vault file")
+    reader = VaultReader()
+    while True:
+        prefix = bytearray()
+        while True:
+            byte = f.read(1)
+            if not byte:
+                if prefix:
+                    raise VaultFormatError("truncated record")
+                return
+            prefix += byte
+            if byte[0] < 0x80:
+                break
+        size = _read_varint(prefix, 0)[0]
+        record = f.read(size)
+        if len(record) != size:
+            raise VaultFormatError("truncated record")
+        yield from reader.decode(record)
+
+
+def dump(users, f):
+    with VaultWriter(f) as writer:
+        for key, user in users.items():
+            writer.write(key, user)
+
+
+def dumps(users):
+    """The whole store {key: user} as bytes"""
+    buf = io.BytesIO()
+    dump(users, buf)
+    return buf.getvalue()
+
+
+def loads(data):
+    """The store {key: user} from dumps() output"""
+    data = memoryview(data)
+    if data[:len(MAGIC)] != MAGIC:
+        raise VaultFormatError("not a vault file")
+    reader = VaultReader()
+    users = {}
+    pos = len(MAGIC)
+    while pos < len(data):
+        record, pos = _get_bytes(data, pos)
+        users.update(reader.decode(record))
+    return users
+
+
+def load(f):
+    return loads(f.read())
+
+
+def import_json(json_path, vault_path):
+    """Convert a users.json file to the binary format; returns the account count"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        users = json.load(f)
+    with open(vault_path, 'wb') as f:
+        dump(users, f)
+    return len(users)
+
+
+def export_json(vault_path, json_path):
+    """Convert a binary file back to users.json exactly as the app writes it"""
+    with open(vault_path, 'rb') as f:
+        users = dict(iter_users(f))
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(users, f, indent=2)
+    return len(users)
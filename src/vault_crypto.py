@@ -0,0 +1,114 @@
+"""Per-entry authenticated encryption of saved passwords
+
+Only the password of a saved entry is encrypted; website, username and the
+other metadata stay readable so the vault can be listed, indexed and
+searched without any decryption. Each password is sealed on its own, so
+showing one entry decrypts one string however large the vault is.
+
+A sealed password is a string
+
+    spg1:<base64url(nonce | ciphertext | tag)>
+
+with a 16-byte random nonce, a SHAKE-256 keystream over the encryption key
+and nonce, and a 16-byte keyed BLAKE2b tag over the version, nonce, entry
+metadata and ciphertext (encrypt-then-MAC; keyed BLAKE2b is a MAC in its
+own right and about three times quicker than HMAC here). Binding the
+website and username means a sealed password cannot be moved onto another
+entry unnoticed. Both keys come from the session secret derived at login.
+Everything is in the standard library, so there is nothing to install.
+
+The "spg1:" prefix versions the format; strings without a known prefix are
+legacy plaintext and are returned as they are.
+"""
+import base64
+import hashlib
+import hmac
+import os
+
+PREFIX = "spg1:"
+NONCE_SIZE = 16
+TAG_SIZE = 16
+
+
+def is_sealed(value):
+    return value.startswith(PREFIX)
+
+
+def entry_aad(entry):
+    """The metadata a sealed password is bound to"""
+    return f"{entry['website']}\x00{entry.get('username', '')}".encode("utf-8")
+
+
+class VaultKey:
+    """Encryption and MAC keys for one account's saved passwords"""
+
+    __slots__ = ("_enc_key", "_mac_key")
+
+    def __init__(self, secret):
+        self._enc_key = hmac.digest(secret, b"spg vault encryption", "sha256")
+        self._mac_key = hmac.digest(secret, b"spg vault authentication", "sha256")
+
+    def _keystream(self, nonce, size):
+        return hashlib.shake_256(self._enc_key + nonce).digest(size)
+
+    def _tag(self, nonce, aad, ciphertext):
+        message = b"".join((PREFIX.encode("ascii"), nonce,
+                            len(aad).to_bytes(4, "big"), aad, ciphertext))
+        return hashlib.blake2b(message, key=self._mac_key, digest_size=TAG_SIZE).digest()
+
+    def seal(self, plaintext, aad=b""):
+        """Encrypt and authenticate a string; returns the spg1: token"""
+        data = plaintext.encode("utf-8")
+        nonce = os.urandom(NONCE_SIZE)
+        stream = self._keystream(nonce, len(data))
+        ciphertext = (int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")).to_bytes(len(data), "big")
+        token = nonce + ciphertext + self._tag(nonce, aad, ciphertext)
+        return PREFIX + base64.urlsafe_b64encode(token).decode("ascii")
+
+    def open(self, token, aad=b""):
+        """Decrypt a token from seal(); raises ValueError if it was altered"""
+        if not is_sealed(token):
+            raise ValueError("not a sealed value")
+        try:
+            raw = base64.urlsafe_b64decode(token[len(PREFIX):])
+        except ValueError:
+            raise ValueError("sealed value is corrupt") from None
+        if len(raw) < NONCE_SIZE + TAG_SIZE:
+            raise ValueError("sealed value is corrupt")
+        nonce, ciphertext, tag = raw[:NONCE_SIZE], raw[NONCE_SIZE:-TAG_SIZE], raw[-TAG_SIZE:]
+        if not hmac.compare_digest(tag, self._tag(nonce, aad, ciphertext)):
+            raise ValueError("sealed value failed authentication (wrong key or tampered)")
+        stream = self._keystream(nonce, len(ciphertext))
+        data = (int.from_bytes(ciphertext, "big") ^ int.from_bytes(stream, "big")).to_bytes(len(ciphertext), "big")
+        return data.decode("utf-8")
+
+    def seal_entry(self, entry):
+        """Copy of a plaintext saved-password entry with its password sealed"""
+        sealed = dict(entry)
+        sealed['password'] = self.seal(entry['password'], entry_aad(entry))
+        return sealed
+
+    def open_entry(self, entry):
+        """The plaintext password of a saved-password entry"""
+        password = entry['password']
+        if not is_sealed(password):
+            return password
+        return self.open(password, entry_aad(entry))
+
+
+def reseal_entries(old_key, new_key, entries):
+    """Re-encrypt entries from old_key (None for plaintext) to new_key
+
+    Used when an account's key rotates; returns the new list.
+    """
+    resealed = []
+    for entry in entries:
+        password = entry['password']
+        if old_key is not None and is_sealed(password):
+            password = old_key.open(password, entry_aad(entry))
+        elif is_sealed(password):
+            raise ValueError("entry is sealed but no old key was given")
+        entry = dict(entry)
+        entry['password'] = new_key.seal(password, entry_aad(entry))
+        resealed.append(entry)
+    return resealed
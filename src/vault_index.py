@@ -0,0 +1,124 @@
+"""In-memory index over one user's saved passwords
+
+saved_passwords is stored as a plain list in insertion order. VaultIndex
+keeps dictionaries keyed by normalised website and username next to it, so
+finding the credential for a site, spotting a duplicate before saving and
+updating an entry in place are all constant-time.
+
+It also keeps character and trigram posting lists over the same two fields
+for the search box: a query only checks the entries listed under its
+rarest gram instead of scanning the whole vault.
+"""
+import collections
+from array import array
+
+
+def normalize_website(website):
+    """Canonical form of a website so "https://www.GitHub.com/" matches "github.com" """
+    site = website.strip().casefold()
+    for scheme in ("https://", "http://"):
+        if site.startswith(scheme):
+            site = site[len(scheme):]
+            break
+    if site.startswith("www."):
+        site = site[4:]
+    return site.rstrip("/")
+
+
+def normalize_username(username):
+    return username.strip().casefold()
+
+
+def entry_key(entry):
+    """Index key of a saved-password record"""
+    return normalize_website(entry['website']), normalize_username(entry.get('username', ''))
+
+
+class VaultIndex:
+    """Website/username index over a list of saved-password records
+
+    The index holds its own copy of the list; keep it in step with storage
+    through add() and replace().
+    """
+
+    def __init__(self, entries=()):
+        self.entries = []
+        self._by_key = {}
+        self._by_site = {}
+        # Search text of each entry and gram -> ascending positions; the
+        # postings are built on the first search so lookups never pay for them
+        self._texts = []
+        self._postings = None
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def position(self, website, username):
+        """List position of the entry for website and username, or None"""
+        return self._by_key.get((normalize_website(website), normalize_username(username)))
+
+    def find(self, website, username):
+        position = self.position(website, username)
+        return None if position is None else self.entries[position]
+
+    def for_site(self, website):
+        """Every entry saved for a website, oldest first"""
+        return [self.entries[i] for i in self._by_site.get(normalize_website(website), ())]
+
+    def add(self, entry):
+        """Index a newly appended entry and return its position"""
+        position = len(self.entries)
+        self.entries.append(entry)
+        key = entry_key(entry)
+        # Older vaults may hold duplicates; the newest one wins lookups
+        self._by_key[key] = position
+        self._by_site.setdefault(key[0], []).append(position)
+        self._texts.append(key)
+        if self._postings is not None:
+            self._index_text(position, key)
+        return position
+
+    def _index_text(self, position, key):
+        site, username = key
+        # Padding gives even one- and two-character fields a trigram
+        padded_site = f"\x02{site}\x03"
+        padded_user = f"\x02{username}\x03"
+        grams = set(site)
+        grams.update(username)
+        grams.update([padded_site[i:i + 3] for i in range(len(padded_site) - 2)])
+        grams.update([padded_user[i:i + 3] for i in range(len(padded_user) - 2)])
+        postings = self._postings
+        for gram in grams:
+            postings[gram].append(position)
+
+    def prepare_search(self):
+        """Build the search postings now rather than on the first search"""
+        if self._postings is None:
+            self._postings = collections.defaultdict(lambda: array('I'))
+            for position, key in enumerate(self._texts):
+                self._index_text(position, key)
+
+    def replace(self, position, entry):
+        """Swap the entry at position for an updated one with the same key"""
+        old_key = entry_key(self.entries[position])
+        new_key = entry_key(entry)
+        if old_key != new_key:
+            raise ValueError("replace() cannot change an entry's website or username")
+        # Same website and username, so the search grams are unchanged
+        self.entries[position] = entry
+
+    def search(self, query):
+        """Positions of entries whose website or username contains query"""
+        self.prepare_search()
+        query = query.strip().casefold()
+        if not query:
+            return list(range(len(self.entries)))
+        if len(query) == 1:
+            return list(self._postings.get(query, ()))
+        grams = set(query) if len(query) == 2 else {query[i:i + 3] for i in range(len(query) - 2)}
+        candidates = min((self._postings.get(gram, ()) for gram in grams), key=len)
+        texts = self._texts
+        return [position for position in candidates
+                if query in texts[position][0] or query in texts[position][1]]
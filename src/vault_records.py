@@ -0,0 +1,256 @@
+"""Compact in-memory records for accounts and saved passwords
+
+Loaded as plain dicts, every saved password costs a hash table for six
+keys, its own copies of a username and website that repeat across the
+vault, and an emoji label for its strength. SavedPassword and UserAccount
+keep the same data in __slots__ instead:
+
+- websites and usernames are interned, so each distinct one is held once
+  however many entries share it,
+- strength is a small int indexing strength.LABELS,
+- fields a record lacks take no space beyond their empty slot, and keys
+  outside the usual layout go in an extra dict only when there are any.
+
+Both read like the dicts they replace (entry['website'], entry.get(...),
+dict(entry), iteration in key order), so callers need not know which they
+have. The storage engines convert what they load with compact_store() /
+compact_user() and write records back out with to_json().
+
+A dict that cannot be represented exactly (keys in an unusual order, a
+strength that is not one of the labels, a non-string website) is kept as
+the dict it is, so nothing is ever lost in the conversion.
+"""
+import sys
+from collections.abc import Mapping, MutableMapping
+
+from strength import LABELS
+
+ENTRY_FIELDS = ('website', 'username', 'password', 'created', 'strength', 'entropy')
+USER_FIELDS = ('name', 'password', 'user_id', 'created_date', 'saved_passwords')
+
+_STRENGTH_CODES = {label: code for code, label in enumerate(LABELS)}
+
+
+class _Missing:
+    """Marks a slot whose field the record does not have"""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<missing>"
+
+
+MISSING = _Missing()
+
+
+def _in_field_order(keys, fields):
+    """True if keys are some of fields in their order, then any other keys"""
+    position = 0
+    for key in keys:
+        try:
+            position = fields.index(key, position) + 1
+        except ValueError:
+            if key in fields:
+                return False
+            # The first unknown key; every later one must be unknown too
+            return not any(k in fields for k in keys[keys.index(key):])
+    return True
+
+
+class SavedPassword(Mapping):
+    """One saved-password record, read like a dict"""
+
+    __slots__ = ('website', 'username', 'password', 'created', 'strength_code', 'entropy',
+                 'extra')
+
+    def __init__(self, website, username=MISSING, password=MISSING, created=MISSING,
+                 strength_code=MISSING, entropy=MISSING, extra=None):
+        self.website = sys.intern(website)
+        self.username = username if username is MISSING else sys.intern(username)
+        self.password = password
+        self.created = created
+        self.strength_code = strength_code
+        self.entropy = entropy
+        self.extra = extra or None
+
+    def __getitem__(self, key):
+        if key == 'strength':
+            code = self.strength_code
+            if code is not MISSING:
+                return LABELS[code]
+        elif key in ENTRY_FIELDS:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __repr__(self):
+        return f"SavedPassword({self.to_dict()!r})"
+
+    def to_dict(self):
+        code = self.strength_code
+        values = (self.website, self.username, self.password, self.created,
+                  MISSING if code is MISSING else LABELS[code], self.entropy)
+        data = {field: value for field, value in zip(ENTRY_FIELDS, values) if value is not MISSING}
+        if self.extra is not None:
+            data.update(self.extra)
+        return data
+
+
+class UserAccount(MutableMapping):
+    """One account, read and updated like a dict"""
+
+    __slots__ = ('name', 'password', 'user_id', 'created_date', 'saved_passwords', 'extra')
+
+    def __init__(self, name=MISSING, password=MISSING, user_id=MISSING, created_date=MISSING,
+                 saved_passwords=MISSING, extra=None):
+        self.name = name
+        self.password = password
+        self.user_id = user_id
+        self.created_date = created_date
+        self.saved_passwords = saved_passwords
+        self.extra = extra or None
+
+    def __getitem__(self, key):
+        if key in USER_FIELDS:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        if key in USER_FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in USER_FIELDS and getattr(self, key) is not MISSING:
+            setattr(self, key, MISSING)
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+            if not self.extra:
+                self.extra = None
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for field in USER_FIELDS:
+            if getattr(self, field) is not MISSING:
+                yield field
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"UserAccount({self.to_dict()!r})"
+
+    def to_dict(self):
+        data = {key: self[key] for key in self}
+        if isinstance(data.get('saved_passwords'), list):
+            data['saved_passwords'] = [entry.to_dict() if isinstance(entry, SavedPassword) else entry
+                                       for entry in data['saved_passwords']]
+        return data
+
+
+def compact_entry(entry):
+    """A SavedPassword for a saved-password dict, or the dict itself if it will not fit"""
+    if type(entry) is not dict:
+        return entry
+    keys = tuple(entry)
+    if keys == ENTRY_FIELDS:
+        # What new_saved_entry() writes; nothing to check but the types
+        website, username, password, created, strength, entropy = entry.values()
+        code = _STRENGTH_CODES.get(strength) if type(strength) is str else None
+        if code is None or type(website) is not str or type(username) is not str:
+            return entry
+        return SavedPassword(website, username, password, created, code, entropy)
+    if keys and keys[0] == 'website' and _in_field_order(keys, ENTRY_FIELDS):
+        extra = {key: entry[key] for key in keys if key not in ENTRY_FIELDS}
+    else:
+        return entry
+    website = entry['website']
+    username = entry.get('username', MISSING)
+    strength = entry.get('strength', MISSING)
+    if type(website) is not str or not (username is MISSING or type(username) is str):
+        return entry
+    if strength is not MISSING:
+        strength = _STRENGTH_CODES.get(strength) if type(strength) is str else None
+        if strength is None:
+            return entry
+    return SavedPassword(website, username, entry.get('password', MISSING),
+                         entry.get('created', MISSING), strength,
+                         entry.get('entropy', MISSING), extra)
+
+
+def compact_user(user):
+    """A UserAccount for an account dict (entries included), or the dict if it will not fit"""
+    if type(user) is not dict:
+        return user
+    entries = user.get('saved_passwords', MISSING)
+    if isinstance(entries, list):
+        entries = [compact_entry(entry) for entry in entries]
+    keys = tuple(user)
+    if not _in_field_order(keys, USER_FIELDS):
+        if isinstance(entries, list):
+            user['saved_passwords'] = entries
+        return user
+    extra = {key: user[key] for key in keys if key not in USER_FIELDS}
+    return UserAccount(user.get('name', MISSING), user.get('password', MISSING),
+                       user.get('user_id', MISSING), user.get('created_date', MISSING),
+                       entries, extra)
+
+
+def compact_store(users):
+    """compact_user() for every account of {key: user}, in place; returns users"""
+    for key, user in users.items():
+        users[key] = compact_user(user)
+    return users
+
+
+def to_json(obj):
+    """Plain dict for a record; the default= hook for json.dump"""
+    if isinstance(obj, (SavedPassword, UserAccount)):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def plain_user(user):
+    """An account as plain dicts all the way down"""
+    if isinstance(user, UserAccount):
+        return user.to_dict()
+    entries = user.get('saved_passwords')
+    if isinstance(entries, list) and any(isinstance(e, SavedPassword) for e in entries):
+        user = dict(user)
+        user['saved_passwords'] = [e.to_dict() if isinstance(e, SavedPassword) else e
+                                   for e in entries]
+    return user
@@ -0,0 +1,157 @@
+"""Virtualised list of saved passwords for the Tk GUI
+
+Only enough row widgets to fill the visible area are ever created. When
+the list scrolls, the same rows are re-filled with the entries that are
+now in view, so opening the window costs the same for ten entries as for
+ten thousand. Passwords are only decrypted, one at a time, when their Show
+button is pressed.
+"""
+import tkinter as tk
+
+HIDDEN = "••••••••••••"
+
+# Height in pixels given to each entry card
+ROW_HEIGHT = 118
+
+
+class _Row:
+    """One recycled entry card"""
+
+    def __init__(self, parent, on_toggle):
+        self.position = None
+        self.frame = tk.LabelFrame(parent, font=("Arial", 12, "bold"),
+                                   fg="#00ff88", bg="#2b2b2b",
+                                   relief="ridge", bd=2)
+
+        info_frame = tk.Frame(self.frame, bg="#2b2b2b")
+        info_frame.pack(fill="x", padx=10, pady=4)
+
+        self.username_label = tk.Label(info_frame, font=("Arial", 10), fg="white",
+                                       bg="#2b2b2b", anchor="w")
+        self.username_label.pack(fill="x", pady=2)
+
+        password_frame = tk.Frame(info_frame, bg="#2b2b2b")
+        password_frame.pack(fill="x", pady=3)
+
+        tk.Label(password_frame, text="🔑 Password:",
+                font=("Arial", 10), fg="white", bg="#2b2b2b").pack(side="left")
+
+        self.password_var = tk.StringVar(value=HIDDEN)
+        tk.Entry(password_frame, textvariable=self.password_var,
+                 font=("Courier", 10), bg="#404040", fg="#000000",
+                 state="readonly", width=25, relief="flat", bd=3).pack(side="left", padx=10)
+
+        self.toggle_btn = tk.Button(password_frame, text="👁️ Show",
+                                    command=lambda: on_toggle(self.position),
+                                    bg="#000000", fg="white", font=("Arial", 8),
+                                    relief="flat", padx=8, pady=2, cursor="hand2")
+        self.toggle_btn.pack(side="left", padx=5)
+
+        self.info_label = tk.Label(info_frame, font=("Arial", 9), fg="#cccccc",
+                                   bg="#2b2b2b", anchor="w")
+        self.info_label.pack(fill="x", pady=2)
+
+    def show(self, position, entry, revealed, reveal):
+        self.position = position
+        self.frame.config(text=f"🌐 {entry['website']}")
+        self.username_label.config(text=f"👤 Username/Email: {entry.get('username', 'N/A')}")
+        if revealed:
+            try:
+                self.password_var.set(reveal(entry))
+            except ValueError:
+                self.password_var.set("⚠️ cannot decrypt")
+            self.toggle_btn.config(text="🙈 Hide")
+        else:
+            self.password_var.set(HIDDEN)
+            self.toggle_btn.config(text="👁️ Show")
+        self.info_label.config(
+            text=f"💪 Strength: {entry.get('strength', 'Unknown')} | "
+                 f"📅 Created: {entry['created'][:19]}")
+
+
+class VirtualVaultList(tk.Frame):
+    """Scrollable list of entry cards that only builds the visible rows
+
+    reveal(entry) returns an entry's plaintext password for the Show button.
+    """
+
+    def __init__(self, parent, entries, reveal=lambda entry: entry['password'], **kwargs):
+        kwargs.setdefault("bg", "#2b2b2b")
+        super().__init__(parent, **kwargs)
+        self.entries = entries
+        self.reveal = reveal
+        self.offset = 0
+        self.revealed = set()
+        self.rows = []
+
+        self.body = tk.Frame(self, bg="#2b2b2b")
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.body.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.body.bind("<Configure>", self._on_resize)
+        # The list fills its window, so wheel events anywhere in it scroll
+        top = self.winfo_toplevel()
+        top.bind("<MouseWheel>", self._on_wheel)
+        top.bind("<Button-4>", lambda e: self.scroll(-1))
+        top.bind("<Button-5>", lambda e: self.scroll(1))
+
+    @property
+    def visible_rows(self):
+        return max(1, self.body.winfo_height() // ROW_HEIGHT)
+
+    def set_entries(self, entries):
+        """Show a different list, e.g. search results, from the top"""
+        self.entries = entries
+        self.offset = 0
+        self.revealed.clear()
+        self.refresh()
+
+    def _on_resize(self, event):
+        needed = max(1, event.height // ROW_HEIGHT)
+        while len(self.rows) < needed:
+            self.rows.append(_Row(self.body, self._toggle))
+        self.refresh()
+
+    def _on_wheel(self, event):
+        self.scroll(-1 if event.delta > 0 else 1)
+
+    def _toggle(self, position):
+        if position in self.revealed:
+            self.revealed.discard(position)
+        else:
+            self.revealed.add(position)
+        self.refresh()
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.refresh()
+
+    def yview(self, *args):
+        """Scrollbar callback: ("moveto", fraction) or ("scroll", n, what)"""
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.entries))
+        elif args[0] == "scroll":
+            step = self.visible_rows if args[2] == "pages" else 1
+            self.offset += int(args[1]) * step
+        self.refresh()
+
+    def refresh(self):
+        """Fill the pooled rows with the entries currently in view"""
+        visible = self.visible_rows
+        total = len(self.entries)
+        self.offset = max(0, min(self.offset, total - visible))
+        for i, row in enumerate(self.rows):
+            position = self.offset + i
+            if i < visible and position < total:
+                row.show(position, self.entries[position], position in self.revealed,
+                         self.reveal)
+                row.frame.place(x=15, y=i * ROW_HEIGHT + 4, relwidth=1, width=-30,
+                                height=ROW_HEIGHT - 8)
+            else:
+                row.position = None
+                row.frame.place_forget()
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)